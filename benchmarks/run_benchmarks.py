@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import itertools
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_registers import make_synthetic_register, write_synthetic_register
+from model.simple_simulation_engine import ExecutionOptions, SamplingOptions, sample_risk_impact, perform_simulation, \
+    extract_simulation_statistics
+from model.gbm import simulate_gbm_paths
+from model.vasicek import simulate_vasicek_paths
+from tools.output_writers import create_output_writer
+from tools.register_reader import load_risk_register
+from tools.reporting_summaries import compute_reporting_summaries
+
+logger = logging.getLogger(__name__)
+
+# Results of the smoke grid to compare against (python -m benchmarks.run_benchmarks --baseline ...). The committed
+# file was recorded on a 1-CPU machine (see its "environment"), so its timings only hold there; regenerate it on the
+# reference hardware with: python -m benchmarks.run_benchmarks --grid smoke --output benchmarks/baseline_smoke.json
+SMOKE_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_smoke.json")
+
+# Bumped whenever results change meaning, so that older baselines are not compared against
+RESULTS_FORMAT_VERSION = 1
+
+# Scenario / step / risk grids; 'production' matches the sizes of the production runs
+BENCHMARK_GRIDS = {
+    "smoke": {"risks": (10,), "scenarios": (1000,), "steps": (5,), "engines": ("loop", "batched"),
+              "output_formats": ("excel", "npy", "parquet")},
+    "default": {"risks": (20, 80), "scenarios": (10000, 50000), "steps": (5, 12), "engines": ("loop", "batched"),
+                "output_formats": ("npy", "parquet")},
+    "production": {"risks": (80, 200), "scenarios": (100000,), "steps": (12,), "engines": ("batched",),
+                   "output_formats": ("npy", "parquet")},
+}
+
+# perform_simulation settings of every engine
+SIMULATION_ENGINES = {"loop": {"sampling": SamplingOptions(rng_mode="legacy"), "execution": ExecutionOptions()},
+                      "batched": {"sampling": SamplingOptions(rng_mode="philox"),
+                                  "execution": ExecutionOptions(batched=True)}}
+
+BENCHMARKS = ("load_register", "sample_risk_impact", "perform_simulation", "extract_simulation_statistics", "gbm",
+              "vasicek", "output_writing", "reporting")
+
+def measure(function, repeats: int = 3):
+    """Wall time (best & median of repeats) and peak traced allocations (tracemalloc, one extra call) of function.
+
+    Allocations are traced in a separate call so that tracing does not slow down the timed ones."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": min(timings), "seconds_median": float(np.median(timings)), "repeats": repeats,
+            "peak_bytes": peak_bytes}
+
+def _benchmark_cases(grid: dict, work_dir: str, selected=BENCHMARKS):
+    """Yields (benchmark, parameters, cells, function) for every benchmark & grid point; cells (risks x steps x
+    scenarios values produced) give the throughput."""
+    if "load_register" in selected:
+        for risks in grid["risks"]:
+            register_dir = os.path.join(work_dir, f"register_{risks}")
+            write_synthetic_register(register_dir, risks)
+            for cached in (False, True):
+                cache_dir = os.path.join(register_dir, "cache") if cached else None
+                yield ("load_register", {"risks": risks, "cached": cached}, risks,
+                       lambda register_dir=register_dir, cache_dir=cache_dir: load_risk_register(
+                           register_dir=register_dir, cache_dir=cache_dir))
+
+    if "sample_risk_impact" in selected:
+        for steps, scenarios, distribution in itertools.product(grid["steps"], grid["scenarios"],
+                                                                ("Normal", "Lognormal", "Uniform")):
+            yield ("sample_risk_impact", {"steps": steps, "scenarios": scenarios, "distribution": distribution},
+                   steps * scenarios,
+                   lambda steps=steps, scenarios=scenarios, distribution=distribution: sample_risk_impact(
+                       steps=steps, scenarios=scenarios, distribution=distribution, mean=1e6, std=2e5,
+                       left_tail_impact=1e5, right_tail_impact=1e7, min_impact=1e5, max_impact=1e7,
+                       risk_likelihood=0.1))
+
+    for risks, steps, scenarios in itertools.product(grid["risks"], grid["steps"], grid["scenarios"]):
+        size = {"risks": risks, "steps": steps, "scenarios": scenarios}
+        cells = risks * steps * scenarios
+        df_register = make_synthetic_register(risks)
+
+        if "perform_simulation" in selected:
+            for engine in grid["engines"]:
+                yield ("perform_simulation", {**size, "engine": engine}, cells,
+                       lambda engine=engine: perform_simulation(
+                           df_register, num_steps=steps, num_scenarios=scenarios, independent_sampling=True,
+                           interim_files_dir=work_dir, save_interim_files=False, **SIMULATION_ENGINES[engine]))
+
+        if "gbm" in selected:
+            yield ("gbm", size, cells, lambda: simulate_gbm_paths(
+                np.full(risks, 0.05), np.full(risks, 0.2), np.full(risks, 100.0), horizon=1.0, num_steps=steps,
+                num_simulations=scenarios, seed=0))
+
+        if "vasicek" in selected:
+            yield ("vasicek", size, cells, lambda: simulate_vasicek_paths(
+                np.full(risks, 0.5), np.full(risks, 0.03), np.full(risks, 0.01), np.full(risks, 0.02),
+                horizon=1.0, num_steps=steps, num_simulations=scenarios, seed=0))
+
+        if not {"extract_simulation_statistics", "output_writing", "reporting"} & set(selected):
+            continue
+
+        # Results to aggregate & write (simulated once, outside the measured calls)
+        df_total_impacts, dict_risk_impacts = perform_simulation(
+            df_register, num_steps=steps, num_scenarios=scenarios, independent_sampling=True,
+            interim_files_dir=work_dir, save_interim_files=False, **SIMULATION_ENGINES["batched"])
+
+        if "extract_simulation_statistics" in selected:
+            yield ("extract_simulation_statistics", size, cells, lambda: extract_simulation_statistics(
+                dict_risk_impacts, df_register, df_total_impacts, interim_files_dir=work_dir,
+                save_interim_files=False))
+
+        if "output_writing" in selected:
+            for output_format in grid["output_formats"]:
+                yield ("output_writing", {**size, "output_format": output_format}, 2 * cells + steps * scenarios,
+                       lambda output_format=output_format: _write_outputs(
+                           output_format, work_dir, df_register, dict_risk_impacts, df_total_impacts))
+
+        if "reporting" in selected:
+            yield ("reporting", {**size, "stage": "summaries"}, steps * scenarios,
+                   lambda: compute_reporting_summaries(df_total_impacts))
+            summaries = compute_reporting_summaries(df_total_impacts)
+            yield ("reporting", {**size, "stage": "plots"}, steps * scenarios, lambda: _render_reports(summaries))
+
+def _write_outputs(output_format: str, work_dir: str, df_register: pd.DataFrame, dict_risk_impacts: dict,
+                   df_total_impacts: pd.DataFrame):
+    """Writes the per risk results & total impacts of a run like perform_simulation's interim files."""
+    output_dir = tempfile.mkdtemp(dir=work_dir)
+    output_writer = create_output_writer(output_format, output_dir)
+    for risk in df_register["Risk"]:
+        risk_impacts = dict_risk_impacts[str(risk)].to_numpy()
+        output_writer.write_risk_results(risk, risk_impacts, risk_impacts != 0)
+    output_writer.write_total_results(df_total_impacts.to_numpy())
+    output_writer.close()
+
+def _render_reports(summaries: dict):
+    """Renders tools.reporting's plots of the total impacts from their summaries (off-screen)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from tools.reporting import plot_final_impact_distribution, plot_loss_curve, plot_simulation
+
+    for plot in (plot_simulation, plot_final_impact_distribution, plot_loss_curve):
+        plot(summaries)
+        plt.gcf().canvas.draw()
+        plt.close("all")
+
+def run_benchmarks(grid_name: str = "smoke", repeats: int = 3, selected=BENCHMARKS):
+    """Runs the selected benchmarks over a grid of BENCHMARK_GRIDS & returns the results document."""
+    unknown_benchmarks = set(selected) - set(BENCHMARKS)
+    if unknown_benchmarks:
+        raise ValueError(f"Unknown benchmarks {sorted(unknown_benchmarks)}; expected {BENCHMARKS}.")
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for benchmark, parameters, cells, function in _benchmark_cases(BENCHMARK_GRIDS[grid_name], work_dir,
+                                                                        selected):
+            try:
+                measurement = measure(function, repeats=repeats)
+            except ImportError as error:
+                # Optional dependencies (e.g. pyarrow for parquet outputs)
+                results.append({"benchmark": benchmark, "parameters": parameters, "skipped": str(error)})
+                continue
+
+            measurement["cells_per_second"] = cells / measurement["seconds"] if measurement["seconds"] > 0 else None
+            results.append({"benchmark": benchmark, "parameters": parameters, **measurement})
+            logger.info(f"{benchmark} {parameters}: {measurement['seconds']:.4f}s, "
+                        f"peak {measurement['peak_bytes'] / 2 ** 20:.1f} MiB")
+
+    return {"format_version": RESULTS_FORMAT_VERSION, "created": datetime.now().isoformat(timespec='seconds'),
+            "grid": grid_name,
+            "environment": {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                            "platform": platform.platform(), "processor": platform.processor(),
+                            "cpu_count": os.cpu_count()},
+            "results": results}
+
+def _result_key(result: dict):
+    return result["benchmark"], json.dumps(result["parameters"], sort_keys=True)
+
+def compare_to_baseline(results: dict, baseline: dict, time_tolerance: float = 0.25,
+                        memory_tolerance: float = 0.10):
+    """Returns the regressions of results against a baseline results document (largest slowdowns first).
+
+    A benchmark regresses when its best time exceeds the baseline's by more than time_tolerance (relative) or its
+    peak allocations by more than memory_tolerance; benchmarks missing from either document are not compared."""
+    if baseline.get("format_version") != results.get("format_version"):
+        raise ValueError(f"Baseline format version {baseline.get('format_version')} does not match "
+                         f"{results.get('format_version')}; record a new baseline.")
+
+    baseline_results = {_result_key(result): result for result in baseline["results"] if "skipped" not in result}
+    regressions = []
+    for result in results["results"]:
+        baseline_result = baseline_results.get(_result_key(result))
+        if baseline_result is None or "skipped" in result:
+            continue
+
+        for metric, tolerance in (("seconds", time_tolerance), ("peak_bytes", memory_tolerance)):
+            if result[metric] > baseline_result[metric] * (1 + tolerance):
+                regressions.append({"benchmark": result["benchmark"], "parameters": result["parameters"],
+                                    "metric": metric, "baseline": baseline_result[metric],
+                                    "current": result[metric],
+                                    "ratio": result[metric] / baseline_result[metric]
+                                    if baseline_result[metric] else float('inf')})
+
+    return sorted(regressions, key=lambda regression: regression["ratio"], reverse=True)
+
+def main(arguments=None):
+    """Command line entry point: python -m benchmarks.run_benchmarks --grid default --output results.json
+    [--baseline baseline.json]. Exits with status 1 when a benchmark regresses against the baseline; the smoke
+    grid's reference results are kept in benchmarks/baseline_smoke.json. Timings only compare on the hardware a
+    baseline was recorded on: after changing machines (or RESULTS_FORMAT_VERSION), record a new one there with
+    --grid smoke --output benchmarks/baseline_smoke.json (default repeats) and commit it."""
+    parser = argparse.ArgumentParser(description="Times & measures the peak memory of the quantification hot paths.")
+    parser.add_argument("--grid", choices=sorted(BENCHMARK_GRIDS), default="smoke")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="JSON file receiving the results")
+    parser.add_argument("--baseline", help=f"results JSON of a previous run to compare against (e.g. {SMOKE_BASELINE})")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.10)
+    options = parser.parse_args(arguments)
+
+    # Benchmarks log their results; the engines' per risk messages are silenced
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for package in ("model", "tools"):
+        logging.getLogger(package).setLevel(logging.WARNING)
+
+    results = run_benchmarks(options.grid, repeats=options.repeats, selected=options.benchmarks)
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare_to_baseline(results, json.load(file), time_tolerance=options.time_tolerance,
+                                              memory_tolerance=options.memory_tolerance)
+        for regression in regressions:
+            logger.warning(f"REGRESSION {regression['benchmark']} {regression['parameters']} {regression['metric']}: "
+                           f"{regression['baseline']:.6g} -> {regression['current']:.6g} "
+                           f"(x{regression['ratio']:.2f})")
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Default share of every distribution among the synthetic risks (close to the production register)
+DEFAULT_DISTRIBUTION_MIX = {"Lognormal": 0.8, "Uniform": 0.1, "Normal": 0.1}
+
+TAXONOMIES = ("Business Environment", "Financial", "Operational", "Strategic", "Technology")
+
+def make_synthetic_register(num_risks: int, distribution_mix: dict = None, likelihood_range=(0.01, 0.5),
+                            seed: int = 0, first_risk_id: int = 1000):
+    """Returns a random register in the 'risk register lite.xlsx' schema (sheet 'RR Lite').
+
+    Distributions are drawn with the shares of distribution_mix, likelihoods log-uniformly within
+    likelihood_range, lognormal & uniform lower impacts log-uniformly in [1e4, 1e6] with max impacts 5 to 100 times
+    higher, normal means in [1e5, 1e7] with a standard deviation of 10% to 50% of the mean."""
+    distribution_mix = distribution_mix if distribution_mix is not None else DEFAULT_DISTRIBUTION_MIX
+    rng = np.random.default_rng(seed)
+
+    distributions = rng.choice(list(distribution_mix), size=num_risks,
+                               p=np.divide(list(distribution_mix.values()), sum(distribution_mix.values())))
+    likelihood = np.exp(rng.uniform(*np.log(likelihood_range), size=num_risks))
+    lower_impact = np.round(np.exp(rng.uniform(np.log(1e4), np.log(1e6), size=num_risks)), -3)
+    max_impact = np.round(lower_impact * rng.uniform(5, 100, size=num_risks), -3)
+    mean = np.round(np.exp(rng.uniform(np.log(1e5), np.log(1e7), size=num_risks)), -3)
+    std = np.round(mean * rng.uniform(0.1, 0.5, size=num_risks), -3)
+
+    is_normal = np.isin(distributions, ["Normal", "Deterministic Trend"])
+    taxonomies = rng.choice(TAXONOMIES, size=num_risks)
+
+    return pd.DataFrame({
+        "Risk": first_risk_id + np.arange(num_risks), "Horizon": "Business Plan", "Taxonomy Level I": taxonomies,
+        "Initial Likelihood": likelihood, "Converted Likelihood": likelihood,
+        "Initial Lower Impact": np.where(is_normal, 0.0, lower_impact),
+        "Converted Lower Impact": np.where(is_normal, 0.0, lower_impact),
+        "Initial Max Impact": np.where(is_normal, 0.0, max_impact),
+        "Converted Max Impact": np.where(is_normal, 0.0, max_impact), "Distribution": distributions,
+        "Mean": np.where(is_normal, mean, 0.0), "Std": np.where(distributions == "Normal", std, 0.0),
+        "Risk Title": [f"Synthetic risk {risk}" for risk in range(num_risks)], "Taxonomy Level II": taxonomies})
+
+def write_synthetic_register(register_dir: str, num_risks: int, file_name: str = r'risk register lite.xlsx',
+                             sheet: str = 'RR Lite', **register_options):
+    """Saves a synthetic register as a workbook readable by tools.register_reader & returns its path."""
+    os.makedirs(register_dir, exist_ok=True)
+    path = os.path.join(register_dir, file_name)
+    make_synthetic_register(num_risks, **register_options).to_excel(path, sheet_name=sheet, index=False)
+
+    return path
@@ -1,6 +1,56 @@
-from tools.register_reader import read_risk_register_lite
+import os
+import logging
+from typing import NamedTuple
+import pandas as pd
+from tools.register_reader import REGISTER_CACHE_DIR, load_risk_register_parameters, read_correlation_matrix
 from tools.directory_creator import create_output_dir
-from model.simple_simulation_engine import perform_simulation, extract_simulation_statistics
+from model.simple_simulation_engine import CopulaOptions, ExecutionOptions, SamplingOptions, perform_simulation, \
+    extract_simulation_statistics, save_materialization_statistics
+from model.materialization import MaterializationMap
+from model.streaming_simulation_engine import perform_streaming_simulation
+from model.adaptive_simulation_engine import perform_adaptive_simulation
+from model.sensitivity_sweep import perform_sensitivity_sweep
+from model.risk_allocation import DEFAULT_ALLOCATION_LEVELS, save_risk_allocation
+from model.aggregate_loss_fft import DEFAULT_GRID_POINTS, perform_aggregate_loss_fft
+from model.copula import FACTORIZATION_CACHE_DIR
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS
+from tools.instrumentation import NULL_INSTRUMENTATION, RunInstrumentation
+from tools.reporting_summaries import compute_reporting_summaries, save_reporting_summaries
+
+class QuantificationResults(NamedTuple):
+    """Outputs of perform_risk_register_quantification(full_results=True); outputs a run mode does not produce are
+    None."""
+    total_impacts: pd.DataFrame # Total impacts (horizon row only when streaming / adaptive) or the FFT distribution
+    risk_impacts: object # Per risk factor paths (dictionary or SimulationResultStore) of full-path runs
+    horizon_summary: pd.DataFrame # Per risk factor values at horizon per scenario
+    horizon_metrics: pd.DataFrame # Metrics of the total impact at horizon
+    materialization_map: MaterializationMap = None # With materialization_statistics=True
+
+def _quantification_outputs(results: QuantificationResults, full_results: bool):
+    """Returns all QuantificationResults, or the (total, per risk, horizon summary, metrics) tuple of a run."""
+    return results if full_results else tuple(results[:4])
+
+class QuantificationOptions(NamedTuple):
+    """Run mode & outputs of perform_risk_register_quantification besides those of the simulation itself."""
+    engine: str = 'monte_carlo' # Or 'fft': semi-analytic horizon distribution of independent risks
+    fft_grid_points: int = DEFAULT_GRID_POINTS # Loss grid of the 'fft' engine (model.aggregate_loss_fft)
+    streaming: bool = False # Chunks of scenario_chunk_size straight into horizon statistics (no per risk paths)
+    scenario_chunk_size: int = 65536
+    per_risk_horizon: bool = False # Per risk horizon table of streaming & adaptive runs (risks x scenarios; allocation)
+    adaptive: bool = False # Horizon-only batches until the metrics' CIs are narrower than target_relative_half_width
+    target_relative_half_width: float = 0.01
+    max_seconds: float = None # Time budget of adaptive runs
+    confidence_level: float = 95
+    var_levels: tuple = DEFAULT_VAR_LEVELS
+    es_levels: tuple = DEFAULT_ES_LEVELS
+    use_result_store: bool = False # Per risk paths in a memory-mapped store under the run's output folder
+    materialization_statistics: bool = False # Returns the MaterializationMap & saves its frequency tables
+    risk_allocation: bool = False # Euler contributions of risks & taxonomies to VaR & ES (model.risk_allocation)
+    allocation_levels: tuple = DEFAULT_ALLOCATION_LEVELS
+    reporting_summaries: bool = False # Fixed-size summaries for tools.reporting (tools.reporting_summaries)
+    instrument_run: bool = False # Saves run_manifest.json with the time & memory of every stage
+    instrumentation_callbacks: tuple = () # Called with every stage & risk measurement (tools.instrumentation)
+    trace_allocations: bool = False # Adds the peak traced allocations per stage, at some cost in speed
 
 def perform_risk_register_quantification(
         number_of_scenarios: int, number_of_steps: int,
@@ -10,36 +60,242 @@ def perform_risk_register_quantification(
         output_path_folder: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\outputs',
         save_interim_outputs: bool = True, seed_to_replicate_samples: int = 110,
         bernoulli_materialization_of_risks:bool = True,
-        apply_cap: bool = True, selected_cap: float = 400000000.00):
-    """Orchestrator function for performing the risk register quantification exercise."""
+        apply_cap: bool = True, selected_cap: float = 400000000.00, workers: int = 1,
+        options: QuantificationOptions = QuantificationOptions(), sampling: SamplingOptions = SamplingOptions(),
+        copula: CopulaOptions = CopulaOptions(), execution: ExecutionOptions = ExecutionOptions(),
+        full_results: bool = False):
+    """Orchestrator function for performing the risk register quantification exercise.
+
+    workers other than 1 spreads the simulation of risks over a process pool (None or 0 uses all cores). With
+    full_results=True the QuantificationResults (with the materialization map) are returned instead of the
+    (total impacts, per risk impacts, horizon summary, horizon metrics) tuple."""
+    if options.engine not in ('monte_carlo', 'fft'):
+        raise ValueError(f"Unknown engine '{options.engine}'; expected 'monte_carlo' or 'fft'.")
+    if options.engine == 'fft' and (copula.family is not None or options.risk_allocation):
+        raise ValueError("The FFT engine assumes independent risks & gives no per risk scenarios; use the Monte Carlo "
+                         "engine for copulas & risk allocation.")
+    # Streaming & adaptive runs draw scenario chunks, which legacy seeding cannot
+    if sampling.rng_mode is None:
+        sampling = sampling._replace(rng_mode='philox' if options.streaming or options.adaptive else 'legacy')
+    if options.adaptive:
+        # Adaptive runs draw plain keyed Philox streams in horizon-only batches (one process)
+        unsupported_options = {"sampling.rng_mode": sampling.rng_mode != 'philox',
+                               "sampling.scheme": sampling.scheme != 'pseudo',
+                               "sampling.replicates": sampling.replicates != 1,
+                               "sampling.importance_likelihood": sampling.importance_likelihood is not None,
+                               "workers": workers != 1,
+                               "execution.simulation_cache_dir": execution.simulation_cache_dir,
+                               "options.use_result_store": options.use_result_store,
+                               "options.materialization_statistics": options.materialization_statistics}
+        unsupported_options = [option for option, is_set in unsupported_options.items() if is_set]
+        if unsupported_options:
+            raise ValueError(f"Adaptive runs require sampling.rng_mode='philox' and do not support "
+                             f"{unsupported_options}.")
+    if (options.risk_allocation or options.reporting_summaries) and options.streaming and not options.adaptive \
+            and sampling.importance_likelihood is not None:
+        raise ValueError("Risk allocation & reporting summaries of importance-sampled runs require streaming=False "
+                         "(weights per scenario).")
 
     # Create output Directory
     output_path_part = create_output_dir(model_dir=output_path_folder)
 
+    # Stage, per risk & throughput measurements of the run (no-ops unless enabled)
+    instrumentation = NULL_INSTRUMENTATION
+    if options.instrument_run or options.instrumentation_callbacks:
+        instrumentation = RunInstrumentation(
+            output_path_part, callbacks=options.instrumentation_callbacks,
+            trace_allocations=options.trace_allocations,
+            settings={"number_of_scenarios": number_of_scenarios, "number_of_steps": number_of_steps,
+                      "register": risk_register_lite_filename, "engine": options.engine, "adaptive": options.adaptive,
+                      "streaming": options.streaming, "batched_simulation": execution.batched,
+                      "rng_mode": sampling.rng_mode, "workers": workers,
+                      "sampling_scheme": sampling.scheme, "copula": copula.family,
+                      "output_format": execution.output_format, "save_interim_outputs": save_interim_outputs})
+
     # Import risk register lite from respective folder
-    df_risk_register = read_risk_register_lite(file_name=risk_register_lite_filename,
-                                               register_dir=risk_register_lite_path, sheet=risk_register_sheet_name)
+    with instrumentation.stage('load_register'):
+        df_risk_register, register_parameters = load_risk_register_parameters(
+            file_name=risk_register_lite_filename, register_dir=risk_register_lite_path,
+            sheet=risk_register_sheet_name, cache_dir=os.path.join(output_path_folder, REGISTER_CACHE_DIR))
+
+    # Import the correlation matrix of the copula from the register folder
+    if copula.family is not None and copula.correlations is None:
+        copula = copula._replace(correlations=read_correlation_matrix(
+            register_dir=risk_register_lite_path, file_name=copula.correlation_file_name,
+            sheet=copula.correlation_sheet_name))
+    if copula.factorization_cache_dir is None:
+        copula = copula._replace(factorization_cache_dir=os.path.join(output_path_folder, FACTORIZATION_CACHE_DIR))
+    copula_options = dict(copula=copula.family, correlations=copula.correlations, copula_structure=copula.structure,
+                          copula_degrees_of_freedom=copula.degrees_of_freedom,
+                          factorization_cache_dir=copula.factorization_cache_dir)
+
+    if options.engine == 'fft':
+        with instrumentation.stage('aggregate_loss_fft'):
+            df_aggregate_distribution, df_metrics_total_impact_horizon = perform_aggregate_loss_fft(
+                df_lite_rr=df_risk_register, register_parameters=register_parameters,
+                num_steps=number_of_steps,
+                independent_sampling=bernoulli_materialization_of_risks, interim_files_dir=output_path_part,
+                save_interim_files=save_interim_outputs, cap_apply=apply_cap, max_cap=selected_cap,
+                var_levels=options.var_levels, es_levels=options.es_levels, grid_points=options.fft_grid_points,
+                output_format=execution.output_format)
+
+        instrumentation.write_manifest()
+
+        return _quantification_outputs(
+            QuantificationResults(df_aggregate_distribution, None, None, df_metrics_total_impact_horizon), full_results)
+
+    if options.adaptive:
+        with instrumentation.stage('adaptive_simulation'):
+            df_total_risk_factors, df_horizon_summary_per_rf_per_scenario, df_metrics_total_impact_horizon = \
+                perform_adaptive_simulation(
+                    df_lite_rr=df_risk_register, register_parameters=register_parameters,
+                    num_steps=number_of_steps, max_scenarios=number_of_scenarios,
+                    independent_sampling=bernoulli_materialization_of_risks, interim_files_dir=output_path_part,
+                    save_interim_files=save_interim_outputs, selected_seed=seed_to_replicate_samples,
+                    cap_apply=apply_cap, max_cap=selected_cap,
+                    target_relative_half_width=options.target_relative_half_width, max_seconds=options.max_seconds,
+                    batch_size=options.scenario_chunk_size, var_levels=options.var_levels,
+                    es_levels=options.es_levels, confidence=options.confidence_level,
+                    output_format=execution.output_format,
+                    per_risk_horizon=options.per_risk_horizon or options.risk_allocation, **copula_options)
+
+        if options.risk_allocation:
+            with instrumentation.stage('risk_allocation'):
+                save_risk_allocation(df_horizon_summary_per_rf_per_scenario, output_path_part,
+                                     var_levels=options.allocation_levels, es_levels=options.allocation_levels,
+                                     output_format=execution.output_format)
+
+        if options.reporting_summaries:
+            with instrumentation.stage('reporting_summaries'):
+                save_reporting_summaries(compute_reporting_summaries(df_total_risk_factors), output_path_part)
+
+        instrumentation.write_manifest()
+
+        return _quantification_outputs(QuantificationResults(
+            df_total_risk_factors, None, df_horizon_summary_per_rf_per_scenario, df_metrics_total_impact_horizon),
+            full_results)
+
+    if options.streaming:
+        with instrumentation.stage('streaming_simulation', scenarios=number_of_scenarios):
+            df_total_risk_factors, df_horizon_summary_per_rf_per_scenario, df_metrics_total_impact_horizon = \
+                perform_streaming_simulation(
+                    df_lite_rr=df_risk_register, register_parameters=register_parameters,
+                    num_steps=number_of_steps, num_scenarios=number_of_scenarios,
+                    independent_sampling=bernoulli_materialization_of_risks, interim_files_dir=output_path_part,
+                    save_interim_files=save_interim_outputs, selected_seed=seed_to_replicate_samples,
+                    cap_apply=apply_cap, max_cap=selected_cap, rng_mode=sampling.rng_mode,
+                    chunk_size=options.scenario_chunk_size, var_levels=options.var_levels, es_levels=options.es_levels,
+                    output_format=execution.output_format,
+                    sampling_scheme=sampling.scheme, replicates=sampling.replicates,
+                    importance_likelihood=sampling.importance_likelihood, importance_risks=sampling.importance_risks,
+                    importance_severity_shift=sampling.importance_severity_shift,
+                    per_risk_horizon=options.per_risk_horizon or options.risk_allocation, **copula_options)
+
+        if options.risk_allocation:
+            with instrumentation.stage('risk_allocation'):
+                save_risk_allocation(df_horizon_summary_per_rf_per_scenario, output_path_part,
+                                     var_levels=options.allocation_levels, es_levels=options.allocation_levels,
+                                     output_format=execution.output_format)
+
+        if options.reporting_summaries:
+            with instrumentation.stage('reporting_summaries'):
+                save_reporting_summaries(compute_reporting_summaries(df_total_risk_factors), output_path_part)
+
+        instrumentation.write_manifest()
+
+        return _quantification_outputs(QuantificationResults(
+            df_total_risk_factors, None, df_horizon_summary_per_rf_per_scenario, df_metrics_total_impact_horizon),
+            full_results)
+
+    # Per risk paths of full-path runs optionally go to a memory-mapped store under the run's output folder
+    if options.use_result_store:
+        execution = execution._replace(result_store_dir=os.path.join(output_path_part, "result_store"))
 
     # Perform the simulation of impact for all risk factors / risks in the risk register
-    df_total_risk_factors, dictionary_paths_per_risk_factor = perform_simulation(
-            df_lite_rr=df_risk_register, save_interim_files=save_interim_outputs,
-            interim_files_dir=output_path_part, num_steps=number_of_steps,
-            num_scenarios=number_of_scenarios, selected_seed=seed_to_replicate_samples,
-            independent_sampling=bernoulli_materialization_of_risks, cap_apply=apply_cap, max_cap=selected_cap)
+    with instrumentation.stage('simulation', scenarios=number_of_scenarios):
+        simulation_results = perform_simulation(
+                df_lite_rr=df_risk_register, register_parameters=register_parameters,
+                save_interim_files=save_interim_outputs,
+                interim_files_dir=output_path_part, num_steps=number_of_steps,
+                num_scenarios=number_of_scenarios, selected_seed=seed_to_replicate_samples,
+                independent_sampling=bernoulli_materialization_of_risks, cap_apply=apply_cap, max_cap=selected_cap,
+                workers=workers, sampling=sampling, copula=copula, execution=execution, full_results=True,
+                return_materialization_map=options.materialization_statistics, instrumentation=instrumentation)
+    df_total_risk_factors = simulation_results.total_impacts
+    dictionary_paths_per_risk_factor = simulation_results.risk_impacts
+    scenario_weights = simulation_results.scenario_weights
 
     # Extract useful statistics based on simulation's results
-    df_horizon_summary_per_rf_per_scenario, df_metrics_total_impact_horizon = extract_simulation_statistics(
-            risk_factor_df_dict=dictionary_paths_per_risk_factor, df_rr_lite=df_risk_register,
-            save_interim_files=save_interim_outputs, interim_files_dir=output_path_part,
-        df_total_impact_results=df_total_risk_factors)
+    with instrumentation.stage('statistics', scenarios=number_of_scenarios):
+        df_horizon_summary_per_rf_per_scenario, df_metrics_total_impact_horizon = extract_simulation_statistics(
+                risk_factor_df_dict=dictionary_paths_per_risk_factor, df_rr_lite=df_risk_register,
+                save_interim_files=save_interim_outputs, interim_files_dir=output_path_part,
+            df_total_impact_results=df_total_risk_factors, var_levels=options.var_levels,
+            es_levels=options.es_levels, output_format=execution.output_format, replicates=sampling.replicates,
+            scenario_weights=scenario_weights)
+
+    if options.risk_allocation:
+        with instrumentation.stage('risk_allocation'):
+            save_risk_allocation(df_horizon_summary_per_rf_per_scenario, output_path_part,
+                                 var_levels=options.allocation_levels, es_levels=options.allocation_levels,
+                                 output_format=execution.output_format,
+                                 weights=scenario_weights[-1] if scenario_weights is not None else None)
+
+    if options.reporting_summaries:
+        with instrumentation.stage('reporting_summaries'):
+            save_reporting_summaries(compute_reporting_summaries(
+                df_total_risk_factors, weights=scenario_weights[-1] if scenario_weights is not None else None),
+                output_path_part)
+
+    if options.materialization_statistics and save_interim_outputs:
+        with instrumentation.stage('materialization_statistics'):
+            save_materialization_statistics(simulation_results.materialization_map, df_risk_register, output_path_part,
+                                            output_format=execution.output_format)
+
+    instrumentation.write_manifest()
+
+    return _quantification_outputs(QuantificationResults(
+        df_total_risk_factors, dictionary_paths_per_risk_factor, df_horizon_summary_per_rf_per_scenario,
+        df_metrics_total_impact_horizon, materialization_map=simulation_results.materialization_map), full_results)
+
+def perform_register_sensitivity_sweep(
+        sweep_grid, number_of_scenarios: int, number_of_steps: int,
+        risk_register_lite_path: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\inputs',
+        risk_register_lite_filename: str = r'risk register lite.xlsx',
+        risk_register_sheet_name: str = r'RR Lite',
+        output_path_folder: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\outputs',
+        save_interim_outputs: bool = True, seed_to_replicate_samples: int = 110,
+        bernoulli_materialization_of_risks: bool = True, apply_cap: bool = True, selected_cap: float = 400000000.00,
+        scenario_chunk_size: int = 65536, var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+        output_format: str = 'npy'):
+    """Orchestrator function for what-if analyses: horizon metrics of every point of sweep_grid.
+
+    Grid points are dictionaries overriding apply_cap ('cap_apply'), selected_cap ('max_cap'), the Bernoulli
+    materialization ('independent_sampling') or scaling likelihoods & impacts ('likelihood_scale', 'impact_scale',
+    optionally of 'scaled_risks' only). All points share the random numbers of one rng_mode 'philox' run, so their
+    differences carry no sampling noise (see model.sensitivity_sweep). Returns the tidy sweep table."""
+
+    # Create output Directory
+    output_path_part = create_output_dir(model_dir=output_path_folder)
+
+    # Import risk register lite from respective folder
+    df_risk_register, register_parameters = load_risk_register_parameters(
+        file_name=risk_register_lite_filename, register_dir=risk_register_lite_path, sheet=risk_register_sheet_name,
+        cache_dir=os.path.join(output_path_folder, REGISTER_CACHE_DIR))
 
-    return (df_total_risk_factors, dictionary_paths_per_risk_factor, df_horizon_summary_per_rf_per_scenario,
-            df_metrics_total_impact_horizon)
+    return perform_sensitivity_sweep(
+        df_lite_rr=df_risk_register, register_parameters=register_parameters,
+        num_steps=number_of_steps, num_scenarios=number_of_scenarios, grid=sweep_grid,
+        independent_sampling=bernoulli_materialization_of_risks, interim_files_dir=output_path_part,
+        save_interim_files=save_interim_outputs, selected_seed=seed_to_replicate_samples, cap_apply=apply_cap,
+        max_cap=selected_cap, chunk_size=scenario_chunk_size, var_levels=var_levels, es_levels=es_levels,
+        output_format=output_format)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
 
-    df_temporary,_, _,_ = perform_risk_register_quantification(5, 4)
+    df_temporary, _, _, _ = perform_risk_register_quantification(5, 4)
 
     #print(df_temporary)
     #print(df_temporary.info())
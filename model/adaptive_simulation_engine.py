@@ -0,0 +1,260 @@
+import time
+import logging
+import numpy as np
+import pandas as pd
+from scipy import stats
+from model.batched_simulation_engine import extract_register_parameters, simulate_register_batched
+from model.simple_simulation_engine import build_horizon_summary, save_statistics_files
+from tools.output_writers import validate_output_format
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS, compute_tail_metrics, tail_metrics_to_frame, \
+    tail_size, top_tail_metrics
+from model.copula import create_copula_sampler
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of batch means the confidence intervals are computed from (at most twice as many are kept)
+DEFAULT_CI_BATCHES = 20
+
+# Convergence is re-checked once the scenario count has grown by this factor since the last check
+CHECK_GROWTH = 1.1
+
+# The largest totals kept for the VaR & ES estimates, as a multiple of the number the lowest level needs
+TOP_TOTALS_MARGIN = 2
+
+def _merge_sorted(first: np.ndarray, second: np.ndarray):
+    """Merges two sorted vectors (timsort merges the two runs in linear time)."""
+    merged = np.concatenate([first, second])
+    merged.sort(kind='stable')
+    return merged
+
+class HorizonMetricEstimates:
+    """Mergeable estimates of the horizon metrics & their CI half-widths, updated chunk by chunk.
+
+    Totals fill contiguous batches of batch_scenarios scenarios whose metrics are computed once. Once 2 x
+    ci_batches batches are full, neighbouring batches are merged (their sorted totals in linear time) and the batch
+    size doubles, so the CIs rest on ci_batches to 2 x ci_batches - 1 equal batches. VaR & ES are read from the
+    sorted largest totals, which each chunk extends by its totals above their smallest value, and the expected
+    impact from a running sum, so that no check sorts all totals."""
+
+    def __init__(self, batch_scenarios: int, var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+                 ci_batches: int = DEFAULT_CI_BATCHES):
+        self.batch_scenarios = max(1, batch_scenarios)
+        self.var_levels, self.es_levels, self.ci_batches = var_levels, es_levels, ci_batches
+
+        self.total_chunks, self.num_totals, self.total_sum = [], 0, 0.0
+        self.batches, self.batch_metrics, self.pending_totals = [], [], np.empty(0)
+        self.top_totals, self.top_threshold = np.empty(0), np.inf
+
+    def add(self, totals: np.ndarray):
+        """Adds the horizon totals of the next scenarios."""
+        self.total_chunks.append(totals)
+        self.num_totals += len(totals)
+        self.total_sum += float(np.sum(totals))
+
+        top_totals = totals[totals >= self.top_threshold]
+        if len(top_totals):
+            self.top_totals = _merge_sorted(self.top_totals, np.sort(top_totals))
+
+        self.pending_totals = np.concatenate([self.pending_totals, totals])
+        while len(self.pending_totals) >= self.batch_scenarios:
+            self._add_batch(np.sort(self.pending_totals[:self.batch_scenarios]))
+            self.pending_totals = self.pending_totals[self.batch_scenarios:]
+
+    def _add_batch(self, sorted_totals: np.ndarray):
+        self.batches.append(sorted_totals)
+        self.batch_metrics.append(self._metrics(sorted_totals))
+
+        if len(self.batches) == 2 * self.ci_batches:
+            self.batches = [_merge_sorted(first, second)
+                            for first, second in zip(self.batches[::2], self.batches[1::2])]
+            self.batch_metrics = [self._metrics(sorted_totals) for sorted_totals in self.batches]
+            self.batch_scenarios *= 2
+
+    def _metrics(self, totals: np.ndarray):
+        return compute_tail_metrics(totals, var_levels=self.var_levels, es_levels=self.es_levels)
+
+    def totals(self):
+        """Returns the horizon totals added so far, in scenario order."""
+        return np.concatenate(self.total_chunks)
+
+    def point_estimates(self):
+        """Returns the VaR & ES levels and the expected impact of the totals added so far."""
+        needed = tail_size(self.num_totals, tuple(self.var_levels) + tuple(self.es_levels))
+        if len(self.top_totals) < needed:
+            # Re-select the largest totals with a margin, so that the next chunks only extend them
+            totals = self.totals()
+            kept = min(len(totals), TOP_TOTALS_MARGIN * needed)
+            self.top_threshold = np.partition(totals, len(totals) - kept)[len(totals) - kept]
+            self.top_totals = np.sort(totals[totals >= self.top_threshold])
+
+        tail_metrics = top_tail_metrics(self.top_totals, self.num_totals, var_levels=self.var_levels,
+                                        es_levels=self.es_levels)
+        tail_metrics["Expected"] = self.total_sum / self.num_totals
+
+        return tail_metrics
+
+    def half_widths(self, confidence: float = 95):
+        """Returns the CI half-widths of the metrics: Student-t quantile at the confidence level (in percent) times
+        the standard error of their batch estimates (totals not yet in a full batch are left out)."""
+        batches = len(self.batch_metrics)
+        t_quantile = stats.t.ppf(0.5 + confidence / 200, batches - 1)
+
+        def half_width(values):
+            return float(t_quantile * np.std(values, ddof=1) / np.sqrt(batches))
+
+        half_widths = {"VaR": {level: half_width([metrics["VaR"][level] for metrics in self.batch_metrics])
+                               for level in self.batch_metrics[0]["VaR"]},
+                       "ES": {level: half_width([metrics["ES"][level] for metrics in self.batch_metrics])
+                              for level in self.batch_metrics[0]["ES"]}}
+        for metric in ("Expected", "Median", "Mode"):
+            half_widths[metric] = half_width([metrics[metric] for metrics in self.batch_metrics])
+
+        return half_widths
+
+def relative_half_widths(tail_metrics: dict, half_widths: dict):
+    """Returns the half-widths relative to the metric values, shaped like compute_tail_metrics.
+
+    A metric that is 0 in every batch (e.g. a low VaR level of rare risks) has a half-width of 0 and counts as
+    converged; a metric of 0 with a positive half-width has an infinite relative half-width. Metrics missing from
+    tail_metrics (e.g. the median of point_estimates) are left out."""
+    def relative(half_width, value):
+        if half_width == 0:
+            return 0.0
+        return half_width / abs(value) if value else np.inf
+
+    relative_widths = {"VaR": {level: relative(half_widths["VaR"][level], value)
+                               for level, value in tail_metrics["VaR"].items()},
+                       "ES": {level: relative(half_widths["ES"][level], value)
+                              for level, value in tail_metrics["ES"].items()}}
+    for metric in ("Expected", "Median", "Mode"):
+        if metric in tail_metrics:
+            relative_widths[metric] = relative(half_widths[metric], tail_metrics[metric])
+
+    return relative_widths
+
+def widest_relative_half_width(relative_widths: dict):
+    """Returns the name & value of the widest relative half-width among the VaR & ES levels and expected impact."""
+    candidates = {f"{level:g}% VaR": value for level, value in relative_widths["VaR"].items()}
+    candidates.update({f"{level:g}% ES": value for level, value in relative_widths["ES"].items()})
+    candidates["Expected Impact"] = relative_widths["Expected"]
+
+    return max(candidates.items(), key=lambda item: item[1])
+
+def precision_to_frame(tail_metrics: dict, half_widths: dict, confidence: float = 95):
+    """Lays out the CI half-widths & relative half-widths as rows matching the metrics table."""
+    return pd.concat([tail_metrics_to_frame(half_widths, index=f"{confidence:g}% CI Half-Width"),
+                      tail_metrics_to_frame(relative_half_widths(tail_metrics, half_widths),
+                                            index=f"{confidence:g}% CI Relative Half-Width")])
+
+def run_adaptive_horizon_simulation(register_parameters: dict, num_steps: int, max_scenarios: int,
+                                    target_relative_half_width: float = 0.01, max_seconds: float = None,
+                                    batch_size: int = 65536, min_scenarios: int = None,
+                                    independent_sampling: bool = True, selected_seed: int = 110,
+                                    cap_apply: bool = True, max_cap: float = 400000000.00,
+                                    var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+                                    confidence: float = 95, ci_batches: int = DEFAULT_CI_BATCHES,
+                                    keep_per_risk_horizon: bool = False, uniform_sampler=None):
+    """Simulates horizon impacts in batches until the metrics converge or the budget runs out.
+
+    Batches extend the keyed Philox streams scenario by scenario, so the first n scenarios of an adaptive run equal
+    a fixed run of n scenarios. The run stops once the relative CI half-width of every VaR & ES level and of the
+    expected impact is at most target_relative_half_width, or once max_scenarios / max_seconds are reached.
+    Checks use HorizonMetricEstimates; the returned metrics are computed once from all totals. Returns the horizon
+    totals, the per risk horizon matrix (only with keep_per_risk_horizon=True, None otherwise), the tail metrics,
+    their half-widths and whether the target was met. uniform_sampler (e.g. a model.copula.CopulaSampler) replaces
+    the plain streams."""
+    min_scenarios = min_scenarios or min(max_scenarios, ci_batches * 1000)
+    start_time = time.perf_counter()
+
+    estimates = HorizonMetricEstimates(min(min_scenarios, max_scenarios) // ci_batches, var_levels=var_levels,
+                                       es_levels=es_levels, ci_batches=ci_batches)
+    horizon_per_rf_chunks = []
+    scenarios, checked_scenarios, converged = 0, 0, False
+
+    while scenarios < max_scenarios:
+        scenario_stop = min(scenarios + batch_size, max_scenarios)
+
+        impacts, _ = simulate_register_batched(
+            register_parameters=register_parameters, num_steps=num_steps, num_scenarios=scenario_stop - scenarios,
+            independent_sampling=independent_sampling, selected_seed=selected_seed, cap_apply=cap_apply,
+            max_cap=max_cap, rng_mode='philox', scenario_start=scenarios, first_step=num_steps - 1,
+            uniform_sampler=uniform_sampler)
+
+        estimates.add(np.add.reduce(impacts[:, 0, :], axis=0))
+        if keep_per_risk_horizon:
+            horizon_per_rf_chunks.append(impacts[:, 0, :])
+        scenarios = scenario_stop
+
+        out_of_time = max_seconds is not None and time.perf_counter() - start_time >= max_seconds
+        if scenarios < min_scenarios or (scenarios < CHECK_GROWTH * checked_scenarios and not out_of_time
+                                         and scenarios < max_scenarios):
+            continue
+
+        worst_metric, worst_value = widest_relative_half_width(
+            relative_half_widths(estimates.point_estimates(), estimates.half_widths(confidence)))
+        checked_scenarios = scenarios
+
+        logger.info(f"{scenarios} scenarios: widest relative CI half-width {worst_value:.4%} ({worst_metric})")
+
+        if worst_value <= target_relative_half_width:
+            converged = True
+            break
+        if out_of_time:
+            logger.info(f"Time budget of {max_seconds} seconds reached.")
+            break
+
+    horizon_total_impacts = estimates.totals()
+    tail_metrics = compute_tail_metrics(horizon_total_impacts, var_levels=var_levels, es_levels=es_levels)
+    half_widths = estimates.half_widths(confidence)
+    horizon_values_per_rf = np.hstack(horizon_per_rf_chunks) if keep_per_risk_horizon else None
+
+    return horizon_total_impacts, horizon_values_per_rf, tail_metrics, half_widths, converged
+
+def perform_adaptive_simulation(df_lite_rr: pd.DataFrame, num_steps: int, max_scenarios: int,
+                                independent_sampling: bool, interim_files_dir: str, save_interim_files: bool = True,
+                                selected_seed: int = 110, cap_apply: bool = True, max_cap: float = 400000000.00,
+                                target_relative_half_width: float = 0.01, max_seconds: float = None,
+                                batch_size: int = 65536, var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+                                confidence: float = 95, output_format: str = 'npy', copula: str = None,
+                                correlations: pd.DataFrame = None, copula_structure: str = 'taxonomy',
+                                copula_degrees_of_freedom: float = 4.0, factorization_cache_dir: str = None,
+                                register_parameters: dict = None, per_risk_horizon: bool = False):
+    """Performs a run-until-converged simulation & extracts the horizon statistics.
+
+    Returns the same tables as perform_streaming_simulation, with max_scenarios scenarios at most; the total impact
+    metrics table gains the CI half-width & relative half-width of every metric (copula options as in
+    perform_simulation). As in streaming runs, the per risk factor table is only built with per_risk_horizon=True."""
+    if save_interim_files:
+        validate_output_format(output_format, max_scenarios if per_risk_horizon else 0)
+
+    if register_parameters is None:
+        register_parameters = extract_register_parameters(df_lite_rr)
+    uniform_sampler = create_copula_sampler(copula, register_parameters, correlations,
+                                            copula_structure=copula_structure,
+                                            degrees_of_freedom=copula_degrees_of_freedom,
+                                            cache_dir=factorization_cache_dir)
+
+    horizon_total_impacts, horizon_values_per_rf, tail_metrics, half_widths, converged = \
+        run_adaptive_horizon_simulation(
+            register_parameters=register_parameters, num_steps=num_steps, max_scenarios=max_scenarios,
+            target_relative_half_width=target_relative_half_width, max_seconds=max_seconds, batch_size=batch_size,
+            independent_sampling=independent_sampling, selected_seed=selected_seed, cap_apply=cap_apply,
+            max_cap=max_cap, var_levels=var_levels, es_levels=es_levels, confidence=confidence,
+            keep_per_risk_horizon=per_risk_horizon, uniform_sampler=uniform_sampler)
+
+    df_horizon_total_impacts = pd.DataFrame(horizon_total_impacts.reshape(1, -1), index=[num_steps - 1])
+    df_horizon_values_per_rf = build_horizon_summary(horizon_values_per_rf, df_lite_rr) if per_risk_horizon else None
+    df_impact_total_at_horizon_metrics = pd.concat([tail_metrics_to_frame(tail_metrics, index="Horizon"),
+                                                    precision_to_frame(tail_metrics, half_widths, confidence)])
+
+    if save_interim_files:
+        save_statistics_files(df_horizon_values_per_rf, df_impact_total_at_horizon_metrics, interim_files_dir,
+                              output_format=output_format)
+
+    if converged:
+        logger.info(f"Adaptive simulation converged after {len(horizon_total_impacts)} scenarios.")
+    else:
+        logger.warning(f"Adaptive simulation stopped after {len(horizon_total_impacts)} scenarios without reaching "
+                       f"a relative CI half-width of {target_relative_half_width:.4%}.")
+
+    return df_horizon_total_impacts, df_horizon_values_per_rf, df_impact_total_at_horizon_metrics
@@ -0,0 +1,182 @@
+import logging
+import numpy as np
+import pandas as pd
+from scipy import signal
+from scipy import special as sp
+from model.batched_simulation_engine import extract_register_parameters
+from model.random_streams import risk_stream_key
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS, tail_metrics_to_frame
+from model.vectorized_simulation_engine import distribution_group, lognormal_parameters
+from tools.output_writers import create_output_writer
+
+logger = logging.getLogger(__name__)
+
+# Default number of points spanning the aggregate loss grid
+DEFAULT_GRID_POINTS = 2 ** 18
+
+# Severity tail probability beyond which the loss grid is truncated
+TAIL_PROBABILITY = 1e-10
+
+def capped_severity_cdf(losses: np.ndarray, distribution: str, mean: float = 0.0, std: float = 1.0,
+                        min_impact: float = 0.0, max_impact: float = 1.0, cap_apply: bool = True,
+                        max_cap: float = 400000000.00):
+    """CDF of a risk's severity (as sampled by the engines, lognormal tails in min / max impact) after the cap."""
+    group = distribution_group(str(distribution))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if group == "normal":
+            cdf = sp.ndtr((losses - mean) / std) if std > 0 else (losses >= mean).astype(np.float64)
+        elif group == "lognormal":
+            estimated_mean, estimated_sigma = lognormal_parameters(min_impact, max_impact)
+            cdf = np.where(losses > 0, sp.ndtr((np.log(np.maximum(losses, 1e-300)) - estimated_mean)
+                                               / estimated_sigma), 0.0)
+        elif group == "uniform":
+            cdf = np.clip((losses - min_impact) / (max_impact - min_impact), 0.0, 1.0) if max_impact > min_impact \
+                else (losses >= min_impact).astype(np.float64)
+        else:
+            raise ValueError(f"Distribution '{distribution}' has no parametric severity for the FFT engine.")
+
+    if cap_apply:
+        cdf = np.where(losses >= max_cap, 1.0, cdf)
+
+    return cdf
+
+def severity_support(distribution: str, mean: float = 0.0, std: float = 1.0, min_impact: float = 0.0,
+                     max_impact: float = 1.0, cap_apply: bool = True, max_cap: float = 400000000.00):
+    """Lowest & highest capped severity kept on the grid (quantiles TAIL_PROBABILITY & 1 - TAIL_PROBABILITY)."""
+    group = distribution_group(str(distribution))
+    tail_quantile = sp.ndtri(1 - TAIL_PROBABILITY)
+    if group == "normal":
+        lower, upper = mean - tail_quantile * std, mean + tail_quantile * std
+    elif group == "lognormal":
+        estimated_mean, estimated_sigma = lognormal_parameters(min_impact, max_impact)
+        lower, upper = 0.0, np.exp(estimated_mean + tail_quantile * estimated_sigma)
+    elif group == "uniform":
+        lower, upper = min_impact, max_impact
+    else:
+        raise ValueError(f"Distribution '{distribution}' has no parametric severity for the FFT engine.")
+
+    if cap_apply:
+        lower, upper = min(lower, max_cap), min(upper, max_cap)
+
+    return lower, upper
+
+def aggregate_loss_distribution(register_parameters: dict, num_steps: int, independent_sampling: bool = True,
+                                cap_apply: bool = True, max_cap: float = 400000000.00,
+                                grid_points: int = DEFAULT_GRID_POINTS):
+    """Returns the grid losses & probabilities of the total impact at horizon of independent risks.
+
+    Each risk's capped severity is discretized by rounding onto a common grid (mass of a grid point = CDF
+    increment over its half-width neighbourhood), mixed with a point mass at zero for not materializing (with
+    independent_sampling), and all risks are convolved (FFT). Rows sharing a risk ID read the same draws, so they
+    count as one risk scaled by their number of rows; deterministic trends shift the total by mean *
+    (num_steps - 1). grid_points sets the step: about grid_points points span the sum of the risks' supports."""
+    keys = np.array([risk_stream_key(risk) for risk in register_parameters["risk"]])
+    _, first_positions, multiplicity = np.unique(keys, return_index=True, return_counts=True)
+
+    shift = 0.0
+    risks = []
+    for position, rows in zip(first_positions, multiplicity):
+        distribution = register_parameters["distribution"][position]
+        parameters = {key: float(register_parameters[key][position]) for key in ("mean", "std", "min_impact",
+                                                                                 "max_impact")}
+        if distribution_group(str(distribution)) == "Deterministic Trend":
+            shift += rows * parameters["mean"] * (num_steps - 1)
+            continue
+
+        likelihood = float(register_parameters["likelihood"][position]) if independent_sampling else 1.0
+        lower, upper = severity_support(distribution, cap_apply=cap_apply, max_cap=max_cap, **parameters)
+        if likelihood < 1.0:
+            lower, upper = min(lower, 0.0), max(upper, 0.0)
+        risks.append((distribution, parameters, likelihood, rows, rows * lower, rows * upper))
+
+    # Without random risks (only trends or constant impacts) the total is a single loss
+    total_span = sum(risk[5] - risk[4] for risk in risks)
+    if total_span <= 0:
+        return np.array([sum(risk[4] for risk in risks) + shift]), np.ones(1)
+
+    # Common grid step h: grid_points over the span of the total
+    step = total_span / grid_points
+
+    # Per risk probabilities on the grid points first_point, first_point + 1, ...
+    risk_distributions = []
+    for distribution, parameters, likelihood, rows, lower, upper in risks:
+        first_point = int(np.floor(lower / step))
+        points = first_point + np.arange(int(np.ceil(upper / step)) - first_point + 2)
+
+        # Mass of grid point k: CDF increment of rows x severity over ((k - 1/2) h, (k + 1/2) h]
+        cdf = capped_severity_cdf((points + 0.5) * step / rows, distribution, cap_apply=cap_apply, max_cap=max_cap,
+                                  **parameters)
+        probabilities = np.diff(np.r_[0.0, cdf]) * likelihood
+        if likelihood < 1.0:
+            # Point mass of not materializing at zero loss (inside the risk's points, as lower <= 0)
+            probabilities[-first_point] += 1.0 - likelihood
+
+        risk_distributions.append((first_point, probabilities))
+
+    # Pairwise convolutions (FFT-based for long supports) sized to the combined support of each pair, so the
+    # total costs about log2(risks) FFTs of the full grid and nothing wraps around
+    while len(risk_distributions) > 1:
+        paired_distributions = [(first_a + first_b, signal.convolve(probabilities_a, probabilities_b))
+                                for (first_a, probabilities_a), (first_b, probabilities_b)
+                                in zip(risk_distributions[::2], risk_distributions[1::2])]
+        risk_distributions = paired_distributions + risk_distributions[len(paired_distributions) * 2:]
+
+    first_point, probabilities = risk_distributions[0]
+    probabilities = np.clip(probabilities, 0.0, None)
+    probabilities /= probabilities.sum()
+    losses = (first_point + np.arange(len(probabilities))) * step + shift
+
+    return losses, probabilities
+
+def aggregate_tail_metrics(losses: np.ndarray, probabilities: np.ndarray, var_levels=DEFAULT_VAR_LEVELS,
+                           es_levels=DEFAULT_ES_LEVELS):
+    """Tail metrics of a discrete loss distribution, shaped & defined like compute_tail_metrics.
+
+    VaR is the smallest grid loss whose cumulative probability reaches the level; ES the mean of the losses at or
+    above the level's VaR; mode the grid loss of largest probability."""
+    cumulative = np.cumsum(probabilities)
+
+    def quantiles(levels):
+        positions = np.searchsorted(cumulative, np.true_divide(levels, 100) - 1e-12, side='left')
+        return np.minimum(positions, len(losses) - 1)
+
+    var_levels = np.asarray(var_levels, dtype=np.float64)
+    es_levels = np.asarray(es_levels, dtype=np.float64)
+    tail_probabilities = np.cumsum(probabilities[::-1])[::-1]
+    tail_losses = np.cumsum((losses * probabilities)[::-1])[::-1]
+    es_starts = quantiles(es_levels)
+
+    return {"VaR": dict(zip(var_levels.tolist(), losses[quantiles(var_levels)].tolist())),
+            "ES": dict(zip(es_levels.tolist(), (tail_losses[es_starts] / tail_probabilities[es_starts]).tolist())),
+            "Expected": float(np.sum(losses * probabilities)), "Median": float(losses[quantiles(50.0)]),
+            "Mode": float(losses[np.argmax(probabilities)])}
+
+def perform_aggregate_loss_fft(df_lite_rr: pd.DataFrame, num_steps: int, independent_sampling: bool,
+                               interim_files_dir: str, save_interim_files: bool = True, cap_apply: bool = True,
+                               max_cap: float = 400000000.00, var_levels=DEFAULT_VAR_LEVELS,
+                               es_levels=DEFAULT_ES_LEVELS, grid_points: int = DEFAULT_GRID_POINTS,
+                               output_format: str = 'npy', register_parameters: dict = None):
+    """Computes the total impact metrics at horizon semi-analytically (see aggregate_loss_distribution).
+
+    Returns the aggregate loss distribution ('Loss' & 'Probability' per grid point) and the total impact metrics
+    table laid out like the Monte Carlo engines' one."""
+    if register_parameters is None:
+        register_parameters = extract_register_parameters(df_lite_rr)
+
+    losses, probabilities = aggregate_loss_distribution(
+        register_parameters, num_steps=num_steps, independent_sampling=independent_sampling, cap_apply=cap_apply,
+        max_cap=max_cap, grid_points=grid_points)
+
+    df_aggregate_distribution = pd.DataFrame({"Loss": losses, "Probability": probabilities})
+    df_impact_total_at_horizon_metrics = tail_metrics_to_frame(
+        aggregate_tail_metrics(losses, probabilities, var_levels=var_levels, es_levels=es_levels))
+
+    if save_interim_files:
+        output_writer = create_output_writer(output_format, interim_files_dir)
+        output_writer.write_table("Total Impact Metrics at Horizon", df_impact_total_at_horizon_metrics)
+        output_writer.close()
+
+    step = losses[1] - losses[0] if len(losses) > 1 else 0.0
+    logger.info(f"Aggregate loss distribution on {len(losses)} grid points (step {step:.6g}) computed successfully!")
+
+    return df_aggregate_distribution, df_impact_total_at_horizon_metrics
@@ -0,0 +1,112 @@
+import time
+import numpy as np
+import pandas as pd
+from model.vectorized_simulation_engine import distribution_group, lognormal_parameters, simulate_risk_group
+from tools.instrumentation import NULL_INSTRUMENTATION
+
+def extract_register_parameters(df_lite_rr: pd.DataFrame, risk_id_column: str = 'Risk'):
+    """Converts the risk register into a table of parameter arrays keyed by risk ID (one entry per risk, in
+    register order).
+
+    Duplicated risk IDs take the parameters of their first row, as the per-risk lookups of perform_simulation do.
+    The mu & sigma of lognormal risks are precomputed from their tails (NaN for other distributions)."""
+    df_first_rows = df_lite_rr.drop_duplicates(subset=risk_id_column).set_index(risk_id_column)
+    df_first_rows = df_first_rows.loc[df_lite_rr[risk_id_column]]
+
+    register_parameters = {
+        "risk": df_lite_rr[risk_id_column].to_numpy(),
+        "likelihood": df_first_rows['Converted Likelihood'].to_numpy(dtype=np.float64),
+        "min_impact": df_first_rows['Converted Lower Impact'].to_numpy(dtype=np.float64),
+        "max_impact": df_first_rows['Converted Max Impact'].to_numpy(dtype=np.float64),
+        "distribution": df_first_rows['Distribution'].to_numpy(dtype=object),
+        "mean": df_first_rows['Mean'].to_numpy(dtype=np.float64),
+        "std": df_first_rows['Std'].to_numpy(dtype=np.float64),
+        "taxonomy": df_first_rows['Taxonomy Level I'].to_numpy(dtype=object),
+    }
+    register_parameters["lognormal_mu"], register_parameters["lognormal_sigma"] = \
+        register_lognormal_parameters(register_parameters)
+
+    return register_parameters
+
+def register_lognormal_parameters(register_parameters: dict):
+    """Returns the lognormal mu & sigma of every risk of the parameter table (NaN for other distributions)."""
+    lognormal = np.array([distribution_group(str(value)) == "lognormal"
+                          for value in register_parameters["distribution"]], dtype=bool)
+    lognormal_mu = np.full(len(lognormal), np.nan)
+    lognormal_sigma = np.full(len(lognormal), np.nan)
+    lognormal_mu[lognormal], lognormal_sigma[lognormal] = lognormal_parameters(
+        register_parameters["min_impact"][lognormal], register_parameters["max_impact"][lognormal])
+
+    return lognormal_mu, lognormal_sigma
+
+def group_risks_by_distribution(register_parameters: dict):
+    """Returns a dictionary of sampling branch -> indices (register positions) of the risks using it."""
+    groups = np.array([distribution_group(str(value)) for value in register_parameters["distribution"]])
+
+    return {group: np.flatnonzero(groups == group) for group in dict.fromkeys(groups)}
+
+def group_stream_ranks(register_parameters: dict):
+    """Returns the rank of every risk in the keyed stream of its distribution group (rng_mode 'philox_grouped').
+
+    Ranks number the distinct risk IDs of each group in register order, so duplicated IDs share their draws as
+    with per risk streams. Subsets of the register (e.g. parallel partitions) keep the ranks of the full register."""
+    ranks = np.empty(len(register_parameters["risk"]), dtype=np.int64)
+    for indices in group_risks_by_distribution(register_parameters).values():
+        risk_ids = register_parameters["risk"][indices].tolist()
+        rank_of_risk = {risk_id: rank for rank, risk_id in enumerate(dict.fromkeys(risk_ids))}
+        ranks[indices] = [rank_of_risk[risk_id] for risk_id in risk_ids]
+
+    return ranks
+
+def simulate_register_batched(register_parameters: dict, num_steps: int, num_scenarios: int,
+                              independent_sampling: bool = True, selected_seed: int = 110,
+                              cap_apply: bool = True, max_cap: float = 400000000.00, rng_mode: str = 'philox',
+                              scenario_start: int = 0, first_step: int = 0, uniform_sampler=None,
+                              stream_ranks: np.ndarray = None, stream_scenarios: int = None,
+                              instrumentation=NULL_INSTRUMENTATION):
+    """Samples all risks of the register as a (risks x steps x scenarios) tensor, one batch per distribution.
+
+    Severity transforms, masking & capping run once per distribution group. How draws are batched depends on
+    rng_mode:
+    - 'philox_grouped': each group reads one keyed stream per step & component (one draw per group & step), at
+      the risks' stream_ranks (default: group_stream_ranks of the register) over stream_scenarios (the scenarios
+      of the full run when sampling a chunk starting at scenario_start);
+    - 'philox': every risk reads its own keyed stream per step & component, bit-identical to sampling the risks one
+      by one, but setting up a stream costs tens of microseconds, i.e. grows with risks x steps;
+    - 'legacy': reseeds the global RNG per risk & step.
+    first_step > 0 only samples the last num_steps - first_step steps. uniform_sampler selects a variance-reduction
+    scheme (see model.sampling_schemes). Every distribution group is timed with instrumentation.record_group."""
+    number_of_risks = len(register_parameters["risk"])
+    if rng_mode == 'philox_grouped' and stream_ranks is None:
+        stream_ranks = group_stream_ranks(register_parameters)
+    lognormal_mu, lognormal_sigma = register_parameters.get("lognormal_mu"), register_parameters.get("lognormal_sigma")
+    impacts = np.empty((number_of_risks, num_steps - first_step, num_scenarios), dtype=np.float64)
+    realizations = np.empty((number_of_risks, num_steps - first_step, num_scenarios), dtype=np.int8)
+
+    for group, indices in group_risks_by_distribution(register_parameters).items():
+        if instrumentation.enabled:
+            group_wall_start, group_cpu_start = time.perf_counter(), time.process_time()
+
+        impacts[indices], realizations[indices] = simulate_risk_group(
+            distribution=group, risk_ids=register_parameters["risk"][indices],
+            likelihood=register_parameters["likelihood"][indices], mean=register_parameters["mean"][indices],
+            std=register_parameters["std"][indices], min_impact=register_parameters["min_impact"][indices],
+            max_impact=register_parameters["max_impact"][indices], steps=num_steps, scenario_start=scenario_start,
+            scenario_stop=scenario_start + num_scenarios, seed=selected_seed,
+            independent_risk_sampling=independent_sampling, cap_impact_per_risk=cap_apply, cap_value=max_cap,
+            rng_mode=rng_mode, first_step=first_step, uniform_sampler=uniform_sampler,
+            stream_ranks=stream_ranks[indices] if stream_ranks is not None else None,
+            stream_scenarios=stream_scenarios,
+            lognormal_mu=lognormal_mu[indices] if lognormal_mu is not None else None,
+            lognormal_sigma=lognormal_sigma[indices] if lognormal_sigma is not None else None)
+
+        if instrumentation.enabled:
+            instrumentation.record_group(group, register_parameters["risk"][indices],
+                                         time.perf_counter() - group_wall_start,
+                                         time.process_time() - group_cpu_start, num_scenarios)
+
+    # Uniforms cached for risks outside this register (e.g. of other parallel tasks) are not read again
+    if uniform_sampler is not None:
+        uniform_sampler.clear_cache()
+
+    return impacts, realizations
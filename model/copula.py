@@ -0,0 +1,298 @@
+import os
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from scipy import special as sp
+from model.random_streams import (LARGEST_UNIFORM, MATERIALIZATION_STREAM, SEVERITY_STREAM, UNIFORM_OFFSET,
+                                  draw_risk_uniforms, draw_stream_uniforms, risk_stream_key)
+
+logger = logging.getLogger(__name__)
+
+# Supported copula families & dependence structures
+COPULA_FAMILIES = ("gaussian", "t")
+COPULA_STRUCTURES = ("taxonomy", "risk")
+
+# Stream components of the uniforms a copula correlates
+COPULA_COMPONENTS = (MATERIALIZATION_STREAM, SEVERITY_STREAM)
+
+# Common factors & the t mixing variable read the streams of component + offset (keyed by factor index)
+FACTOR_STREAM_OFFSET = 4
+MIXING_STREAM_OFFSET = 6
+
+# Folder of cached Cholesky factors under a run's outputs folder (see cached_cholesky)
+FACTORIZATION_CACHE_DIR = '.factorization_cache'
+
+# Smallest eigenvalue kept when repairing a correlation matrix that is not positive definite
+MIN_EIGENVALUE = 1e-10
+
+def nearest_correlation_matrix(correlation: np.ndarray):
+    """Clips the eigenvalues of a symmetric matrix & rescales it to a unit diagonal (positive definite)."""
+    eigenvalues, eigenvectors = np.linalg.eigh((correlation + correlation.T) / 2)
+    repaired = (eigenvectors * np.maximum(eigenvalues, MIN_EIGENVALUE)) @ eigenvectors.T
+    scale = 1 / np.sqrt(np.diag(repaired))
+
+    return repaired * np.outer(scale, scale)
+
+def cached_cholesky(correlation: np.ndarray, cache_dir: str = None):
+    """Returns the lower Cholesky factor of a correlation matrix, reusing a factor cached on disk by content hash.
+
+    Matrices that are not positive definite are repaired first (see nearest_correlation_matrix)."""
+    correlation = np.ascontiguousarray(correlation, dtype=np.float64)
+    cache_path = None
+    if cache_dir is not None:
+        digest = hashlib.sha256(str(correlation.shape).encode() + correlation.tobytes()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"cholesky_{digest[:32]}.npy")
+        if os.path.exists(cache_path):
+            return np.load(cache_path)
+
+    try:
+        cholesky_factor = np.linalg.cholesky(correlation)
+    except np.linalg.LinAlgError:
+        logger.warning("Correlation matrix is not positive definite; using the nearest valid correlation matrix.")
+        cholesky_factor = np.linalg.cholesky(nearest_correlation_matrix(correlation))
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_path, cholesky_factor)
+
+    return cholesky_factor
+
+class CopulaSampler:
+    """Correlated (risk, step, component) uniforms of a Gaussian or Student-t copula, as drop-in for
+    draw_risk_uniforms (see model.sampling_schemes.UniformSampler).
+
+    Latent normals come either from a factor model Z = A F + d * e (O(risks x factors)) or from the Cholesky
+    factor of a full correlation matrix Z = L e (O(risks^2)), one matrix product for all distinct risks per (step,
+    component, scenario range). The uniforms are cached until every risk has read its row or clear_cache() is
+    called; parallel runs compute them once (draw_all_uniforms) & share them with their workers (use_uniforms).
+    Idiosyncratic normals e read the risks' own streams (through base_sampler when given), common factors & the t
+    mixing variable keyed streams of their own, so draws do not depend on chunking or on which risks a process
+    samples."""
+    def __init__(self, risk_ids, family: str = 'gaussian', degrees_of_freedom: float = 4.0,
+                 factor_loadings: np.ndarray = None, cholesky_factor: np.ndarray = None, base_sampler=None):
+        if family not in COPULA_FAMILIES:
+            raise ValueError(f"Unknown copula '{family}'; expected one of {COPULA_FAMILIES}.")
+        if (factor_loadings is None) == (cholesky_factor is None):
+            raise ValueError("Provide either factor loadings or a Cholesky factor.")
+
+        first_risk_ids = {}
+        for risk in risk_ids:
+            first_risk_ids.setdefault(risk_stream_key(risk), risk)
+        self.rows = {key: row for row, key in enumerate(first_risk_ids)} # Latent row of every distinct risk
+        self.stream_ids = list(first_risk_ids.values()) # Risk ID (as read by the streams) of every latent row
+
+        self.family = family
+        self.degrees_of_freedom = degrees_of_freedom
+        self.factor_loadings = factor_loadings # (distinct risks x factors) or None
+        self.cholesky_factor = cholesky_factor # (distinct risks x distinct risks) or None
+        self.base_sampler = base_sampler
+        self._common_cache = {} # (factors, t mixing divisor) per step, component & scenario range
+        self._cache = {} # (uniforms of all rows, latent rows read) per step, component & scenario range
+        self._shared_uniforms = None # (seed, scenario start, scenario stop, draw_all_uniforms array) or None
+
+        if factor_loadings is not None:
+            self.idiosyncratic_scale = np.sqrt(np.clip(1 - np.sum(factor_loadings**2, axis=1), 0.0, None))
+
+    def __getstate__(self):
+        # Cached & shared uniforms are not shipped to worker processes
+        state = self.__dict__.copy()
+        state["_common_cache"], state["_cache"], state["_shared_uniforms"] = {}, {}, None
+
+        return state
+
+    @classmethod
+    def from_taxonomy_correlations(cls, risk_ids, taxonomies, df_taxonomy_correlations: pd.DataFrame,
+                                   family: str = 'gaussian', degrees_of_freedom: float = 4.0, cache_dir: str = None,
+                                   base_sampler=None):
+        """One factor per taxonomy: the diagonal of the (taxonomy x taxonomy) matrix holds the correlation of two
+        risks within a taxonomy, off-diagonal entries the correlation between risks of two taxonomies. Risks of
+        taxonomies missing from the matrix are independent."""
+        labels = [str(label) for label in df_taxonomy_correlations.index]
+        correlation = df_taxonomy_correlations.loc[:, df_taxonomy_correlations.index].to_numpy(dtype=np.float64)
+
+        # Loadings on the own taxonomy factor & correlation between taxonomy factors
+        loadings = np.sqrt(np.clip(np.diag(correlation), 0.0, 1.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor_correlation = np.nan_to_num(correlation / np.outer(loadings, loadings))
+        np.fill_diagonal(factor_correlation, 1.0)
+        factor_cholesky = cached_cholesky(factor_correlation, cache_dir=cache_dir)
+
+        # Duplicated risk IDs take the taxonomy of their first row
+        first_taxonomies = {}
+        for risk, taxonomy in zip(risk_ids, taxonomies):
+            first_taxonomies.setdefault(risk_stream_key(risk), str(taxonomy))
+
+        factor_loadings = np.zeros((len(first_taxonomies), len(labels)))
+        for row, taxonomy in enumerate(first_taxonomies.values()):
+            if taxonomy in labels:
+                taxonomy_index = labels.index(taxonomy)
+                factor_loadings[row] = loadings[taxonomy_index] * factor_cholesky[taxonomy_index]
+
+        return cls(risk_ids, family=family, degrees_of_freedom=degrees_of_freedom, factor_loadings=factor_loadings,
+                   base_sampler=base_sampler)
+
+    @classmethod
+    def from_risk_correlations(cls, risk_ids, df_risk_correlations: pd.DataFrame, family: str = 'gaussian',
+                               degrees_of_freedom: float = 4.0, cache_dir: str = None, base_sampler=None):
+        """Full (risk x risk) correlation matrix indexed by risk ID; risks missing from it are independent."""
+        unique_risks = list(dict.fromkeys(str(risk) for risk in risk_ids))
+        df_correlations = df_risk_correlations.copy()
+        df_correlations.index = df_correlations.index.astype(str)
+        df_correlations.columns = df_correlations.columns.astype(str)
+
+        correlation = df_correlations.reindex(index=unique_risks, columns=unique_risks).to_numpy(dtype=np.float64)
+        correlation = np.nan_to_num(correlation)
+        np.fill_diagonal(correlation, 1.0)
+
+        return cls(risk_ids, family=family, degrees_of_freedom=degrees_of_freedom,
+                   cholesky_factor=cached_cholesky(correlation, cache_dir=cache_dir), base_sampler=base_sampler)
+
+    def draw(self, seed: int, risk_id, component: int, steps: int, scenario_start: int, scenario_stop: int,
+             out: np.ndarray = None, first_step: int = 0):
+        """Returns a ((steps - first_step) x scenarios) array of correlated uniforms for one risk and component."""
+        if out is None:
+            out = np.empty((steps - first_step, scenario_stop - scenario_start), dtype=np.float64)
+
+        row = self.rows[risk_stream_key(risk_id)]
+        for out_row, step in enumerate(range(first_step, steps)):
+            out[out_row] = self._row_uniforms(seed, row, step, component, scenario_start, scenario_stop)
+
+        return out
+
+    def draw_all_uniforms(self, seed: int, steps: int, scenario_start: int, scenario_stop: int,
+                          out: np.ndarray = None):
+        """Returns the (components x steps x distinct risks x scenarios) uniforms of every latent row, components
+        being the materialization & severity streams (e.g. computed once in the parent of a parallel run)."""
+        if out is None:
+            out = np.empty((len(COPULA_COMPONENTS), steps, len(self.stream_ids), scenario_stop - scenario_start))
+
+        for position, component in enumerate(COPULA_COMPONENTS):
+            for step in range(steps):
+                self._latent_uniforms(seed, step, component, scenario_start, scenario_stop, out=out[position, step])
+        self._common_cache.clear()
+
+        return out
+
+    def use_uniforms(self, uniforms: np.ndarray, seed: int = None, scenario_start: int = 0, scenario_stop: int = 0):
+        """Reads draws of seed & the scenario range from uniforms (as returned by draw_all_uniforms) rather than
+        computing them; None reverts to computing them."""
+        self._shared_uniforms = (seed, scenario_start, scenario_stop, uniforms) if uniforms is not None else None
+
+    def clear_cache(self):
+        """Drops cached uniforms & common draws, e.g. once a task has read the rows of its risks."""
+        self._common_cache.clear()
+        self._cache.clear()
+        if self.base_sampler is not None:
+            self.base_sampler.clear_cache()
+
+    @staticmethod
+    def _clear_other_ranges(cache: dict, seed: int, scenario_start: int, scenario_stop: int):
+        """Drops cached entries of another seed or scenario range (keys: seed, step, component, start, stop)."""
+        if any(key[0] != seed or key[3:] != (scenario_start, scenario_stop) for key in cache):
+            cache.clear()
+
+    def _draw_idiosyncratic(self, seed: int, row: int, step: int, component: int, scenario_start: int,
+                            scenario_stop: int, out: np.ndarray):
+        """Draws the (1 x scenarios) idiosyncratic standard normals of a latent row from the risk's own stream."""
+        draw_uniforms = self.base_sampler.draw if self.base_sampler is not None else draw_risk_uniforms
+        draw_uniforms(seed, self.stream_ids[row], component, step + 1, scenario_start, scenario_stop, out=out,
+                      first_step=step)
+        sp.ndtri(out, out=out)
+
+    def _common_draws(self, seed: int, step: int, component: int, scenario_start: int, scenario_stop: int):
+        """Returns the (factors x scenarios) common factor normals (None without factor model) & the t mixing
+        divisor sqrt(W / nu) (None for the Gaussian copula) of a step, component & scenario range (cached)."""
+        cache_key = (seed, step, component, scenario_start, scenario_stop)
+        if cache_key not in self._common_cache:
+            self._clear_other_ranges(self._common_cache, seed, scenario_start, scenario_stop)
+
+            factors = None
+            if self.factor_loadings is not None:
+                factors = np.empty((self.factor_loadings.shape[1], scenario_stop - scenario_start))
+                for factor in range(len(factors)):
+                    draw_stream_uniforms(seed, factor, step, FACTOR_STREAM_OFFSET + component, scenario_start,
+                                         scenario_stop, out=factors[factor])
+                sp.ndtri(factors, out=factors)
+
+            mixing_divisor = None
+            if self.family == 't':
+                # W chi-squared (nu), shared by all risks of a scenario
+                mixing = draw_stream_uniforms(seed, 0, step, MIXING_STREAM_OFFSET + component, scenario_start,
+                                              scenario_stop)
+                mixing_divisor = np.sqrt(2 * sp.gammaincinv(self.degrees_of_freedom / 2, mixing) /
+                                         self.degrees_of_freedom)
+
+            self._common_cache[cache_key] = factors, mixing_divisor
+
+        return self._common_cache[cache_key]
+
+    def _latent_to_uniforms(self, latent: np.ndarray, mixing_divisor: np.ndarray):
+        """Transforms latent normals (in place) to copula uniforms."""
+        if self.family == 't':
+            latent /= mixing_divisor
+            sp.stdtr(self.degrees_of_freedom, latent, out=latent)
+        else:
+            sp.ndtr(latent, out=latent)
+
+        return np.clip(latent, UNIFORM_OFFSET, LARGEST_UNIFORM, out=latent)
+
+    def _latent_uniforms(self, seed: int, step: int, component: int, scenario_start: int, scenario_stop: int,
+                         out: np.ndarray = None):
+        """Returns the (distinct risks x scenarios) copula uniforms of a step, component & scenario range."""
+        factors, mixing_divisor = self._common_draws(seed, step, component, scenario_start, scenario_stop)
+
+        latent = np.empty((len(self.stream_ids), scenario_stop - scenario_start)) if out is None else out
+        for latent_row in range(len(latent)):
+            self._draw_idiosyncratic(seed, latent_row, step, component, scenario_start, scenario_stop,
+                                     out=latent[latent_row:latent_row + 1])
+
+        if self.factor_loadings is not None:
+            latent *= self.idiosyncratic_scale[:, np.newaxis]
+            latent += self.factor_loadings @ factors
+        else:
+            latent[:] = self.cholesky_factor @ latent
+
+        return self._latent_to_uniforms(latent, mixing_divisor)
+
+    def _row_uniforms(self, seed: int, row: int, step: int, component: int, scenario_start: int,
+                      scenario_stop: int):
+        """Returns the copula uniforms of one latent row, read from the shared uniforms when they cover the draw or
+        from the cached uniforms of all rows, which are dropped once every latent row has been read."""
+        if self._shared_uniforms is not None and self._shared_uniforms[:3] == (seed, scenario_start, scenario_stop):
+            return self._shared_uniforms[3][COPULA_COMPONENTS.index(component), step, row]
+
+        cache_key = (seed, step, component, scenario_start, scenario_stop)
+        if cache_key not in self._cache:
+            self._clear_other_ranges(self._cache, seed, scenario_start, scenario_stop)
+            self._cache[cache_key] = self._latent_uniforms(seed, step, component, scenario_start,
+                                                           scenario_stop), set()
+
+        uniforms, rows_read = self._cache[cache_key]
+        rows_read.add(row)
+        if len(rows_read) == len(self.stream_ids):
+            del self._cache[cache_key]
+
+        return uniforms[row]
+
+def create_copula_sampler(copula: str, register_parameters: dict, correlations: pd.DataFrame,
+                          copula_structure: str = 'taxonomy', degrees_of_freedom: float = 4.0, cache_dir: str = None,
+                          base_sampler=None, rng_mode: str = 'philox'):
+    """Returns the CopulaSampler of a run (wrapping base_sampler), or base_sampler when copula is None."""
+    if copula is None:
+        return base_sampler
+    if rng_mode != 'philox':
+        raise ValueError("Copulas require rng_mode='philox'.")
+    if correlations is None:
+        raise ValueError("A copula requires a correlation matrix.")
+    if copula_structure not in COPULA_STRUCTURES:
+        raise ValueError(f"Unknown copula_structure '{copula_structure}'; expected one of {COPULA_STRUCTURES}.")
+
+    if copula_structure == 'taxonomy':
+        return CopulaSampler.from_taxonomy_correlations(
+            register_parameters["risk"], register_parameters["taxonomy"], correlations, family=copula,
+            degrees_of_freedom=degrees_of_freedom, cache_dir=cache_dir, base_sampler=base_sampler)
+
+    return CopulaSampler.from_risk_correlations(
+        register_parameters["risk"], correlations, family=copula, degrees_of_freedom=degrees_of_freedom,
+        cache_dir=cache_dir, base_sampler=base_sampler)
@@ -1,6 +1,76 @@
 import numpy as np
 import pandas as pd
 import os
+from model.sampling_schemes import draw_standard_normals
+
+def _gbm_parameters(mu, sigma, initial_value):
+    """Broadcasts per asset drift, volatility & initial value to float64 vectors."""
+    return np.broadcast_arrays(*(np.atleast_1d(np.asarray(value, dtype=np.float64))
+                                 for value in (mu, sigma, initial_value)))
+
+def simulate_gbm_paths(mu, sigma, initial_value, horizon: float, num_steps: int, num_simulations: int,
+                       dtype: str = 'float64', out: np.ndarray = None, output_file: str = None,
+                       rng: np.random.Generator = None, seed: int = None, sampling_scheme: str = 'pseudo'):
+    """Simulates Geometric Brownian Motion paths of many assets, written in place into a single buffer.
+
+    mu, sigma & initial_value are scalars or arrays with one entry per asset. Paths are sampled on the grid
+    t = linspace(0, horizon, num_steps) starting from initial_value. The (assets x num_steps x num_simulations)
+    output is out if given, else a new .npy memory map when output_file is given, else a new array; the normal
+    draws, their cumulative sum & the exponent are all computed inside it, so no further path-sized buffer is used
+    ('pseudo' sampling; other schemes of model.sampling_schemes treat the steps of a path as its dimensions).
+    Returns the time grid (num_steps x 1) and the paths."""
+    mu, sigma, initial_value = _gbm_parameters(mu, sigma, initial_value)
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    shape = (len(mu), num_steps, num_simulations)
+
+    if out is None:
+        out = np.lib.format.open_memmap(output_file, mode='w+', dtype=dtype, shape=shape) \
+            if output_file is not None else np.empty(shape, dtype=dtype)
+    if out.shape != shape:
+        raise ValueError(f"Output buffer has shape {out.shape}, expected {shape}.")
+
+    # Define the time-steps array & the (constant) distance between random variables in process
+    t = np.linspace(0, horizon, num_steps).reshape(num_steps, 1)
+    dt = horizon / (num_steps - 1) if num_steps > 1 else 0.0
+
+    for asset in range(len(mu)):
+        log_path = out[asset]
+
+        # Log-increments: (mu - sigma^2 / 2) * dt + sigma * sqrt(dt) * Z
+        draw_standard_normals(log_path[1:], sampling_scheme=sampling_scheme, rng=rng)
+        log_path[1:] *= sigma[asset] * np.sqrt(dt)
+        log_path[1:] += (mu[asset] - 0.5 * sigma[asset]**2) * dt
+
+        # Cumulate the log-increments step by step (in place) & exponentiate
+        log_path[0] = np.log(initial_value[asset])
+        for step in range(1, num_steps):
+            log_path[step] += log_path[step - 1]
+        np.exp(log_path, out=log_path)
+
+    if isinstance(out, np.memmap):
+        out.flush()
+
+    return t, out
+
+def simulate_gbm_horizon(mu, sigma, initial_value, horizon: float, num_simulations: int, dtype: str = 'float64',
+                         out: np.ndarray = None, rng: np.random.Generator = None, seed: int = None,
+                         sampling_scheme: str = 'pseudo'):
+    """Draws Geometric Brownian Motion values of many assets at the horizon directly from the lognormal law.
+
+    Returns an (assets x num_simulations) array, written in place into out if given."""
+    mu, sigma, initial_value = _gbm_parameters(mu, sigma, initial_value)
+    rng = rng if rng is not None else np.random.default_rng(seed)
+
+    if out is None:
+        out = np.empty((len(mu), num_simulations), dtype=dtype)
+
+    # S(T) = S(0) * exp((mu - sigma^2 / 2) * T + sigma * sqrt(T) * Z)
+    draw_standard_normals(out, sampling_scheme=sampling_scheme, rng=rng)
+    out *= (sigma * np.sqrt(horizon)).reshape(-1, 1)
+    out += (np.log(initial_value) + (mu - 0.5 * sigma**2) * horizon).reshape(-1, 1)
+    np.exp(out, out=out)
+
+    return out
 
 class GeometricBM:
     """Class Constructing & Simulating a Geometric Brownian Motion Stochastic Process."""
@@ -40,6 +110,12 @@ class GeometricBM:
 
         return t, s
 
+    def simulate_horizon(self, dtype: str = 'float64', seed: int = None):
+        """Samples the Geometric Brownian Motion only at the horizon (lognormal terminal law)."""
+        return simulate_gbm_horizon(mu=self.mu, sigma=self.sigma, initial_value=self.initial_value,
+                                    horizon=self.horizon, num_simulations=self.num_simulations, dtype=dtype,
+                                    seed=seed)[0]
+
 
 
 
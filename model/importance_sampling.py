@@ -0,0 +1,115 @@
+import numpy as np
+from scipy import special as sp
+from model.random_streams import SEVERITY_STREAM, draw_risk_uniforms
+from model.vectorized_simulation_engine import SEVERITY_DISTRIBUTIONS, distribution_group, lognormal_parameters
+
+# Severity shifts apply to the distributions sampled through a standard normal
+SHIFTABLE_DISTRIBUTIONS = ("normal", "lognormal")
+
+def validate_importance_sampling(rng_mode: str, severity_shift: float = 0.0):
+    """Raises an error for severity shifts without per risk Philox streams (severity draws cannot be recovered)."""
+    if severity_shift and rng_mode != 'philox':
+        raise ValueError("Importance sampling with a severity shift requires rng_mode='philox'.")
+
+def first_risk_positions(register_parameters: dict):
+    """Register positions of the first row of every distinct risk ID, in register order."""
+    _, first_positions = np.unique(register_parameters["risk"].astype(str), return_index=True)
+
+    return np.sort(first_positions)
+
+def build_proposal_parameters(register_parameters: dict, proposal_likelihood: float, risks=None,
+                              severity_shift: float = 0.0):
+    """Returns the register parameters to sample from under importance sampling & the severity shift per risk.
+
+    Selected risks (by default the rare ones, with likelihood below proposal_likelihood; never deterministic trends,
+    whose impacts do not depend on materializations) materialize with probability max(likelihood,
+    proposal_likelihood); normal & lognormal severities of selected risks are shifted by
+    severity_shift standard deviations of their underlying normal (lognormal tails are scaled accordingly)."""
+    groups = np.array([distribution_group(str(value)) for value in register_parameters["distribution"]])
+    if risks is None:
+        selected = register_parameters["likelihood"] < proposal_likelihood
+    else:
+        selected = np.isin(register_parameters["risk"].astype(str), [str(risk) for risk in risks])
+    selected &= np.isin(groups, SEVERITY_DISTRIBUTIONS)
+
+    proposal_parameters = {key: values.copy() for key, values in register_parameters.items()}
+    proposal_parameters["likelihood"][selected] = np.maximum(register_parameters["likelihood"][selected],
+                                                             proposal_likelihood)
+
+    severity_shifts = np.where(selected & np.isin(groups, SHIFTABLE_DISTRIBUTIONS), float(severity_shift), 0.0)
+
+    normal = groups == "normal"
+    proposal_parameters["mean"][normal] += severity_shifts[normal] * register_parameters["std"][normal]
+
+    lognormal = (groups == "lognormal") & (severity_shifts != 0)
+    if "lognormal_sigma" in register_parameters:
+        estimated_sigma = register_parameters["lognormal_sigma"][lognormal]
+    else:
+        _, estimated_sigma = lognormal_parameters(register_parameters["min_impact"][lognormal],
+                                                  register_parameters["max_impact"][lognormal])
+    tail_scale = np.exp(severity_shifts[lognormal] * estimated_sigma)
+    proposal_parameters["min_impact"][lognormal] *= tail_scale
+    proposal_parameters["max_impact"][lognormal] *= tail_scale
+
+    # The precomputed lognormal parameters follow the shifted tails
+    if "lognormal_mu" in proposal_parameters:
+        proposal_parameters["lognormal_mu"][lognormal], proposal_parameters["lognormal_sigma"][lognormal] = \
+            lognormal_parameters(proposal_parameters["min_impact"][lognormal],
+                                 proposal_parameters["max_impact"][lognormal])
+
+    return proposal_parameters, severity_shifts
+
+def add_risk_log_likelihood_ratio(log_weights: np.ndarray, risk_id, likelihood: float, proposal_likelihood: float,
+                                  severity_shift: float, realizations: np.ndarray, seed: int = 110,
+                                  scenario_start: int = 0, first_step: int = 0, independent_sampling: bool = True,
+                                  uniform_sampler=None):
+    """Adds the log likelihood ratio (target / proposal density) of one risk to the (steps x scenarios) weights.
+
+    The Bernoulli term is log(p / q) where the risk materializes and log((1 - p) / (1 - q)) elsewhere; it only
+    counts when materializations mask impacts (independent_sampling). The severity term -shift * e - shift^2 / 2
+    (e: standard normal drawn from the risk's severity uniforms) counts where the severity is used, i.e. everywhere
+    unless materializations mask impacts."""
+    if independent_sampling and proposal_likelihood != likelihood:
+        materialized_term = np.log(likelihood) - np.log(proposal_likelihood) if likelihood > 0 else -np.inf
+        log_weights += np.where(realizations.astype(bool), materialized_term,
+                                np.log1p(-likelihood) - np.log1p(-proposal_likelihood))
+
+    if severity_shift != 0:
+        steps = first_step + realizations.shape[0]
+        scenario_stop = scenario_start + realizations.shape[1]
+        if uniform_sampler is not None:
+            severity_normals = uniform_sampler.draw(seed, risk_id, SEVERITY_STREAM, steps, scenario_start,
+                                                    scenario_stop, first_step=first_step)
+        else:
+            severity_normals = draw_risk_uniforms(seed, risk_id, SEVERITY_STREAM, steps, scenario_start,
+                                                  scenario_stop, first_step=first_step)
+        sp.ndtri(severity_normals, out=severity_normals)
+
+        severity_term = -severity_shift * severity_normals - 0.5 * severity_shift**2
+        log_weights += np.where(realizations.astype(bool), severity_term, 0.0) if independent_sampling \
+            else severity_term
+
+    return log_weights
+
+def register_log_likelihood_ratios(register_parameters: dict, proposal_parameters: dict, severity_shifts: np.ndarray,
+                                   realizations: np.ndarray, selected_seed: int = 110, scenario_start: int = 0,
+                                   first_step: int = 0, independent_sampling: bool = True, uniform_sampler=None):
+    """Returns the (steps x scenarios) log likelihood ratios of a (risks x steps x scenarios) materialization map.
+
+    Duplicated risk IDs read the same streams, so each distinct risk counts once."""
+    log_weights = np.zeros(realizations.shape[1:])
+
+    for position in first_risk_positions(register_parameters):
+        add_risk_log_likelihood_ratio(
+            log_weights, register_parameters["risk"][position], register_parameters["likelihood"][position],
+            proposal_parameters["likelihood"][position], severity_shifts[position], realizations[position],
+            seed=selected_seed, scenario_start=scenario_start, first_step=first_step,
+            independent_sampling=independent_sampling, uniform_sampler=uniform_sampler)
+
+    return log_weights
+
+def effective_sample_size(weights: np.ndarray):
+    """Kish effective sample size of weighted scenarios."""
+    weights = np.asarray(weights, dtype=np.float64)
+
+    return float(weights.sum()**2 / np.sum(weights**2))
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+# Number of set bits of every byte value
+POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8).reshape(-1, 1), axis=1).sum(axis=1)
+
+# Scenarios unpacked at a time when computing co-occurrences & per-scenario counts (multiple of 8)
+UNPACK_CHUNK_SCENARIOS = 65536
+
+def pack_materialization_map(realizations: np.ndarray):
+    """Packs a (... x scenarios) 0/1 materialization map into bits along the scenarios axis."""
+    return np.packbits(np.asarray(realizations, dtype=np.uint8), axis=-1)
+
+def unpack_materialization_map(packed_realizations: np.ndarray, scenarios: int):
+    """Restores a (... x scenarios) 0/1 materialization map from its packed bits."""
+    return np.unpackbits(packed_realizations, axis=-1, count=scenarios).astype(np.int8)
+
+class MaterializationMap:
+    """Bernoulli materializations of all risks of a run, packed to one bit per (risk, step, scenario).
+
+    Provides per-risk observed frequencies, co-occurrence counts between risks and the distribution of the number
+    of risks materializing per scenario. step selects a single step (horizon by default); None pools all steps."""
+    def __init__(self, risk_ids, num_steps: int, num_scenarios: int):
+        self.risk_ids = [str(risk) for risk in risk_ids] # Risk IDs in register order
+        self.num_steps = num_steps
+        self.num_scenarios = num_scenarios
+        self.packed = np.zeros((len(self.risk_ids), num_steps, (num_scenarios + 7) // 8), dtype=np.uint8)
+
+    @classmethod
+    def from_realizations(cls, risk_ids, realizations: np.ndarray):
+        """Packs a dense (risks x steps x scenarios) materialization tensor."""
+        materialization_map = cls(risk_ids, realizations.shape[1], realizations.shape[2])
+        materialization_map.packed[:] = pack_materialization_map(realizations)
+
+        return materialization_map
+
+    def set_risk(self, position: int, realizations: np.ndarray):
+        """Stores the (steps x scenarios) materializations of the risk in the given register position."""
+        self.packed[position] = pack_materialization_map(realizations)
+
+    def risk_realizations(self, position: int):
+        """Returns the dense (steps x scenarios) materializations of the risk in the given register position."""
+        return unpack_materialization_map(self.packed[position], self.num_scenarios)
+
+    def event_indices(self, position: int, step: int = -1):
+        """Returns the indices of the scenarios in which a risk materializes at a step (sparse representation)."""
+        return np.flatnonzero(unpack_materialization_map(self.packed[position, step], self.num_scenarios))
+
+    def _selected_steps(self, step):
+        """Packed bits of the selected step(s) as (risks x steps x bytes)."""
+        if step is None:
+            return self.packed
+
+        return self.packed[:, [step], :]
+
+    def _unpacked_chunks(self, step):
+        """Yields dense (risks x scenarios-chunk) blocks of the selected step(s)."""
+        chunk_bytes = UNPACK_CHUNK_SCENARIOS // 8
+        for packed_step in np.moveaxis(self._selected_steps(step), 1, 0):
+            for first_byte in range(0, packed_step.shape[1], chunk_bytes):
+                scenarios_in_chunk = min(UNPACK_CHUNK_SCENARIOS, self.num_scenarios - first_byte * 8)
+                yield np.unpackbits(packed_step[:, first_byte:first_byte + chunk_bytes], axis=-1,
+                                    count=scenarios_in_chunk)
+
+    def event_counts(self, step=-1):
+        """Returns the number of materializations per risk."""
+        return POPCOUNT_TABLE[self._selected_steps(step)].sum(axis=(1, 2))
+
+    def observed_frequency(self, step=-1):
+        """Returns the observed materialization frequency per risk (to compare with its likelihood)."""
+        number_of_steps = self.num_steps if step is None else 1
+        frequencies = self.event_counts(step) / (self.num_scenarios * number_of_steps)
+
+        return pd.Series(frequencies, index=self.risk_ids, name="Observed Frequency")
+
+    def co_occurrence(self, step=-1):
+        """Returns the (risks x risks) counts of scenarios in which two risks materialize together."""
+        counts = np.zeros((len(self.risk_ids), len(self.risk_ids)), dtype=np.int64)
+        for dense_chunk in self._unpacked_chunks(step):
+            dense_chunk = dense_chunk.astype(np.float32)
+            counts += np.rint(dense_chunk @ dense_chunk.T).astype(np.int64)
+
+        return pd.DataFrame(counts, index=self.risk_ids, columns=self.risk_ids)
+
+    def materializations_per_scenario(self, step=-1):
+        """Returns the number of risks materializing in every scenario (summed over steps when step is None)."""
+        counts = np.zeros(self.num_scenarios, dtype=np.int64)
+        position = 0
+        for dense_chunk in self._unpacked_chunks(step):
+            counts[position:position + dense_chunk.shape[1]] += dense_chunk.sum(axis=0, dtype=np.int64)
+            position = (position + dense_chunk.shape[1]) % self.num_scenarios
+
+        return counts
+
+    def materialization_count_distribution(self, step=-1):
+        """Returns the share of scenarios in which exactly k risks materialize, for every k."""
+        counts = np.bincount(self.materializations_per_scenario(step))
+
+        return pd.Series(counts / counts.sum(), name="Share of Scenarios").rename_axis("Risks Materializing")
@@ -0,0 +1,142 @@
+import os
+import time
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from model.batched_simulation_engine import group_stream_ranks, simulate_register_batched
+from model.copula import COPULA_COMPONENTS, CopulaSampler
+from tools.instrumentation import NULL_INSTRUMENTATION
+
+logger = logging.getLogger(__name__)
+
+# Number of tasks handed to each worker, so that slow distributions do not leave cores idle
+TASKS_PER_WORKER = 4
+
+def resolve_worker_count(workers: int = None):
+    """Returns the number of worker processes to use (all cores when workers is None or 0)."""
+    if not workers:
+        return os.cpu_count() or 1
+
+    return max(1, int(workers))
+
+class SharedBlock:
+    """Keeps a shared memory block mapped for as long as the arrays viewing it (np.asarray(block)) are alive."""
+    def __init__(self, memory: shared_memory.SharedMemory, shape: tuple, dtype):
+        self.memory = memory # Mapped (and on POSIX already unlinked) shared memory block
+        self.__array_interface__ = np.ndarray(shape, dtype=dtype, buffer=memory.buf).__array_interface__
+
+    def __del__(self):
+        self.memory.close()
+
+def _simulate_register_partition(impacts_memory_name: str, realizations_memory_name: str, shape: tuple,
+                                 positions: np.ndarray, register_parameters: dict, num_steps: int,
+                                 num_scenarios: int, independent_sampling: bool, selected_seed: int,
+                                 cap_apply: bool, max_cap: float, rng_mode: str, uniform_sampler=None,
+                                 stream_ranks: np.ndarray = None, copula_memory_name: str = None,
+                                 copula_shape: tuple = None):
+    """Worker task: simulates a subset of risks and writes them into the parent's shared memory blocks.
+
+    Copula uniforms are read from the parent's shared block (copula_memory_name) rather than recomputed. Returns
+    the task's positions with its wall & CPU (of the worker process) seconds."""
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    impacts_memory = shared_memory.SharedMemory(name=impacts_memory_name)
+    realizations_memory = shared_memory.SharedMemory(name=realizations_memory_name)
+    copula_memory = shared_memory.SharedMemory(name=copula_memory_name) if copula_memory_name is not None else None
+
+    try:
+        impacts = np.ndarray(shape, dtype=np.float64, buffer=impacts_memory.buf)
+        realizations = np.ndarray(shape, dtype=np.int8, buffer=realizations_memory.buf)
+        if copula_memory is not None:
+            uniform_sampler.use_uniforms(np.ndarray(copula_shape, dtype=np.float64, buffer=copula_memory.buf),
+                                         selected_seed, 0, num_scenarios)
+
+        impacts[positions], realizations[positions] = simulate_register_batched(
+            register_parameters=register_parameters, num_steps=num_steps, num_scenarios=num_scenarios,
+            independent_sampling=independent_sampling, selected_seed=selected_seed, cap_apply=cap_apply,
+            max_cap=max_cap, rng_mode=rng_mode, uniform_sampler=uniform_sampler, stream_ranks=stream_ranks)
+
+        # Drop views on the shared buffers before closing them
+        del impacts, realizations
+        if copula_memory is not None:
+            uniform_sampler.use_uniforms(None)
+    finally:
+        impacts_memory.close()
+        realizations_memory.close()
+        if copula_memory is not None:
+            copula_memory.close()
+
+    return positions, time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+def simulate_register_parallel(register_parameters: dict, num_steps: int, num_scenarios: int, workers: int = None,
+                               independent_sampling: bool = True, selected_seed: int = 110,
+                               cap_apply: bool = True, max_cap: float = 400000000.00, rng_mode: str = 'legacy',
+                               uniform_sampler=None, instrumentation=NULL_INSTRUMENTATION):
+    """Samples all risks of the register over a process pool into a (risks x steps x scenarios) tensor.
+
+    Workers write their risks straight into shared memory; results are identical to a serial run since every
+    risk draws from its own seeds / streams, or keeps its rank in the group streams of the full register. Returns
+    impacts, materializations and the total over risks; impacts & materializations are views on the shared blocks
+    (no copy), which are released with the arrays. Copula uniforms are computed once here & shared with the
+    workers. Every worker task is timed with instrumentation.record_group."""
+    number_of_workers = resolve_worker_count(workers)
+    number_of_risks = len(register_parameters["risk"])
+    shape = (number_of_risks, num_steps, num_scenarios)
+    stream_ranks = group_stream_ranks(register_parameters) if rng_mode == 'philox_grouped' else None
+
+    impacts_memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    realizations_memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))))
+    shared_memories = [impacts_memory, realizations_memory]
+
+    try:
+        copula_memory_name, copula_shape = None, None
+        if isinstance(uniform_sampler, CopulaSampler):
+            copula_shape = (len(COPULA_COMPONENTS), num_steps, len(uniform_sampler.stream_ids), num_scenarios)
+            copula_memory = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(copula_shape)) * 8))
+            shared_memories.append(copula_memory)
+            copula_memory_name = copula_memory.name
+
+            logger.info(f"Drawing copula uniforms of all risk factors once for all processes...")
+            copula_uniforms = np.ndarray(copula_shape, dtype=np.float64, buffer=copula_memory.buf)
+            uniform_sampler.draw_all_uniforms(selected_seed, num_steps, 0, num_scenarios, out=copula_uniforms)
+            del copula_uniforms
+
+        partitions = [positions for positions in
+                      np.array_split(np.arange(number_of_risks), number_of_workers * TASKS_PER_WORKER)
+                      if len(positions)]
+
+        with ProcessPoolExecutor(max_workers=number_of_workers) as executor:
+            futures = [executor.submit(
+                _simulate_register_partition, impacts_memory.name, realizations_memory.name, shape, positions,
+                {key: values[positions] for key, values in register_parameters.items()}, num_steps, num_scenarios,
+                independent_sampling, selected_seed, cap_apply, max_cap, rng_mode, uniform_sampler,
+                stream_ranks[positions] if stream_ranks is not None else None, copula_memory_name, copula_shape)
+                for positions in partitions]
+
+            completed_risks = 0
+            for future in as_completed(futures):
+                positions, wall_seconds, cpu_seconds = future.result()
+                instrumentation.record_group(f"task {futures.index(future)}", register_parameters["risk"][positions],
+                                             wall_seconds, cpu_seconds, num_scenarios)
+                completed_risks += len(positions)
+                logger.info(f"Simulated {completed_risks} of {number_of_risks} risk factors...")
+
+    except BaseException:
+        for memory in shared_memories:
+            memory.close()
+            memory.unlink()
+        raise
+
+    # Workers are done: remove the blocks' names (the mappings stay until the returned arrays are released)
+    impacts_memory.unlink()
+    realizations_memory.unlink()
+    for copula_memory in shared_memories[2:]:
+        copula_memory.close()
+        copula_memory.unlink()
+    impacts = np.asarray(SharedBlock(impacts_memory, shape, np.float64))
+    realizations = np.asarray(SharedBlock(realizations_memory, shape, np.int8))
+
+    # Reduce the total in the parent (register order)
+    total_impacts = np.add.reduce(impacts, axis=0)
+
+    return impacts, realizations, total_impacts
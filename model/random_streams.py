@@ -0,0 +1,153 @@
+import zlib
+import numpy as np
+
+# Supported seeding schemes: global RNG re-seeded per step (legacy), counter-based Philox streams per risk (philox)
+# or per distribution group (philox_grouped)
+RNG_MODES = ("legacy", "philox", "philox_grouped")
+
+# Stream components drawn for every (risk, step) pair
+MATERIALIZATION_STREAM = 0
+SEVERITY_STREAM = 1
+
+# Offset turning the [0, 1) output of Generator.random() into the open interval (0, 1)
+UNIFORM_OFFSET = 2.0 ** -54
+
+# Largest double below 1, bounding uniforms away from 1
+LARGEST_UNIFORM = np.nextafter(1.0, 0.0)
+
+# Philox4x64 emits four 64-bit outputs per counter increment, one output per double-precision uniform
+PHILOX_OUTPUTS_PER_COUNTER = 4
+
+# Leading spawn-key entry of group streams, above every risk stream key so both families of streams never overlap
+GROUP_STREAM_DOMAIN = 2 ** 34
+
+def validate_rng_mode(rng_mode: str):
+    """Raises an error for unknown seeding schemes."""
+    if rng_mode not in RNG_MODES:
+        raise ValueError(f"Unknown rng_mode '{rng_mode}'; expected one of {RNG_MODES}.")
+
+def risk_stream_key(risk_id):
+    """Maps a risk ID to a non-negative integer usable in a SeedSequence spawn key."""
+    if isinstance(risk_id, (int, np.integer)) and risk_id >= 0:
+        return int(risk_id)
+
+    # Non-integer IDs are hashed above the 32-bit range so they cannot collide with numeric IDs
+    return 2 ** 32 + zlib.crc32(str(risk_id).encode())
+
+def to_open_unit_interval(uniforms: np.ndarray):
+    """Maps uniforms in [0, 1) into (0, 1) in place.
+
+    The shift by UNIFORM_OFFSET rounds the largest doubles below 1 (e.g. 1 - 2**-53) up to 1.0, hence the clip."""
+    uniforms += UNIFORM_OFFSET
+
+    return np.minimum(uniforms, LARGEST_UNIFORM, out=uniforms)
+
+def philox_stream_key(seed: int, risk_id, step: int, component: int):
+    """Derives the 128-bit Philox key of the stream identified by (run seed, risk, step, component)."""
+    seed_sequence = np.random.SeedSequence(entropy=seed, spawn_key=(risk_stream_key(risk_id), step, component))
+
+    return seed_sequence.generate_state(2, dtype=np.uint64)
+
+def draw_stream_uniforms(seed: int, risk_id, step: int, component: int, scenario_start: int, scenario_stop: int,
+                         out: np.ndarray = None):
+    """Returns the uniforms in (0, 1) of scenarios [scenario_start, scenario_stop) of a keyed Philox stream.
+
+    Scenario positions map onto the Philox counter, so any split of the scenarios into chunks (serial, parallel
+    or streamed) reproduces exactly the same numbers."""
+    if out is None:
+        out = np.empty(scenario_stop - scenario_start, dtype=np.float64)
+
+    bit_generator = np.random.Philox(key=philox_stream_key(seed, risk_id, step, component))
+    bit_generator.advance(scenario_start // PHILOX_OUTPUTS_PER_COUNTER)
+    generator = np.random.Generator(bit_generator)
+
+    # Discard the outputs of the counter block preceding the first requested scenario
+    skipped_outputs = scenario_start % PHILOX_OUTPUTS_PER_COUNTER
+    if skipped_outputs:
+        generator.random(skipped_outputs)
+
+    generator.random(out=out)
+
+    return to_open_unit_interval(out)
+
+def group_stream_key(seed: int, group: str, step: int, component: int):
+    """Derives the 128-bit Philox key of the stream shared by a distribution group at one (step, component)."""
+    seed_sequence = np.random.SeedSequence(
+        entropy=seed, spawn_key=(GROUP_STREAM_DOMAIN, zlib.crc32(group.encode()), step, component))
+
+    return seed_sequence.generate_state(2, dtype=np.uint64)
+
+def draw_group_stream_uniforms(seed: int, group: str, step: int, component: int, ranks, scenario_start: int,
+                               scenario_stop: int, stream_scenarios: int, out: np.ndarray = None):
+    """Returns (risks x scenarios) uniforms in (0, 1) of the keyed Philox stream of a distribution group.
+
+    The risk of rank r reads stream positions r * stream_scenarios + scenario, so all scenarios of consecutive ranks
+    are one contiguous draw. Other ranges (scenario chunks, subsets of ranks) seek along the same stream, set up
+    once per call; equal ranks share their uniforms."""
+    ranks = np.asarray(ranks, dtype=np.int64)
+    if out is None:
+        out = np.empty((len(ranks), scenario_stop - scenario_start), dtype=np.float64)
+
+    unique_ranks, rank_rows = np.unique(ranks, return_inverse=True)
+    uniforms = out if len(unique_ranks) == len(ranks) and np.all(np.diff(ranks) > 0) \
+        else np.empty((len(unique_ranks), scenario_stop - scenario_start), dtype=np.float64)
+
+    if len(unique_ranks):
+        key = group_stream_key(seed, group, step, component)
+        bit_generator = np.random.Philox(key=key)
+        generator = np.random.Generator(bit_generator)
+        counter = 0 # Next counter block of the generator
+
+        if scenario_start == 0 and scenario_stop == stream_scenarios and unique_ranks[-1] - unique_ranks[0] == \
+                len(unique_ranks) - 1:
+            segments = [(int(unique_ranks[0]) * stream_scenarios, uniforms)]
+        else:
+            segments = [(int(rank) * stream_scenarios + scenario_start, row)
+                        for rank, row in zip(unique_ranks, uniforms)]
+
+        for position, segment in segments:
+            if position // PHILOX_OUTPUTS_PER_COUNTER < counter:
+                # Segments sharing a counter block restart from a fresh generator
+                bit_generator = np.random.Philox(key=key, counter=position // PHILOX_OUTPUTS_PER_COUNTER)
+                generator = np.random.Generator(bit_generator)
+            else:
+                # Also drops the buffered outputs of the previous segment
+                bit_generator.advance(position // PHILOX_OUTPUTS_PER_COUNTER - counter)
+
+            skipped_outputs = position % PHILOX_OUTPUTS_PER_COUNTER
+            if skipped_outputs:
+                generator.random(skipped_outputs)
+
+            generator.random(out=segment)
+            counter = -(-(position + segment.size) // PHILOX_OUTPUTS_PER_COUNTER)
+
+        to_open_unit_interval(uniforms)
+
+    if uniforms is not out:
+        np.take(uniforms, rank_rows, axis=0, out=out)
+
+    return out
+
+def draw_group_uniforms(seed: int, group: str, component: int, steps: int, ranks, scenario_start: int,
+                        scenario_stop: int, stream_scenarios: int, out: np.ndarray = None, first_step: int = 0):
+    """Returns a (risks x (steps - first_step) x scenarios) array of keyed uniforms of a distribution group."""
+    if out is None:
+        out = np.empty((len(ranks), steps - first_step, scenario_stop - scenario_start), dtype=np.float64)
+
+    step_uniforms = np.empty((len(ranks), scenario_stop - scenario_start), dtype=np.float64)
+    for row, step in enumerate(range(first_step, steps)):
+        out[:, row] = draw_group_stream_uniforms(seed, group, step, component, ranks, scenario_start, scenario_stop,
+                                                 stream_scenarios, out=step_uniforms)
+
+    return out
+
+def draw_risk_uniforms(seed: int, risk_id, component: int, steps: int, scenario_start: int, scenario_stop: int,
+                       out: np.ndarray = None, first_step: int = 0):
+    """Returns a ((steps - first_step) x scenarios) array of keyed uniforms for one risk and stream component."""
+    if out is None:
+        out = np.empty((steps - first_step, scenario_stop - scenario_start), dtype=np.float64)
+
+    for row, step in enumerate(range(first_step, steps)):
+        draw_stream_uniforms(seed, risk_id, step, component, scenario_start, scenario_stop, out=out[row])
+
+    return out
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from model.risk_metrics import compute_tail_metrics, format_level
+from tools.output_writers import create_output_writer
+
+# Levels (in percent) allocated by default, as asked for by management reporting
+DEFAULT_ALLOCATION_LEVELS = (99,)
+
+def kernel_bandwidth(total_losses: np.ndarray):
+    """Silverman's rule-of-thumb bandwidth of the total losses (robust to heavy tails through the IQR)."""
+    spread = np.std(total_losses)
+    interquartile_range = np.subtract(*np.percentile(total_losses, [75, 25]))
+    if interquartile_range > 0:
+        spread = min(spread, interquartile_range / 1.349)
+
+    return 1.06 * spread * len(total_losses) ** -0.2
+
+def euler_contributions(horizon_values_per_rf: np.ndarray, var_levels=DEFAULT_ALLOCATION_LEVELS,
+                        es_levels=DEFAULT_ALLOCATION_LEVELS, weights: np.ndarray = None, bandwidth: float = None):
+    """Euler allocation of the VaR & ES of the total over the rows (risks) of a (risks x scenarios) matrix.
+
+    The ES contribution of a risk is its mean over the scenarios in the total's tail (the same scenarios as
+    compute_tail_metrics), so contributions add up to the ES. The VaR contribution is its conditional mean given
+    total = VaR, estimated with Gaussian kernel weights on the total and rescaled to add up to the VaR.
+    All levels are allocated in a single matrix product over the scenarios. Returns the contributions (shaped
+    like compute_tail_metrics, one array per level) and the tail metrics of the total."""
+    horizon_values_per_rf = np.asarray(horizon_values_per_rf, dtype=np.float64)
+    total_losses = np.add.reduce(horizon_values_per_rf, axis=0)
+    tail_metrics = compute_tail_metrics(total_losses, var_levels=var_levels, es_levels=es_levels, weights=weights)
+    bandwidth = bandwidth if bandwidth is not None else kernel_bandwidth(total_losses)
+
+    # One row of scenario weights per allocated metric: kernel around each VaR, tail indicator of each ES
+    scenario_weights = np.empty((len(tail_metrics["VaR"]) + len(tail_metrics["ES"]), len(total_losses)))
+    for row, var_value in enumerate(tail_metrics["VaR"].values()):
+        scenario_weights[row] = np.exp(-0.5 * ((total_losses - var_value) / bandwidth) ** 2) if bandwidth > 0 \
+            else total_losses == var_value
+    es_thresholds = compute_tail_metrics(total_losses, var_levels=es_levels, es_levels=(), weights=weights)["VaR"]
+    for row, threshold in enumerate(es_thresholds.values(), start=len(tail_metrics["VaR"])):
+        scenario_weights[row] = total_losses >= threshold
+    if weights is not None:
+        scenario_weights *= np.asarray(weights, dtype=np.float64).ravel()
+
+    weight_totals = scenario_weights.sum(axis=1)
+    contributions = (horizon_values_per_rf @ scenario_weights.T) / np.where(weight_totals > 0, weight_totals, 1.0)
+
+    var_contributions = {}
+    for row, (level, var_value) in enumerate(tail_metrics["VaR"].items()):
+        allocated = contributions[:, row].sum()
+        var_contributions[level] = contributions[:, row] * (var_value / allocated) if allocated else \
+            contributions[:, row]
+
+    es_contributions = {level: contributions[:, row]
+                        for row, level in enumerate(tail_metrics["ES"], start=len(tail_metrics["VaR"]))}
+
+    return {"VaR": var_contributions, "ES": es_contributions}, tail_metrics
+
+def standalone_metrics(horizon_values_per_rf: np.ndarray, var_levels=DEFAULT_ALLOCATION_LEVELS,
+                       es_levels=DEFAULT_ALLOCATION_LEVELS, weights: np.ndarray = None):
+    """VaR & ES of every row on its own, shaped like compute_tail_metrics with one array per level."""
+    row_metrics = [compute_tail_metrics(row_values, var_levels=var_levels, es_levels=es_levels, weights=weights)
+                   for row_values in np.asarray(horizon_values_per_rf, dtype=np.float64)]
+
+    return {metric: {level: np.array([metrics[metric][level] for metrics in row_metrics])
+                     for level in row_metrics[0][metric]} if row_metrics else {}
+            for metric in ("VaR", "ES")}
+
+def _allocation_table(contributions: dict, standalone: dict, index):
+    """Lays out contributions, standalone values & diversification benefits as one column triple per metric."""
+    columns = {}
+    for metric in ("VaR", "ES"):
+        for level, contribution in contributions[metric].items():
+            name = f"{format_level(level)}% {metric}"
+            columns[f"{name} Contribution"] = contribution
+            columns[f"{name} Standalone"] = standalone[metric][level]
+            columns[f"{name} Diversification"] = standalone[metric][level] - contribution
+
+    return pd.DataFrame(columns, index=index)
+
+def allocate_risk_contributions(df_horizon_values_per_rf: pd.DataFrame, var_levels=DEFAULT_ALLOCATION_LEVELS,
+                                es_levels=DEFAULT_ALLOCATION_LEVELS, weights: np.ndarray = None,
+                                bandwidth: float = None):
+    """Allocates the total VaR & ES to risks & taxonomies from the per risk factor horizon table.
+
+    Returns the 'Risk Contributions' (one row per register row) and 'Taxonomy Contributions' tables, each ending
+    with a 'Total' row: the contributions add up to the total's VaR / ES, while standalone values are the VaR / ES
+    of a risk (taxonomy) on its own and diversification is standalone minus contribution."""
+    scenario_columns = [column for column in df_horizon_values_per_rf.columns if column not in ("Taxonomy", "Title")]
+    horizon_values_per_rf = df_horizon_values_per_rf[scenario_columns].to_numpy(dtype=np.float64)
+    taxonomies = df_horizon_values_per_rf["Taxonomy"].astype(str).to_numpy()
+
+    contributions, _ = euler_contributions(horizon_values_per_rf, var_levels=var_levels,
+                                           es_levels=es_levels, weights=weights, bandwidth=bandwidth)
+    standalone = standalone_metrics(horizon_values_per_rf, var_levels=var_levels, es_levels=es_levels,
+                                    weights=weights)
+
+    df_risk_contributions = _allocation_table(contributions, standalone, df_horizon_values_per_rf.index)
+    df_risk_contributions.insert(0, "Title", df_horizon_values_per_rf["Title"].to_numpy())
+    df_risk_contributions.insert(0, "Taxonomy", taxonomies)
+
+    # Taxonomies sum the contributions of their risks; standalone values come from the taxonomy totals
+    taxonomy_labels, taxonomy_rows = np.unique(taxonomies, return_inverse=True)
+    membership = (taxonomy_rows == np.arange(len(taxonomy_labels)).reshape(-1, 1)).astype(np.float64)
+    taxonomy_values = membership @ horizon_values_per_rf
+    taxonomy_contributions = {metric: {level: np.bincount(taxonomy_rows, weights=values,
+                                                          minlength=len(taxonomy_labels))
+                                       for level, values in contributions[metric].items()}
+                              for metric in ("VaR", "ES")}
+    df_taxonomy_contributions = _allocation_table(
+        taxonomy_contributions, standalone_metrics(taxonomy_values, var_levels=var_levels, es_levels=es_levels,
+                                                   weights=weights), taxonomy_labels)
+
+    # Totals: contributions add up to the total's VaR / ES, standalone values to the undiversified sum
+    for df_contributions in (df_risk_contributions, df_taxonomy_contributions):
+        metric_columns = df_contributions.columns[df_contributions.columns.str.contains("% ")]
+        df_contributions.loc["Total", metric_columns] = df_contributions[metric_columns].sum()
+
+    return df_risk_contributions, df_taxonomy_contributions
+
+def save_risk_allocation(df_horizon_values_per_rf: pd.DataFrame, interim_files_dir: str,
+                         var_levels=DEFAULT_ALLOCATION_LEVELS, es_levels=DEFAULT_ALLOCATION_LEVELS,
+                         weights: np.ndarray = None, output_format: str = 'npy'):
+    """Computes & saves the 'Risk Contributions' and 'Taxonomy Contributions' tables."""
+    df_risk_contributions, df_taxonomy_contributions = allocate_risk_contributions(
+        df_horizon_values_per_rf, var_levels=var_levels, es_levels=es_levels, weights=weights)
+
+    output_writer = create_output_writer(output_format, interim_files_dir)
+    output_writer.write_table("Risk Contributions", df_risk_contributions)
+    output_writer.write_table("Taxonomy Contributions", df_taxonomy_contributions)
+    output_writer.close()
+
+    return df_risk_contributions, df_taxonomy_contributions
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# Levels (in percent) reported in the 'Total Impact Metrics at Horizon' table
+DEFAULT_VAR_LEVELS = (90, 95, 99, 99.999)
+DEFAULT_ES_LEVELS = (90, 95, 99)
+
+def _linear_percentiles(sorted_losses: np.ndarray, levels: np.ndarray, num_losses: int = None):
+    """Percentiles of sorted losses with numpy's default 'linear' method (same floating point operations).
+
+    With num_losses, sorted_losses holds only the largest losses of a vector of num_losses losses."""
+    num_losses = len(sorted_losses) if num_losses is None else num_losses
+    offset = num_losses - len(sorted_losses)
+    virtual_indexes = (num_losses - 1) * np.true_divide(levels, 100)
+    previous_indexes = np.floor(virtual_indexes)
+    next_indexes = np.minimum(previous_indexes + 1, num_losses - 1)
+    gamma = virtual_indexes - previous_indexes
+
+    previous_values = sorted_losses[previous_indexes.astype(np.intp) - offset]
+    next_values = sorted_losses[next_indexes.astype(np.intp) - offset]
+
+    # Interpolate from the closest end to limit rounding, as numpy's _lerp does
+    difference = next_values - previous_values
+    percentiles = previous_values + difference * gamma
+    np.subtract(next_values, difference * (1 - gamma), out=percentiles, where=gamma >= 0.5)
+
+    return percentiles
+
+def _weighted_percentiles(sorted_losses: np.ndarray, cumulative_weights: np.ndarray, levels: np.ndarray):
+    """Percentiles of weighted losses: smallest loss whose cumulative weight share reaches each level."""
+    positions = np.searchsorted(cumulative_weights, np.true_divide(levels, 100) * cumulative_weights[-1], side='left')
+
+    return sorted_losses[np.minimum(positions, len(sorted_losses) - 1)]
+
+def _sorted_mode(sorted_losses: np.ndarray, sorted_weights: np.ndarray = None):
+    """Most frequent (or heaviest) loss of a sorted vector; ties resolve to the smallest loss like scipy's mode."""
+    run_starts = np.flatnonzero(np.r_[True, sorted_losses[1:] != sorted_losses[:-1]])
+
+    if sorted_weights is None:
+        run_totals = np.diff(np.r_[run_starts, len(sorted_losses)])
+    else:
+        run_totals = np.add.reduceat(sorted_weights, run_starts)
+
+    return sorted_losses[run_starts[np.argmax(run_totals)]]
+
+def compute_tail_metrics(losses, var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS, weights=None):
+    """Computes VaR (percentiles), Expected Shortfall, mean, median & mode of a loss vector from a single sort.
+
+    Levels are given in percent. Unweighted percentiles interpolate linearly like np.percentile; ES at a level is
+    the mean of losses at or above the level's percentile, read from cumulative tail sums so that any number of
+    levels costs one sort. With weights (e.g. likelihood ratios) percentiles are the weighted inverse CDF and all
+    averages are weighted."""
+    losses = np.asarray(losses, dtype=np.float64).ravel()
+    var_levels = np.asarray(var_levels, dtype=np.float64)
+    es_levels = np.asarray(es_levels, dtype=np.float64)
+
+    order = np.argsort(losses, kind='stable') if weights is not None else None
+    sorted_losses = losses[order] if order is not None else np.sort(losses)
+
+    if weights is None:
+        var_values = _linear_percentiles(sorted_losses, var_levels)
+        es_thresholds = _linear_percentiles(sorted_losses, es_levels)
+
+        # Tail sums accumulated from the largest loss downwards
+        tail_sums = np.cumsum(sorted_losses[::-1])[::-1]
+        tail_starts = np.searchsorted(sorted_losses, es_thresholds, side='left')
+        es_values = tail_sums[tail_starts] / (len(sorted_losses) - tail_starts)
+
+        average_value = np.mean(losses)
+        middle = len(sorted_losses) // 2
+        if len(sorted_losses) % 2:
+            median_value = sorted_losses[middle]
+        else:
+            median_value = np.mean(sorted_losses[middle - 1:middle + 1])
+        mode_value = _sorted_mode(sorted_losses)
+
+    else:
+        sorted_weights = np.asarray(weights, dtype=np.float64).ravel()[order]
+        cumulative_weights = np.cumsum(sorted_weights)
+
+        var_values = _weighted_percentiles(sorted_losses, cumulative_weights, var_levels)
+        es_thresholds = _weighted_percentiles(sorted_losses, cumulative_weights, es_levels)
+
+        tail_weighted_sums = np.cumsum((sorted_losses * sorted_weights)[::-1])[::-1]
+        tail_weights = np.cumsum(sorted_weights[::-1])[::-1]
+        tail_starts = np.searchsorted(sorted_losses, es_thresholds, side='left')
+        es_values = tail_weighted_sums[tail_starts] / tail_weights[tail_starts]
+
+        average_value = np.sum(sorted_losses * sorted_weights) / cumulative_weights[-1]
+        median_value = _weighted_percentiles(sorted_losses, cumulative_weights, np.array([50.0]))[0]
+        mode_value = _sorted_mode(sorted_losses, sorted_weights)
+
+    return {"VaR": dict(zip(var_levels.tolist(), var_values.tolist())),
+            "ES": dict(zip(es_levels.tolist(), es_values.tolist())),
+            "Expected": float(average_value), "Median": float(median_value), "Mode": float(mode_value)}
+
+def tail_size(num_losses: int, levels):
+    """Number of largest losses that the VaR & ES of the lowest level (in percent) are read from."""
+    return num_losses - int(np.floor((num_losses - 1) * min(levels) / 100))
+
+def top_tail_metrics(top_losses: np.ndarray, num_losses: int, var_levels=DEFAULT_VAR_LEVELS,
+                     es_levels=DEFAULT_ES_LEVELS):
+    """VaR & ES of a vector of num_losses losses from its largest losses only (sorted ascending).
+
+    top_losses must hold every loss at or above its smallest value and at least tail_size(num_losses, levels) of
+    them; the values then equal those of compute_tail_metrics on the whole vector."""
+    var_levels = np.asarray(var_levels, dtype=np.float64)
+    es_levels = np.asarray(es_levels, dtype=np.float64)
+    var_values = _linear_percentiles(top_losses, var_levels, num_losses)
+    es_thresholds = _linear_percentiles(top_losses, es_levels, num_losses)
+
+    tail_sums = np.cumsum(top_losses[::-1])[::-1]
+    tail_starts = np.searchsorted(top_losses, es_thresholds, side='left')
+    es_values = tail_sums[tail_starts] / (len(top_losses) - tail_starts)
+
+    return {"VaR": dict(zip(var_levels.tolist(), var_values.tolist())),
+            "ES": dict(zip(es_levels.tolist(), es_values.tolist()))}
+
+def format_level(level: float):
+    """Formats a level in percent as used in metric names (e.g. 99.999 -> '99.999', 90.0 -> '90')."""
+    return f"{level:g}"
+
+def tail_metrics_to_frame(tail_metrics: dict, index: str = "Horizon"):
+    """Lays out the output of compute_tail_metrics as the 'Total Impact Metrics at Horizon' table."""
+    horizon_stats = {}
+    for level, value in tail_metrics["VaR"].items():
+        horizon_stats[f"{format_level(level)}%-Percentile Impact"] = value
+    for level, value in tail_metrics["ES"].items():
+        horizon_stats[f"{format_level(level)}% ES"] = value
+
+    horizon_stats["Expected Impact"] = tail_metrics["Expected"]
+    horizon_stats["Median Impact"] = tail_metrics["Median"]
+    horizon_stats["Mode Impact"] = tail_metrics["Mode"]
+
+    return pd.DataFrame(horizon_stats, index=[index])
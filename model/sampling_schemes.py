@@ -0,0 +1,212 @@
+import warnings
+import numpy as np
+from scipy import special as sp
+from scipy.stats import qmc
+from model.random_streams import (LARGEST_UNIFORM, draw_risk_uniforms, draw_stream_uniforms, philox_stream_key,
+                                  risk_stream_key, to_open_unit_interval)
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS, compute_tail_metrics
+
+# Supported schemes for the uniforms feeding the Bernoulli & inverse-CDF severity transforms
+SAMPLING_SCHEMES = ("pseudo", "antithetic", "lhs", "sobol")
+
+# Latin hypercube strata permutations read the streams of component + PERMUTATION_STREAM_OFFSET
+PERMUTATION_STREAM_OFFSET = 2
+
+def validate_sampling_scheme(sampling_scheme: str, rng_mode: str = 'philox'):
+    """Raises an error for unknown sampling schemes or schemes combined with legacy seeding."""
+    if sampling_scheme not in SAMPLING_SCHEMES:
+        raise ValueError(f"Unknown sampling_scheme '{sampling_scheme}'; expected one of {SAMPLING_SCHEMES}.")
+    if sampling_scheme != 'pseudo' and rng_mode == 'legacy':
+        raise ValueError(f"Sampling scheme '{sampling_scheme}' requires rng_mode='philox'.")
+
+def replicate_seed(seed: int, replicate: int):
+    """Derives the seed randomizing one independent replicate (block of scenarios) of a run."""
+    if replicate == 0:
+        return seed
+
+    return int(np.random.SeedSequence(entropy=seed, spawn_key=(replicate,)).generate_state(1, dtype=np.uint32)[0])
+
+class UniformSampler:
+    """Keyed (risk, step, component) uniforms of a variance-reduction scheme, as drop-in for draw_risk_uniforms.
+
+    Scenarios are split into `replicates` equally sized blocks, each an independent randomization of the scheme,
+    so that standard errors can be read from the spread of the replicate estimates:
+    - 'pseudo': plain keyed Philox streams (identical to draw_risk_uniforms);
+    - 'antithetic': scenarios 2k & 2k + 1 of a block use u and 1 - u;
+    - 'lhs': Latin hypercube; every (risk, step, component) stratifies (0, 1) into one stratum per scenario;
+    - 'sobol': scrambled Sobol points whose dimensions are the (risk, component) pairs of the register, one
+      sequence per step. Points of a scenario range are generated once for all risks & cached (d x scenarios per
+      step), so the cache is about twice the size of the impacts being drawn; streaming runs bound it by their
+      scenario chunks.
+    Draws do not depend on how scenarios are chunked or risks grouped."""
+    def __init__(self, sampling_scheme: str, risk_ids, num_scenarios: int, replicates: int = 1):
+        validate_sampling_scheme(sampling_scheme)
+        if replicates < 1 or num_scenarios % replicates:
+            raise ValueError(f"{num_scenarios} scenarios cannot be split into {replicates} equal replicates.")
+
+        self.sampling_scheme = sampling_scheme
+        self.num_scenarios = num_scenarios
+        self.replicates = replicates
+        self.block_size = num_scenarios // replicates # Scenarios per replicate
+
+        # Sobol dimensions of each (distinct) risk; duplicated IDs share their draws as with Philox streams
+        unique_keys = dict.fromkeys(risk_stream_key(risk) for risk in risk_ids)
+        self.dimensions = {key: position for position, key in enumerate(unique_keys)}
+        self._sobol_cache = {} # Points of the current seed & scenario range, all steps (2 x risks x steps x scenarios)
+
+    def __getstate__(self):
+        # Cached Sobol points are not shipped to worker processes
+        state = self.__dict__.copy()
+        state["_sobol_cache"] = {}
+
+        return state
+
+    def clear_cache(self):
+        """Drops the cached Sobol points."""
+        self._sobol_cache.clear()
+
+    def draw(self, seed: int, risk_id, component: int, steps: int, scenario_start: int, scenario_stop: int,
+             out: np.ndarray = None, first_step: int = 0):
+        """Returns a ((steps - first_step) x scenarios) array of uniforms for one risk and stream component."""
+        if self.sampling_scheme == 'pseudo':
+            return draw_risk_uniforms(seed, risk_id, component, steps, scenario_start, scenario_stop, out=out,
+                                      first_step=first_step)
+
+        if out is None:
+            out = np.empty((steps - first_step, scenario_stop - scenario_start), dtype=np.float64)
+
+        if self.sampling_scheme == 'sobol':
+            dimension = 2 * self.dimensions[risk_stream_key(risk_id)] + component
+            for row, step in enumerate(range(first_step, steps)):
+                out[row] = self._sobol_points(seed, step, scenario_start, scenario_stop)[dimension]
+
+            return out
+
+        for replicate, local_start, local_stop, columns in self._replicate_segments(scenario_start, scenario_stop):
+            for row, step in enumerate(range(first_step, steps)):
+                self._draw_block(replicate_seed(seed, replicate), risk_id, step, component, local_start, local_stop,
+                                 out=out[row, columns])
+
+        return out
+
+    def _replicate_segments(self, scenario_start: int, scenario_stop: int):
+        """Splits scenarios along replicate blocks into (replicate, local start, local stop, output columns)."""
+        for replicate in range(scenario_start // self.block_size, (scenario_stop - 1) // self.block_size + 1):
+            block_start = replicate * self.block_size
+            local_start = max(scenario_start, block_start) - block_start
+            local_stop = min(scenario_stop, block_start + self.block_size) - block_start
+
+            yield (replicate, local_start, local_stop,
+                   slice(block_start + local_start - scenario_start, block_start + local_stop - scenario_start))
+
+    def _draw_block(self, seed: int, risk_id, step: int, component: int, local_start: int, local_stop: int,
+                    out: np.ndarray):
+        """Draws scenarios [local_start, local_stop) of one replicate block."""
+        if self.sampling_scheme == 'antithetic':
+            base_uniforms = draw_stream_uniforms(seed, risk_id, step, component, local_start // 2,
+                                                 (local_stop + 1) // 2)
+            scenarios = np.arange(local_start, local_stop)
+            np.take(base_uniforms, scenarios // 2 - local_start // 2, out=out)
+            np.subtract(1.0, out, out=out, where=(scenarios % 2).astype(bool))
+            np.minimum(out, LARGEST_UNIFORM, out=out) # 1 - 2**-54 rounds to 1.0
+
+        elif self.sampling_scheme == 'lhs':
+            permutation_generator = np.random.Generator(np.random.Philox(
+                key=philox_stream_key(seed, risk_id, step, component + PERMUTATION_STREAM_OFFSET)))
+            strata = permutation_generator.permutation(self.block_size)[local_start:local_stop]
+
+            draw_stream_uniforms(seed, risk_id, step, component, local_start, local_stop, out=out)
+            out += strata
+            out /= self.block_size
+            np.minimum(out, LARGEST_UNIFORM, out=out)
+
+    def _sobol_points(self, seed: int, step: int, scenario_start: int, scenario_stop: int):
+        """Returns the (dimensions x scenarios) scrambled Sobol points of a step & scenario range (cached)."""
+        cache_key = (seed, step, scenario_start, scenario_stop)
+        if cache_key not in self._sobol_cache:
+            # Keep the points of all steps of the current scenario range only
+            if any(key[0] != seed or key[2:] != (scenario_start, scenario_stop) for key in self._sobol_cache):
+                self._sobol_cache.clear()
+
+            points = np.empty((2 * len(self.dimensions), scenario_stop - scenario_start), dtype=np.float64)
+            for replicate, local_start, local_stop, columns in self._replicate_segments(scenario_start,
+                                                                                        scenario_stop):
+                sobol_engine = qmc.Sobol(2 * len(self.dimensions), scramble=True, seed=np.random.default_rng(
+                    np.random.SeedSequence(entropy=replicate_seed(seed, replicate), spawn_key=(step,))))
+                if local_start:
+                    sobol_engine.fast_forward(local_start)
+
+                # Balance warnings concern the number of points, which is set by the run & its chunking
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", UserWarning)
+                    points[:, columns] = sobol_engine.random(local_stop - local_start).T
+
+            to_open_unit_interval(points)
+            self._sobol_cache[cache_key] = points
+
+        return self._sobol_cache[cache_key]
+
+def create_uniform_sampler(sampling_scheme: str, rng_mode: str, risk_ids, num_scenarios: int, replicates: int = 1):
+    """Returns the UniformSampler of a run, or None for plain pseudo-random draws without replicates."""
+    validate_sampling_scheme(sampling_scheme, rng_mode)
+    if sampling_scheme == 'pseudo' and replicates == 1:
+        return None
+    if rng_mode == 'philox_grouped':
+        raise ValueError("Sampling schemes & replicates draw per risk streams and require rng_mode='philox'.")
+
+    return UniformSampler(sampling_scheme, risk_ids, num_scenarios, replicates=replicates)
+
+def draw_standard_normals(out: np.ndarray, sampling_scheme: str = 'pseudo', rng: np.random.Generator = None):
+    """Fills a (dimensions x samples) array with standard normals of a sampling scheme (rows are dimensions).
+
+    Used by the market simulators, where a dimension is a time step (paths) or an asset (horizon values)."""
+    validate_sampling_scheme(sampling_scheme)
+    rng = rng if rng is not None else np.random.default_rng()
+    dimensions, samples = out.shape
+
+    if sampling_scheme == 'pseudo':
+        rng.standard_normal(out=out, dtype=out.dtype)
+
+    elif sampling_scheme == 'antithetic':
+        # Sample i of the second half mirrors sample i of the first half
+        half = (samples + 1) // 2
+        normals = rng.standard_normal((dimensions, half))
+        out[:, :half] = normals
+        np.negative(normals[:, :samples - half], out=out[:, half:], casting='same_kind')
+
+    else:
+        if sampling_scheme == 'lhs':
+            sampling_engine = qmc.LatinHypercube(dimensions, seed=rng)
+        else:
+            sampling_engine = qmc.Sobol(dimensions, scramble=True, seed=rng)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            uniforms = sampling_engine.random(samples).T
+
+        out[:] = sp.ndtri(to_open_unit_interval(uniforms))
+
+    return out
+
+def replicate_standard_errors(losses: np.ndarray, replicates: int, var_levels=DEFAULT_VAR_LEVELS,
+                              es_levels=DEFAULT_ES_LEVELS, weights: np.ndarray = None):
+    """Standard errors of the tail metrics from the spread of their estimates over the replicate blocks.
+
+    Scenarios are split into `replicates` contiguous blocks (of equal size when they divide the scenario count).
+    Returns a dictionary shaped like compute_tail_metrics, holding std(estimates) / sqrt(replicates)."""
+    loss_blocks = np.array_split(np.asarray(losses, dtype=np.float64).ravel(), replicates)
+    weight_blocks = [None] * replicates if weights is None else \
+        np.array_split(np.asarray(weights, dtype=np.float64).ravel(), replicates)
+    replicate_metrics = [compute_tail_metrics(block, var_levels=var_levels, es_levels=es_levels, weights=block_weights)
+                         for block, block_weights in zip(loss_blocks, weight_blocks)]
+
+    def standard_error(values):
+        return float(np.std(values, ddof=1) / np.sqrt(replicates))
+
+    return {"VaR": {level: standard_error([metrics["VaR"][level] for metrics in replicate_metrics])
+                    for level in replicate_metrics[0]["VaR"]},
+            "ES": {level: standard_error([metrics["ES"][level] for metrics in replicate_metrics])
+                   for level in replicate_metrics[0]["ES"]},
+            "Expected": standard_error([metrics["Expected"] for metrics in replicate_metrics]),
+            "Median": standard_error([metrics["Median"] for metrics in replicate_metrics]),
+            "Mode": standard_error([metrics["Mode"] for metrics in replicate_metrics])}
@@ -0,0 +1,172 @@
+import logging
+import numpy as np
+import pandas as pd
+from model.batched_simulation_engine import extract_register_parameters, group_risks_by_distribution
+from model.vectorized_simulation_engine import SEVERITY_DISTRIBUTIONS, transform_uniforms_to_severity
+from model.random_streams import MATERIALIZATION_STREAM, SEVERITY_STREAM, draw_risk_uniforms
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS, compute_tail_metrics, tail_metrics_to_frame
+from tools.output_writers import create_output_writer
+
+logger = logging.getLogger(__name__)
+
+# Overrides a grid point may set; the scales apply to scaled_risks (all risks when None)
+SWEEP_OVERRIDES = ("cap_apply", "max_cap", "independent_sampling", "likelihood_scale", "impact_scale",
+                   "scaled_risks")
+
+def resolve_sweep_points(grid, cap_apply: bool = True, max_cap: float = 400000000.00,
+                         independent_sampling: bool = True):
+    """Completes every grid point (dict of overrides) with the base settings of the run."""
+    base_point = {"cap_apply": cap_apply, "max_cap": max_cap, "independent_sampling": independent_sampling,
+                  "likelihood_scale": 1.0, "impact_scale": 1.0, "scaled_risks": None}
+    points = []
+    for point in grid:
+        unknown_overrides = set(point) - set(SWEEP_OVERRIDES)
+        if unknown_overrides:
+            raise ValueError(f"Unknown sweep overrides {sorted(unknown_overrides)}; expected {SWEEP_OVERRIDES}.")
+        points.append({**base_point, **point})
+
+    return points
+
+def _point_parameters(register_parameters: dict, point: dict):
+    """Per risk likelihoods & impact scales of a grid point."""
+    if point["scaled_risks"] is None:
+        scaled = np.ones(len(register_parameters["risk"]), dtype=bool)
+    else:
+        scaled = np.isin(register_parameters["risk"].astype(str), [str(risk) for risk in point["scaled_risks"]])
+
+    likelihood = np.where(scaled, np.minimum(register_parameters["likelihood"] * point["likelihood_scale"], 1.0),
+                          register_parameters["likelihood"])
+    impact_scale = np.where(scaled, float(point["impact_scale"]), 1.0)
+
+    return likelihood, impact_scale
+
+def run_sensitivity_sweep(register_parameters: dict, num_steps: int, num_scenarios: int, grid,
+                          independent_sampling: bool = True, selected_seed: int = 110, cap_apply: bool = True,
+                          max_cap: float = 400000000.00, chunk_size: int = 65536, var_levels=DEFAULT_VAR_LEVELS,
+                          es_levels=DEFAULT_ES_LEVELS, uniform_sampler=None):
+    """Computes the horizon metrics of every grid point from one set of common random numbers.
+
+    Materialization uniforms & unscaled severities are drawn once per scenario chunk (keyed Philox streams, as
+    rng_mode 'philox'); each grid point only re-applies the likelihood threshold, impact scale, masking & cap.
+    Severities scale with their location & spread for every supported distribution, so scaling impacts equals
+    scaling the register's impact parameters. A point without overrides reproduces the horizon of a normal run.
+    Returns a tidy table with one row per grid point & metric."""
+    points = resolve_sweep_points(grid, cap_apply=cap_apply, max_cap=max_cap,
+                                  independent_sampling=independent_sampling)
+    draw_uniforms = uniform_sampler.draw if uniform_sampler is not None else draw_risk_uniforms
+    point_parameters = [_point_parameters(register_parameters, point) for point in points]
+    groups = group_risks_by_distribution(register_parameters)
+    severity_rows = np.concatenate([indices for group, indices in groups.items() if group in SEVERITY_DISTRIBUTIONS]
+                                   + [np.empty(0, dtype=np.intp)])
+
+    # Highest likelihood of every risk over the grid (all scenarios are candidates without materialization)
+    max_likelihood = np.max([likelihood if point["independent_sampling"] else np.full_like(likelihood, np.inf)
+                             for point, (likelihood, _) in zip(points, point_parameters)], axis=0)
+
+    number_of_risks = len(register_parameters["risk"])
+    horizon_step = num_steps - 1
+    horizon_totals = np.empty((len(points), num_scenarios))
+
+    for scenario_start in range(0, num_scenarios, chunk_size):
+        scenario_stop = min(scenario_start + chunk_size, num_scenarios)
+        scenarios = scenario_stop - scenario_start
+
+        # Common random numbers of the chunk: materialization uniforms & unscaled severities (risks x scenarios)
+        materialization_uniforms = np.empty((number_of_risks, scenarios))
+        severities = np.empty((number_of_risks, scenarios))
+        for position, risk_id in enumerate(register_parameters["risk"]):
+            draw_uniforms(selected_seed, risk_id, MATERIALIZATION_STREAM, num_steps, scenario_start, scenario_stop,
+                          out=materialization_uniforms[position:position + 1], first_step=horizon_step)
+
+        for group, indices in groups.items():
+            if group in SEVERITY_DISTRIBUTIONS:
+                for position in indices:
+                    draw_uniforms(selected_seed, register_parameters["risk"][position], SEVERITY_STREAM, num_steps,
+                                  scenario_start, scenario_stop, out=severities[position:position + 1],
+                                  first_step=horizon_step)
+
+                mean, std, min_impact, max_impact = (register_parameters[key][indices].reshape(-1, 1)
+                                                     for key in ("mean", "std", "min_impact", "max_impact"))
+                severities[indices] = transform_uniforms_to_severity(
+                    severities[indices], distribution=group, mean=mean, std=std, left_tail_impact=min_impact,
+                    right_tail_impact=max_impact, min_impact=min_impact, max_impact=max_impact)
+            elif group == "Deterministic Trend":
+                severities[indices] = register_parameters["mean"][indices].reshape(-1, 1) * horizon_step
+            else:
+                severities[indices] = np.nan
+
+        # Scenarios where a risk materializes for some grid point, sorted by materialization uniform, so that the
+        # scenarios materializing at a likelihood are a prefix (u < likelihood) of that order
+        sorted_uniforms, sorted_scenarios, sorted_severities = {}, {}, {}
+        for position in severity_rows:
+            candidates = np.flatnonzero(materialization_uniforms[position] < max_likelihood[position])
+            candidates = candidates[np.argsort(materialization_uniforms[position, candidates], kind='stable')]
+            sorted_uniforms[position] = materialization_uniforms[position, candidates]
+            sorted_scenarios[position] = candidates
+            sorted_severities[position] = severities[position, candidates]
+
+        # Cheap transforms per grid point (as in simulate_risk_group), adding only the impacts that are non-zero
+        # under materialization; bincount adds risks in register order like the engines' sum
+        all_scenarios = np.arange(scenarios)
+        for point_index, (point, (likelihood, impact_scale)) in enumerate(zip(points, point_parameters)):
+            scenario_parts, impact_parts = [], []
+            for position in range(number_of_risks):
+                if position not in sorted_scenarios:
+                    scenario_parts.append(all_scenarios)
+                    impact_parts.append(severities[position] * impact_scale[position])
+                    continue
+
+                if point["independent_sampling"]:
+                    count = np.searchsorted(sorted_uniforms[position], likelihood[position])
+                    materialized = sorted_scenarios[position][:count]
+                    risk_impacts = sorted_severities[position][:count] * impact_scale[position]
+                else:
+                    materialized = all_scenarios
+                    risk_impacts = severities[position] * impact_scale[position]
+                if point["cap_apply"]:
+                    np.minimum(risk_impacts, point["max_cap"], out=risk_impacts)
+
+                scenario_parts.append(materialized)
+                impact_parts.append(risk_impacts)
+
+            horizon_totals[point_index, scenario_start:scenario_stop] = np.bincount(
+                np.concatenate(scenario_parts + [all_scenarios[:0]]),
+                weights=np.concatenate(impact_parts + [np.empty(0)]), minlength=scenarios)
+
+        logger.info(f"Swept scenarios {scenario_start} to {scenario_stop} of {num_scenarios}...")
+
+    # Tidy table: one row per grid point & metric
+    sweep_rows = []
+    for point_index, point in enumerate(points):
+        df_metrics = tail_metrics_to_frame(compute_tail_metrics(horizon_totals[point_index], var_levels=var_levels,
+                                                                es_levels=es_levels))
+        for metric, value in df_metrics.iloc[0].items():
+            scaled_risks = "all" if point["scaled_risks"] is None else ", ".join(map(str, point["scaled_risks"]))
+            sweep_rows.append({"Grid Point": point_index, **point, "scaled_risks": scaled_risks, "Metric": metric,
+                               "Value": value})
+
+    return pd.DataFrame(sweep_rows)
+
+def perform_sensitivity_sweep(df_lite_rr: pd.DataFrame, num_steps: int, num_scenarios: int, grid,
+                              independent_sampling: bool = True, interim_files_dir: str = None,
+                              save_interim_files: bool = False, selected_seed: int = 110, cap_apply: bool = True,
+                              max_cap: float = 400000000.00, chunk_size: int = 65536,
+                              var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+                              output_format: str = 'npy', register_parameters: dict = None):
+    """Sweeps the register over a grid of overrides (see run_sensitivity_sweep) & saves the 'Sensitivity Sweep'."""
+    if register_parameters is None:
+        register_parameters = extract_register_parameters(df_lite_rr)
+
+    df_sweep = run_sensitivity_sweep(
+        register_parameters=register_parameters, num_steps=num_steps, num_scenarios=num_scenarios, grid=grid,
+        independent_sampling=independent_sampling, selected_seed=selected_seed, cap_apply=cap_apply,
+        max_cap=max_cap, chunk_size=chunk_size, var_levels=var_levels, es_levels=es_levels)
+
+    if save_interim_files:
+        output_writer = create_output_writer(output_format, interim_files_dir)
+        output_writer.write_table("Sensitivity Sweep", df_sweep)
+        output_writer.close()
+
+    logger.info(f"Sensitivity sweep of {len(grid)} grid points over {num_scenarios} scenarios completed successfully!")
+
+    return df_sweep
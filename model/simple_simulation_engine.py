@@ -1,22 +1,29 @@
-import os
+import time
+from typing import NamedTuple
 import numpy as np
-from scipy import stats as st
 import pandas as pd
 import logging
+from model.vectorized_simulation_engine import simulate_risk_impact_array
+from model.batched_simulation_engine import extract_register_parameters, simulate_register_batched
+from model.parallel_simulation_engine import resolve_worker_count, simulate_register_parallel
+from tools.output_writers import create_output_writer, validate_output_format
+from tools.background_writer import BackgroundOutputWriter
+from tools.result_store import SimulationResultStore
+from tools.simulation_cache import (DEFAULT_MAX_BYTES, SimulationCache, register_fingerprints,
+                                    select_register_parameters)
+from model.materialization import MaterializationMap
+from tools.instrumentation import NULL_INSTRUMENTATION
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS, compute_tail_metrics, tail_metrics_to_frame
+from model.sampling_schemes import create_uniform_sampler, replicate_standard_errors
+from model.copula import create_copula_sampler
+from model.importance_sampling import (add_risk_log_likelihood_ratio, build_proposal_parameters, effective_sample_size,
+                                       first_risk_positions, register_log_likelihood_ratios,
+                                       validate_importance_sampling)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-# Create console handler and set level to info
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-
-# Create formatter and add it to the handler
-formatter = logging.Formatter('%(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-
-# Add the handler to the logger
-logger.addHandler(console_handler)
+# Handlers & levels are left to the application (see main.py), so messages are not duplicated when embedded
+logger.addHandler(logging.NullHandler())
 
 def define_unique_risk_factors(df_with_risk_factors: pd.DataFrame, risk_id_column: str = 'Risk'):
     """Extracts & Returns the unique IDs of risk factors."""
@@ -86,130 +93,372 @@ def sample_risk_impact(steps: int = 5, scenarios: int = 1000, distribution: str
 
     return df_rv_sim, df_risk_realization_map
 
+class SimulationResults(NamedTuple):
+    """Outputs of perform_simulation(full_results=True); optional outputs are None unless requested."""
+    total_impacts: pd.DataFrame # (steps x scenarios) impacts summed over all risk factors
+    risk_impacts: object # Per risk factor (steps x scenarios) DataFrames by risk ID, or a SimulationResultStore
+    materialization_map: MaterializationMap = None # Packed materializations (return_materialization_map=True)
+    scenario_weights: np.ndarray = None # (steps x scenarios) likelihood-ratio weights (importance sampling)
+
+class SamplingOptions(NamedTuple):
+    """Random draws of a simulation; the defaults reproduce the seed + risk + step draws of sample_risk_impact."""
+    rng_mode: str = None # 'legacy', keyed counter-based 'philox' streams per risk or 'philox_grouped' streams
+    # per distribution group (one draw per group & step; batched or parallel runs only, see model.random_streams).
+    # None: 'legacy' for full-path runs, 'philox' for the streaming & adaptive runs of main.py (chunked draws)
+    scheme: str = 'pseudo' # 'antithetic', 'lhs' or 'sobol' reduce variance (rng_mode 'philox', model.sampling_schemes)
+    # 'sobol' caches the points of all risks & steps, about twice the impacts (bounded by chunks when streaming)
+    replicates: int = 1 # Independently randomized blocks of scenarios, giving standard errors of the metrics
+    importance_likelihood: float = None # Minimum likelihood of the importance risks (model.importance_sampling)
+    importance_risks: object = None # Risk IDs sampled at importance_likelihood (default: the less likely ones)
+    importance_severity_shift: float = 0.0 # Shift of their normal / lognormal severities in standard deviations
+
+class CopulaOptions(NamedTuple):
+    """Dependence of risks through a copula (see model.copula); risks are independent when family is None."""
+    family: str = None # 'gaussian' or 't'
+    correlations: pd.DataFrame = None # Taxonomy x taxonomy ('taxonomy' structure) or risk x risk ('risk') matrix
+    structure: str = 'taxonomy'
+    degrees_of_freedom: float = 4.0 # Of the 't' copula
+    factorization_cache_dir: str = None # Cholesky factors cached across runs
+    correlation_file_name: str = r'taxonomy correlations.xlsx' # Read next to the register by main.py
+    correlation_sheet_name: str = r'Correlations'
+
+class ExecutionOptions(NamedTuple):
+    """How a simulation is executed & where its per risk results go."""
+    batched: bool = False # All risks sampled per distribution group (model.batched_simulation_engine)
+    # Of the interim files: 'npy' or 'parquet' arrays (summary tables in Excel) or 'excel' (up to 16381 scenarios)
+    output_format: str = 'npy' # See tools.output_writers
+    background_io: bool = False # Interim files written by io_threads background threads while sampling
+    io_threads: int = 1
+    result_store_dir: str = None # Per risk paths kept in a memory-mapped SimulationResultStore instead of a dictionary
+    result_store_dtype: str = 'float64'
+    simulation_cache_dir: str = None # Per risk results cached across runs (independent draws, tools.simulation_cache)
+    simulation_cache_max_bytes: int = DEFAULT_MAX_BYTES
+
 def perform_simulation(df_lite_rr: pd.DataFrame, num_steps: int, num_scenarios: int, independent_sampling: bool,
                        interim_files_dir: str,  save_interim_files: bool = True, selected_seed: int = 110,
-                       cap_apply: bool = True, max_cap: float = 400000000.00):
-    """Performs the simulation for multiple risk factors."""
+                       cap_apply: bool = True, max_cap: float = 400000000.00, workers: int = 1,
+                       sampling: SamplingOptions = SamplingOptions(), copula: CopulaOptions = CopulaOptions(),
+                       execution: ExecutionOptions = ExecutionOptions(), return_materialization_map: bool = False,
+                       full_results: bool = False, instrumentation=NULL_INSTRUMENTATION,
+                       register_parameters: dict = None):
+    """Performs the simulation for multiple risk factors & returns total & per risk factor impacts.
+
+    workers other than 1 spreads groups of risks over a process pool (None or 0 uses all cores). With
+    full_results=True the SimulationResults are returned instead, with the materialization map & the
+    likelihood-ratio weights of importance sampling. register_parameters is the register's parameter table when
+    already loaded (see tools.register_reader.load_risk_register_parameters)."""
+    if sampling.rng_mode is None:
+        sampling = sampling._replace(rng_mode='legacy')
+    if save_interim_files:
+        validate_output_format(execution.output_format, num_scenarios)
+    if not full_results and (return_materialization_map or sampling.importance_likelihood is not None):
+        raise ValueError("The materialization map & importance sampling weights are only returned with "
+                         "full_results=True.")
+    if copula.family is not None and sampling.importance_likelihood is not None:
+        raise ValueError("Importance sampling weights assume independent risks and cannot be combined with a copula.")
+    if sampling.rng_mode == 'philox_grouped' and not (execution.batched or workers != 1):
+        raise ValueError("rng_mode='philox_grouped' draws whole distribution groups and requires execution.batched "
+                         "or workers other than 1.")
+    if sampling.rng_mode == 'philox_grouped' and execution.simulation_cache_dir is not None:
+        raise ValueError("The simulation cache requires per risk draws; use rng_mode='philox' or 'legacy'.")
+
     # Create a list containing all risks factors
     list_of_risks = define_unique_risk_factors(df_with_risk_factors=df_lite_rr)
 
-    # Create a DataFrame to store total results of the simulation (for all risk factors)
-    #df_total_simulated_impacts = pd.DataFrame(columns=range(num_scenarios))
-    df_total_simulated_impacts = pd.DataFrame(np.zeros((num_steps, num_scenarios)))
+    # Uniforms of the selected sampling scheme (None for plain pseudo-random draws)
+    uniform_sampler = create_uniform_sampler(sampling.scheme, sampling.rng_mode, list_of_risks, num_scenarios,
+                                             replicates=sampling.replicates)
+
+    # Extract parameters of all risk factors / risks in the risk register once
+    if register_parameters is None:
+        register_parameters = extract_register_parameters(df_lite_rr)
+
+    # Correlated uniforms of the copula (built on top of the sampling scheme's uniforms)
+    uniform_sampler = create_copula_sampler(copula.family, register_parameters, copula.correlations,
+                                            copula_structure=copula.structure,
+                                            degrees_of_freedom=copula.degrees_of_freedom,
+                                            cache_dir=copula.factorization_cache_dir, base_sampler=uniform_sampler,
+                                            rng_mode=sampling.rng_mode)
+
+    # Under importance sampling risks are sampled from the proposal parameters & reweighted
+    sampling_parameters = register_parameters
+    if sampling.importance_likelihood is not None:
+        validate_importance_sampling(sampling.rng_mode, sampling.importance_severity_shift)
+        sampling_parameters, severity_shifts = build_proposal_parameters(
+            register_parameters, sampling.importance_likelihood, risks=sampling.importance_risks,
+            severity_shift=sampling.importance_severity_shift)
+        log_weights = np.zeros((num_steps, num_scenarios))
+        weighted_positions = set(first_risk_positions(register_parameters).tolist())
+
+    # Per risk results of earlier runs are reused for risks whose row & run settings are unchanged
+    simulation_cache = None
+    if execution.simulation_cache_dir is not None:
+        if uniform_sampler is not None and getattr(uniform_sampler, "sampling_scheme", None) != 'pseudo':
+            raise ValueError("The simulation cache requires independent per risk draws; it cannot be combined with "
+                             "sampling schemes other than 'pseudo' or with copulas.")
+        simulation_cache = SimulationCache(execution.simulation_cache_dir,
+                                           max_bytes=execution.simulation_cache_max_bytes)
+        fingerprints = register_fingerprints(sampling_parameters, {
+            "seed": selected_seed, "steps": num_steps, "scenarios": num_scenarios, "rng_mode": sampling.rng_mode,
+            "independent_sampling": independent_sampling, "cap_apply": cap_apply, "max_cap": max_cap})
 
     # Create a Dictionary to store per risk factor results
     dict_total_results = {}
 
-    for risk in list_of_risks:
-        # Define parameters of each risk factor / risk in the risk register
-        likelihood_value = df_lite_rr['Converted Likelihood'][df_lite_rr['Risk'] == risk].values[0]
-        min_impact_value = df_lite_rr['Converted Lower Impact'][df_lite_rr['Risk'] == risk].values[0]
-        max_impact_value = df_lite_rr['Converted Max Impact'][df_lite_rr['Risk'] == risk].values[0]
-        distribution_value = df_lite_rr['Distribution'][df_lite_rr['Risk'] == risk].values[0]
-        mean_value = df_lite_rr['Mean'][df_lite_rr['Risk'] == risk].values[0]
-        std_value = df_lite_rr['Std'][df_lite_rr['Risk'] == risk].values[0]
-        # Placeholder(s): values for mean and median are not yet utilized
-        mode_value = 0
-        median_value = 0
+    # Optionally keep per risk factor results in a memory-mapped store on disk
+    result_store = None
+    if execution.result_store_dir is not None:
+        result_store = SimulationResultStore.create(
+            execution.result_store_dir, list_of_risks, num_steps, num_scenarios, dtype=execution.result_store_dtype,
+            run_settings={"seed": selected_seed, "rng_mode": sampling.rng_mode,
+                          "independent_sampling": independent_sampling, "cap_apply": cap_apply, "max_cap": max_cap,
+                          "sampling_scheme": sampling.scheme, "replicates": sampling.replicates})
 
-        logger.info(f"Simulating impact of risk factor {str(risk)}...")
+    materialization_map = MaterializationMap(list_of_risks, num_steps, num_scenarios) \
+        if return_materialization_map else None
 
-        df_risk_sims, df_risk_real_map = sample_risk_impact(
-            steps=num_steps, scenarios=num_scenarios, distribution=distribution_value,
-            mean=mean_value, std=std_value, mode=mode_value, median=median_value, risk_likelihood=likelihood_value,
-            left_tail_impact=min_impact_value, right_tail_impact=max_impact_value,
-            min_impact=min_impact_value, max_impact=max_impact_value,
-            seed=selected_seed, independent_risk_sampling=independent_sampling, risk_id=risk,
-            cap_value=max_cap, cap_impact_per_risk=cap_apply)
-
-        # Update total simulation results DataFrame with the just-simulated risk factor
-        df_total_simulated_impacts = df_total_simulated_impacts + df_risk_sims
-
-        # Update Dictionary with results per risk factor
-        dict_total_results[str(risk)] = df_risk_sims.copy()
+    if save_interim_files:
+        output_writer = create_output_writer(execution.output_format, interim_files_dir)
+        if execution.background_io:
+            output_writer = BackgroundOutputWriter(output_writer, num_threads=execution.io_threads)
+
+    if execution.batched or workers != 1:
+        # Only risks missing from the cache are simulated
+        batch_parameters = sampling_parameters
+        if simulation_cache is not None:
+            cached_results = [simulation_cache.get(fingerprint) for fingerprint in fingerprints]
+            simulated_positions = np.array([position for position, cached in enumerate(cached_results)
+                                            if cached is None], dtype=np.intp)
+            batch_parameters = select_register_parameters(sampling_parameters, simulated_positions)
+
+        if len(batch_parameters["risk"]) == 0:
+            impacts = np.empty((0, num_steps, num_scenarios))
+            realizations = np.empty((0, num_steps, num_scenarios), dtype=np.int8)
+        elif workers != 1:
+            logger.info(f"Simulating impact of all risk factors over {resolve_worker_count(workers)} "
+                        f"processes...")
+
+            impacts, realizations, total_simulated_impacts = simulate_register_parallel(
+                register_parameters=batch_parameters, num_steps=num_steps, num_scenarios=num_scenarios,
+                workers=workers, independent_sampling=independent_sampling, selected_seed=selected_seed,
+                cap_apply=cap_apply, max_cap=max_cap, rng_mode=sampling.rng_mode, uniform_sampler=uniform_sampler,
+                instrumentation=instrumentation)
+        else:
+            logger.info(f"Simulating impact of all risk factors in distribution batches...")
+
+            impacts, realizations = simulate_register_batched(
+                register_parameters=batch_parameters, num_steps=num_steps, num_scenarios=num_scenarios,
+                independent_sampling=independent_sampling, selected_seed=selected_seed,
+                cap_apply=cap_apply, max_cap=max_cap, rng_mode=sampling.rng_mode, uniform_sampler=uniform_sampler,
+                instrumentation=instrumentation)
+
+            # Sum over risks in register order
+            total_simulated_impacts = np.add.reduce(impacts, axis=0)
+
+        if simulation_cache is not None:
+            for position, risk_impacts, risk_realizations in zip(simulated_positions, impacts, realizations):
+                simulation_cache.put(fingerprints[position], risk_impacts, risk_realizations)
+                cached_results[position] = (risk_impacts, risk_realizations)
+
+            # Rebuild the register tensors & totals (register order) from cached & new results
+            impacts = np.stack([cached[0] for cached in cached_results])
+            realizations = np.stack([cached[1] for cached in cached_results])
+            total_simulated_impacts = np.add.reduce(impacts, axis=0)
+
+        if sampling.importance_likelihood is not None:
+            log_weights = register_log_likelihood_ratios(
+                register_parameters, sampling_parameters, severity_shifts, realizations, selected_seed=selected_seed,
+                independent_sampling=independent_sampling, uniform_sampler=uniform_sampler)
+
+        for position, risk in enumerate(list_of_risks):
+            if materialization_map is not None:
+                materialization_map.set_risk(position, realizations[position])
+
+            if result_store is not None:
+                result_store.write_risk(position, impacts[position])
+            else:
+                dict_total_results[str(risk)] = pd.DataFrame(impacts[position], copy=False)
+
+            if save_interim_files:
+                output_writer.write_risk_results(risk, impacts[position], realizations[position])
+
+    else:
+        # Create an array to store total results of the simulation (for all risk factors)
+        total_simulated_impacts = np.zeros((num_steps, num_scenarios))
+
+        for position, risk in enumerate(list_of_risks):
+            # Define parameters of each risk factor / risk in the risk register
+            likelihood_value = sampling_parameters["likelihood"][position]
+            min_impact_value = sampling_parameters["min_impact"][position]
+            max_impact_value = sampling_parameters["max_impact"][position]
+            distribution_value = sampling_parameters["distribution"][position]
+            mean_value = sampling_parameters["mean"][position]
+            std_value = sampling_parameters["std"][position]
+
+            if instrumentation.enabled:
+                risk_wall_start, risk_cpu_start = time.perf_counter(), time.process_time()
+
+            cached = simulation_cache.get(fingerprints[position]) if simulation_cache is not None else None
+            if cached is not None:
+                logger.info(f"Reading cached impact of risk factor {str(risk)}...")
+
+                risk_impacts, risk_realizations = cached
+            else:
+                logger.info(f"Simulating impact of risk factor {str(risk)}...")
+
+                risk_impacts, risk_realizations = simulate_risk_impact_array(
+                    steps=num_steps, scenarios=num_scenarios, distribution=distribution_value,
+                    mean=mean_value, std=std_value, risk_likelihood=likelihood_value,
+                    left_tail_impact=min_impact_value, right_tail_impact=max_impact_value, min_impact=min_impact_value,
+                    max_impact=max_impact_value, seed=selected_seed, independent_risk_sampling=independent_sampling,
+                    risk_id=risk, cap_value=max_cap, cap_impact_per_risk=cap_apply, rng_mode=sampling.rng_mode,
+                    uniform_sampler=uniform_sampler)
+
+                if simulation_cache is not None:
+                    simulation_cache.put(fingerprints[position], risk_impacts, risk_realizations)
+
+            if instrumentation.enabled:
+                instrumentation.record_risk(risk, time.perf_counter() - risk_wall_start,
+                                            time.process_time() - risk_cpu_start, num_scenarios,
+                                            cached=cached is not None)
+
+            # Update total simulation results with the just-simulated risk factor
+            total_simulated_impacts += risk_impacts
+
+            if sampling.importance_likelihood is not None and position in weighted_positions:
+                add_risk_log_likelihood_ratio(
+                    log_weights, risk, register_parameters["likelihood"][position], likelihood_value,
+                    severity_shifts[position], risk_realizations, seed=selected_seed,
+                    independent_sampling=independent_sampling, uniform_sampler=uniform_sampler)
+
+            if materialization_map is not None:
+                materialization_map.set_risk(position, risk_realizations)
+
+            # Update Dictionary (or result store) with results per risk factor
+            if result_store is not None:
+                result_store.write_risk(position, risk_impacts)
+            else:
+                dict_total_results[str(risk)] = pd.DataFrame(risk_impacts, copy=False)
+
+            if save_interim_files:
+                output_writer.write_risk_results(risk, risk_impacts, risk_realizations)
+
+            logger.info(f"Simulation of impact for risk factor {str(risk)} completed successfully!")
+
+    df_total_simulated_impacts = pd.DataFrame(total_simulated_impacts)
+
+    if result_store is not None:
+        result_store.write_total(total_simulated_impacts)
+        result_store.flush()
+        dict_total_results = result_store
 
-        if save_interim_files:
-            temp_alias_results = "simulation_of_impacts_risk_" + str(risk) + ".xlsx"
-            temp_alias_materialization = "materialization_risk_" + str(risk) + ".xlsx"
+    if save_interim_files:
+        output_writer.write_total_results(total_simulated_impacts)
+        output_writer.close()
 
-            df_risk_sims.to_excel(os.path.join(interim_files_dir, temp_alias_results))
-            df_risk_real_map.to_excel(os.path.join(interim_files_dir, temp_alias_materialization))
+    if simulation_cache is not None:
+        logger.info(f"Simulation cache: {simulation_cache.hits} risks read back, {simulation_cache.misses} simulated.")
 
-        logger.info(f"Simulation of impact for risk factor {str(risk)} completed successfully!")
+    logger.info(f"Simulation of impact for all risk factors completed successfully!")
 
-    if save_interim_files:
-        temp_alias_total_results = "Total Simulated Impacts.xlsx"
-        df_total_simulated_impacts.to_excel(os.path.join(interim_files_dir, temp_alias_total_results))
+    scenario_weights = None
+    if sampling.importance_likelihood is not None:
+        scenario_weights = np.exp(log_weights)
+        logger.info(f"Importance sampling: effective sample size at horizon "
+                    f"{effective_sample_size(scenario_weights[-1]):.0f} of {num_scenarios} scenarios.")
 
-    logger.info(f"Simulation of impact for all risk factors completed successfully!")
+    if not full_results:
+        return df_total_simulated_impacts, dict_total_results
 
-    return df_total_simulated_impacts,dict_total_results
+    return SimulationResults(df_total_simulated_impacts, dict_total_results, materialization_map=materialization_map,
+                             scenario_weights=scenario_weights)
 
-def extract_simulation_statistics(risk_factor_df_dict, df_rr_lite: pd.DataFrame, df_total_impact_results: pd.DataFrame,
-                                  interim_files_dir: str,  save_interim_files: bool = True):
-    """Extracts statistics based on simulation results."""
-    # 1- Per Risk Factor Statistics
+def build_horizon_summary(horizon_values_per_rf: np.ndarray, df_rr_lite: pd.DataFrame):
+    """Builds the per risk factor table of values at horizon, with taxonomy & title information."""
     # Create a list containing all risks factors
     list_of_risks = define_unique_risk_factors(df_with_risk_factors=df_rr_lite)
 
+    # Duplicated risk IDs take the title & taxonomy of their first row
+    df_first_rows = df_rr_lite.drop_duplicates(subset='Risk').set_index('Risk').loc[df_rr_lite['Risk']]
+
     # Create a DataFrame to store results at simulation's horizon for each risk factor
-    df_horizon_values_per_rf = pd.DataFrame()
+    df_horizon_values_per_rf = pd.DataFrame(horizon_values_per_rf)
+
+    # Update Risk Title & Risk taxonomy Information
+    df_horizon_values_per_rf['Taxonomy'] = df_first_rows['Taxonomy Level I'].to_numpy()
+    df_horizon_values_per_rf['Title'] = df_first_rows['Risk Title'].to_numpy()
 
-    # Create a list to store risk factor titles
-    rf_titles = []
+    df_horizon_values_per_rf.index = list_of_risks.copy()
 
-    # Create a list to store risk taxonomies
-    risk_taxonomies = []
+    return df_horizon_values_per_rf
 
-    logger.info(f"Aggregating simulation results per risk factor at horizon...")
+def compute_horizon_metrics(horizon_total_impacts: np.ndarray, var_levels=DEFAULT_VAR_LEVELS,
+                            es_levels=DEFAULT_ES_LEVELS, weights: np.ndarray = None, replicates: int = 1):
+    """Computes percentiles, expected shortfalls & central metrics of the total impact at horizon.
 
-    for risk in list_of_risks:
-        simulation_horizon_results = risk_factor_df_dict[str(risk)].iloc[-1, :].copy()
-        simulation_horizon_results = pd.DataFrame([simulation_horizon_results])
-        df_horizon_values_per_rf = pd.concat([df_horizon_values_per_rf, simulation_horizon_results],
-                                             axis=0, ignore_index=True)
-        rf_titles.append(df_rr_lite['Risk Title'][df_rr_lite['Risk'] == risk].values[0])
-        risk_taxonomies.append(df_rr_lite['Taxonomy Level I'][df_rr_lite['Risk'] == risk].values[0])
+    With replicates > 1 a 'Standard Error' row is added, estimated from the spread of the metrics over the
+    replicate blocks of scenarios."""
+    tail_metrics = compute_tail_metrics(horizon_total_impacts, var_levels=var_levels, es_levels=es_levels,
+                                        weights=weights)
+    df_metrics = tail_metrics_to_frame(tail_metrics, index="Horizon")
 
-    # Update Risk Title & Risk taxonomy Information
-    df_horizon_values_per_rf['Taxonomy'] = risk_taxonomies.copy()
-    df_horizon_values_per_rf['Title'] = rf_titles.copy()
+    if replicates > 1:
+        standard_errors = replicate_standard_errors(horizon_total_impacts, replicates, var_levels=var_levels,
+                                                    es_levels=es_levels, weights=weights)
+        df_metrics = pd.concat([df_metrics, tail_metrics_to_frame(standard_errors, index="Standard Error")])
 
-    df_horizon_values_per_rf.index = list_of_risks.copy()
+    return df_metrics
+
+def save_statistics_files(df_horizon_values_per_rf: pd.DataFrame, df_impact_total_at_horizon_metrics: pd.DataFrame,
+                          interim_files_dir: str, output_format: str = 'npy'):
+    """Saves the per risk factor horizon table (unless None) & the total impact metrics."""
+    output_writer = create_output_writer(output_format, interim_files_dir)
+
+    if df_horizon_values_per_rf is not None:
+        output_writer.write_table("Horizon Results", df_horizon_values_per_rf)
+    output_writer.write_table("Total Impact Metrics at Horizon", df_impact_total_at_horizon_metrics)
+    output_writer.close()
+
+def save_materialization_statistics(materialization_map: MaterializationMap, df_rr_lite: pd.DataFrame,
+                                    interim_files_dir: str, output_format: str = 'npy'):
+    """Saves observed vs. register frequencies per risk factor & the distribution of risks materializing."""
+    df_frequencies = materialization_map.observed_frequency(step=None).to_frame()
+    df_frequencies.insert(0, "Converted Likelihood", df_rr_lite['Converted Likelihood'].to_numpy())
+
+    output_writer = create_output_writer(output_format, interim_files_dir)
+    output_writer.write_table("Materialization Frequencies", df_frequencies)
+    output_writer.write_table("Materialization Count Distribution",
+                              materialization_map.materialization_count_distribution(step=-1).to_frame())
+    output_writer.close()
+
+def extract_simulation_statistics(risk_factor_df_dict, df_rr_lite: pd.DataFrame, df_total_impact_results: pd.DataFrame,
+                                  interim_files_dir: str,  save_interim_files: bool = True,
+                                  var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+                                  output_format: str = 'npy', replicates: int = 1,
+                                  scenario_weights: np.ndarray = None):
+    """Extracts statistics based on simulation results (VaR & ES levels in percent).
+
+    replicates > 1 (as passed to perform_simulation) adds the standard errors of the total impact metrics;
+    scenario_weights (likelihood ratios of importance sampling, steps x scenarios) weight the total metrics."""
+    # 1- Per Risk Factor Statistics
+    # Create a list containing all risks factors
+    list_of_risks = define_unique_risk_factors(df_with_risk_factors=df_rr_lite)
+
+    logger.info(f"Aggregating simulation results per risk factor at horizon...")
+
+    horizon_values_per_rf = np.vstack([np.asarray(risk_factor_df_dict[str(risk)].iloc[-1, :], dtype=np.float64)
+                                       for risk in list_of_risks])
+    df_horizon_values_per_rf = build_horizon_summary(horizon_values_per_rf, df_rr_lite)
     # ---------------------------------------------------
     # 2- Total Impact Statistics
-    df_total_impact_results = df_total_impact_results.iloc[-1,:].copy()
-
-    per_90 = np.percentile(df_total_impact_results.T, 90)
-    per_95 = np.percentile(df_total_impact_results.T, 95)
-    per_99 = np.percentile(df_total_impact_results.T, 99)
-    per_99999 = np.percentile(df_total_impact_results.T, 99.999)
-
-    es_90 = np.mean(df_total_impact_results.T[
-                        df_total_impact_results.T >= np.percentile(df_total_impact_results.T, 90)])
-    es_95 = np.mean(df_total_impact_results.T[
-                        df_total_impact_results.T >= np.percentile(df_total_impact_results.T, 95)])
-    es_99 = np.mean(df_total_impact_results.T[
-                        df_total_impact_results.T >= np.percentile(df_total_impact_results.T, 99)])
-
-    average_value = np.mean(df_total_impact_results.T)
-    median_value = np.median(df_total_impact_results.T)
-    mode_value = st.mode(df_total_impact_results.T)[0]
-
-    horizon_stats = {"90%-Percentile Impact": per_90, "95%-Percentile Impact": per_95,
-                     "99%-Percentile Impact": per_99, "99.999%-Percentile Impact": per_99999,
-                     "90% ES": es_90, "95% ES": es_95, "99% ES": es_99,
-                     "Expected Impact": average_value, "Median Impact": median_value, "Mode Impact": mode_value}
-    df_impact_total_at_horizon_metrics = pd.DataFrame(horizon_stats, index=["Horizon"])
+    df_impact_total_at_horizon_metrics = compute_horizon_metrics(
+        df_total_impact_results.iloc[-1, :].to_numpy(dtype=np.float64), var_levels=var_levels, es_levels=es_levels,
+        weights=scenario_weights[-1] if scenario_weights is not None else None, replicates=replicates)
     # ---------------------------------------------------
 
     if save_interim_files:
-        temp_alias_total_results = "Horizon Results.xlsx"
-        df_horizon_values_per_rf.to_excel(os.path.join(interim_files_dir, temp_alias_total_results))
-
-        temp_alias_total_results_total_impact = "Total Impact Metrics at Horizon.xlsx"
-        df_impact_total_at_horizon_metrics.to_excel(
-            os.path.join(interim_files_dir, temp_alias_total_results_total_impact))
+        save_statistics_files(df_horizon_values_per_rf, df_impact_total_at_horizon_metrics, interim_files_dir,
+                              output_format=output_format)
 
     logger.info(f"Simulation results per risk factor at horizon aggregated successfully!")
 
@@ -0,0 +1,133 @@
+import logging
+import numpy as np
+import pandas as pd
+from model.batched_simulation_engine import extract_register_parameters, simulate_register_batched
+from model.simple_simulation_engine import build_horizon_summary, compute_horizon_metrics, save_statistics_files
+from model.risk_metrics import DEFAULT_ES_LEVELS, DEFAULT_VAR_LEVELS
+from model.sampling_schemes import create_uniform_sampler
+from model.copula import create_copula_sampler
+from model.importance_sampling import (build_proposal_parameters, effective_sample_size, register_log_likelihood_ratios,
+                                       validate_importance_sampling)
+from tools.output_writers import validate_output_format
+
+logger = logging.getLogger(__name__)
+
+def stream_horizon_impacts(register_parameters: dict, num_steps: int, num_scenarios: int,
+                           independent_sampling: bool = True, selected_seed: int = 110, cap_apply: bool = True,
+                           max_cap: float = 400000000.00, rng_mode: str = 'philox', chunk_size: int = 65536,
+                           keep_per_risk_horizon: bool = False, sampling_scheme: str = 'pseudo', replicates: int = 1,
+                           importance_likelihood: float = None, importance_risks=None,
+                           importance_severity_shift: float = 0.0, copula: str = None,
+                           correlations: pd.DataFrame = None, copula_structure: str = 'taxonomy',
+                           copula_degrees_of_freedom: float = 4.0, factorization_cache_dir: str = None):
+    """Simulates the register in scenario chunks and folds each chunk into the horizon totals.
+
+    Only the horizon step is drawn: every step reads its own seed / stream, so horizon values are identical to
+    the last row of a full-path run. Returns the total horizon vector, the (risks x scenarios) per risk
+    horizon matrix (only with keep_per_risk_horizon=True, None otherwise) and the horizon likelihood-ratio weights
+    of importance sampling (None without importance_likelihood; see perform_simulation for these & copula options).
+    Memory is bounded by one (risks x chunk_size) chunk plus the scenarios-long total (& weights) vector kept for
+    exact quantiles; keep_per_risk_horizon=True adds the risks x scenarios per risk matrix."""
+    if rng_mode == 'legacy' and chunk_size < num_scenarios:
+        raise ValueError("Legacy seeding cannot be chunked; use rng_mode='philox' or chunk_size >= num_scenarios.")
+
+    if copula is not None and importance_likelihood is not None:
+        raise ValueError("Importance sampling weights assume independent risks and cannot be combined with a copula.")
+
+    uniform_sampler = create_uniform_sampler(sampling_scheme, rng_mode, register_parameters["risk"], num_scenarios,
+                                             replicates=replicates)
+    uniform_sampler = create_copula_sampler(copula, register_parameters, correlations,
+                                            copula_structure=copula_structure,
+                                            degrees_of_freedom=copula_degrees_of_freedom,
+                                            cache_dir=factorization_cache_dir, base_sampler=uniform_sampler,
+                                            rng_mode=rng_mode)
+
+    sampling_parameters = register_parameters
+    horizon_log_weights = None
+    if importance_likelihood is not None:
+        validate_importance_sampling(rng_mode, importance_severity_shift)
+        sampling_parameters, severity_shifts = build_proposal_parameters(
+            register_parameters, importance_likelihood, risks=importance_risks,
+            severity_shift=importance_severity_shift)
+        horizon_log_weights = np.zeros(num_scenarios)
+
+    number_of_risks = len(register_parameters["risk"])
+    horizon_total_impacts = np.zeros(num_scenarios)
+    horizon_values_per_rf = np.empty((number_of_risks, num_scenarios)) if keep_per_risk_horizon else None
+
+    for scenario_start in range(0, num_scenarios, chunk_size):
+        scenario_stop = min(scenario_start + chunk_size, num_scenarios)
+
+        impacts, realizations = simulate_register_batched(
+            register_parameters=sampling_parameters, num_steps=num_steps,
+            num_scenarios=scenario_stop - scenario_start, independent_sampling=independent_sampling,
+            selected_seed=selected_seed, cap_apply=cap_apply, max_cap=max_cap, rng_mode=rng_mode,
+            scenario_start=scenario_start, first_step=num_steps - 1, uniform_sampler=uniform_sampler,
+            stream_scenarios=num_scenarios)
+
+        # Fold the chunk into the total (register order) & per risk horizon values
+        horizon_total_impacts[scenario_start:scenario_stop] = np.add.reduce(impacts[:, 0, :], axis=0)
+        if keep_per_risk_horizon:
+            horizon_values_per_rf[:, scenario_start:scenario_stop] = impacts[:, 0, :]
+        if importance_likelihood is not None:
+            horizon_log_weights[scenario_start:scenario_stop] = register_log_likelihood_ratios(
+                register_parameters, sampling_parameters, severity_shifts, realizations,
+                selected_seed=selected_seed, scenario_start=scenario_start, first_step=num_steps - 1,
+                independent_sampling=independent_sampling, uniform_sampler=uniform_sampler)[0]
+
+        logger.info(f"Simulated scenarios {scenario_start} to {scenario_stop} of {num_scenarios}...")
+
+    horizon_weights = np.exp(horizon_log_weights) if horizon_log_weights is not None else None
+
+    return horizon_total_impacts, horizon_values_per_rf, horizon_weights
+
+def perform_streaming_simulation(df_lite_rr: pd.DataFrame, num_steps: int, num_scenarios: int,
+                                 independent_sampling: bool, interim_files_dir: str, save_interim_files: bool = True,
+                                 selected_seed: int = 110, cap_apply: bool = True, max_cap: float = 400000000.00,
+                                 rng_mode: str = 'philox', chunk_size: int = 65536,
+                                 var_levels=DEFAULT_VAR_LEVELS, es_levels=DEFAULT_ES_LEVELS,
+                                 output_format: str = 'npy', sampling_scheme: str = 'pseudo', replicates: int = 1,
+                                 importance_likelihood: float = None, importance_risks=None,
+                                 importance_severity_shift: float = 0.0, copula: str = None,
+                                 correlations: pd.DataFrame = None, copula_structure: str = 'taxonomy',
+                                 copula_degrees_of_freedom: float = 4.0, factorization_cache_dir: str = None,
+                                 per_risk_horizon: bool = False, register_parameters: dict = None):
+    """Performs the simulation & extracts the horizon statistics without materializing paths.
+
+    Returns the total impact at horizon (single-row DataFrame), the per risk factor horizon table and the total
+    impact metrics, i.e. the same tables as perform_simulation followed by extract_simulation_statistics. By
+    default the per risk factor table is neither kept nor saved (None), so memory is bounded by the chunks & the
+    scenarios-long total vector; per_risk_horizon=True builds it, holding risks x scenarios values in memory.
+    Keyed Philox streams are the default since legacy seeding cannot be chunked."""
+    if save_interim_files:
+        validate_output_format(output_format, num_scenarios if per_risk_horizon else 0)
+
+    if register_parameters is None:
+        register_parameters = extract_register_parameters(df_lite_rr)
+
+    horizon_total_impacts, horizon_values_per_rf, horizon_weights = stream_horizon_impacts(
+        register_parameters=register_parameters, num_steps=num_steps, num_scenarios=num_scenarios,
+        independent_sampling=independent_sampling, selected_seed=selected_seed, cap_apply=cap_apply,
+        max_cap=max_cap, rng_mode=rng_mode, chunk_size=chunk_size, sampling_scheme=sampling_scheme,
+        replicates=replicates, importance_likelihood=importance_likelihood, importance_risks=importance_risks,
+        importance_severity_shift=importance_severity_shift, copula=copula, correlations=correlations,
+        copula_structure=copula_structure, copula_degrees_of_freedom=copula_degrees_of_freedom,
+        factorization_cache_dir=factorization_cache_dir, keep_per_risk_horizon=per_risk_horizon)
+
+    if horizon_weights is not None:
+        logger.info(f"Importance sampling: effective sample size at horizon "
+                    f"{effective_sample_size(horizon_weights):.0f} of {num_scenarios} scenarios.")
+
+    df_horizon_total_impacts = pd.DataFrame(horizon_total_impacts.reshape(1, -1), index=[num_steps - 1])
+    df_horizon_values_per_rf = build_horizon_summary(horizon_values_per_rf, df_lite_rr) if per_risk_horizon else None
+    df_impact_total_at_horizon_metrics = compute_horizon_metrics(horizon_total_impacts, var_levels=var_levels,
+                                                                 es_levels=es_levels, weights=horizon_weights,
+                                                                 replicates=replicates)
+
+    if save_interim_files:
+        save_statistics_files(df_horizon_values_per_rf, df_impact_total_at_horizon_metrics, interim_files_dir,
+                              output_format=output_format)
+
+    logger.info(f"Streaming simulation of {num_scenarios} scenarios completed successfully!")
+
+    return df_horizon_total_impacts, df_horizon_values_per_rf, df_impact_total_at_horizon_metrics
@@ -1,6 +1,50 @@
 import numpy as np
 import pandas as pd
 import os
+from scipy import signal
+from model.sampling_schemes import draw_standard_normals
+
+def simulate_vasicek_paths(kappa, long_term_mean, sigma, initial_value, horizon: float, num_steps: int,
+                           num_simulations: int, rng: np.random.Generator = None, seed: int = None,
+                           sampling_scheme: str = 'pseudo'):
+    """Simulates Vasicek (Ornstein-Uhlenbeck) paths of many rate factors with the exact transition law.
+
+    kappa, long_term_mean, sigma & initial_value are scalars or arrays with one entry per factor. Paths are sampled
+    on the grid t = linspace(0, horizon, num_steps) as r(t+dt) = theta + (r(t) - theta) * exp(-kappa * dt) + shock,
+    with all shocks drawn up front (per factor, steps as dimensions of sampling_scheme) and the recursion applied
+    along time as a linear filter.
+    Returns the time grid (num_steps x 1) and the paths (factors x num_steps x num_simulations)."""
+    kappa, long_term_mean, sigma, initial_value = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(value, dtype=np.float64)) for value in (kappa, long_term_mean, sigma,
+                                                                          initial_value)))
+    rng = rng if rng is not None else np.random.default_rng(seed)
+
+    # Define the time-steps array & the (constant) distance between random variables in process
+    t = np.linspace(0, horizon, num_steps).reshape(num_steps, 1)
+    dt = horizon / (num_steps - 1) if num_steps > 1 else 0.0
+
+    # Exact transition: autoregressive coefficient & standard deviation of the shock per factor
+    decay = np.exp(-kappa * dt)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shock_variance = np.where(kappa != 0, -np.expm1(-2 * kappa * dt) / (2 * kappa), dt)
+    shock_std = sigma * np.sqrt(shock_variance)
+
+    r = np.empty((len(kappa), num_steps, num_simulations))
+    r[:, 0, :] = initial_value.reshape(-1, 1)
+
+    # Draw all shocks at once, then turn them into the inputs of r(n) = decay * r(n-1) + input(n)
+    shocks = np.empty((len(kappa), num_steps - 1, num_simulations))
+    for factor in range(len(kappa)):
+        draw_standard_normals(shocks[factor], sampling_scheme=sampling_scheme, rng=rng)
+    shocks *= shock_std.reshape(-1, 1, 1)
+    shocks += (long_term_mean * (1 - decay)).reshape(-1, 1, 1)
+
+    for factor in range(len(kappa)):
+        initial_state = np.full((1, num_simulations), decay[factor] * initial_value[factor])
+        r[factor, 1:, :], _ = signal.lfilter([1.0], [1.0, -decay[factor]], shocks[factor], axis=0,
+                                             zi=initial_state)
+
+    return t, r
 
 class VasicekModel:
     """Class Constructing & Simulating a Vasicek Stochastic Process."""
@@ -33,7 +77,7 @@ class VasicekModel:
 
         # Analytical solution complex; we will add cumulative dr
         for i in range(1, self.num_steps):
-            dr = (self.kappa * (self.long_term_mean - r[i, :]) * dt
+            dr = (self.kappa * (self.long_term_mean - r[i-1, :]) * dt
                   + self.sigma * np.sqrt(dt) * np.random.normal(loc=0, scale=1, size=(1, self.num_simulations)))
 
             r[i, :] = r[i-1, :] + dr
@@ -43,6 +87,17 @@ class VasicekModel:
 
         return t, r
 
+    def simulate_exact(self, seed: int = None):
+        """Performs Monte Carlo Simulation of Vasicek Model with the exact (vectorized) transition law."""
+        t, r = simulate_vasicek_paths(kappa=self.kappa, long_term_mean=self.long_term_mean, sigma=self.sigma,
+                                      initial_value=self.initial_value, horizon=self.horizon,
+                                      num_steps=self.num_steps, num_simulations=self.num_simulations, seed=seed)
+
+        if self.save_results:
+            pd.DataFrame(r[0]).to_csv(os.path.join(self.output_dir, "Vasicek_simulation_results.csv"))
+
+        return t, r[0]
+
 
 
 
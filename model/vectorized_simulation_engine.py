@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+from scipy import special as sp
+from model.random_streams import (MATERIALIZATION_STREAM, SEVERITY_STREAM, draw_group_uniforms, draw_risk_uniforms,
+                                  validate_rng_mode)
+
+SEVERITY_DISTRIBUTIONS = ("normal", "lognormal", "uniform")
+
+def lognormal_parameters(left_tail_impact, right_tail_impact):
+    """Derives lognormal mu & sigma from the lower & upper impact of a risk (90% interval of the distribution)."""
+    estimated_mean = (np.log(left_tail_impact) + np.log(right_tail_impact)) / 2
+    estimated_sigma = (np.log(right_tail_impact) - np.log(left_tail_impact)) / 3.29
+
+    return estimated_mean, estimated_sigma
+
+def distribution_group(distribution: str):
+    """Maps a register distribution label to the sampling branch used by the engines."""
+    if distribution.lower() in SEVERITY_DISTRIBUTIONS:
+        return distribution.lower()
+    if distribution == "Deterministic Trend":
+        return distribution
+
+    return "unknown"
+
+def transform_uniforms_to_severity(uniforms: np.ndarray, distribution: str, mean=0.0, std=1.0,
+                                   left_tail_impact=0.0, right_tail_impact=1.0, min_impact=0.0, max_impact=1.0,
+                                   out: np.ndarray = None, lognormal_mu=None, lognormal_sigma=None):
+    """Maps uniforms in (0, 1) to impact values through the inverse CDF of the selected distribution.
+
+    Parameters may be scalars or arrays broadcastable against the uniforms (e.g. one value per risk). Precomputed
+    lognormal_mu & lognormal_sigma replace the ones derived from the tails."""
+    if out is None:
+        out = np.empty(np.shape(uniforms), dtype=np.float64)
+
+    if distribution.lower() == "normal":
+        sp.ndtri(uniforms, out=out)
+        out *= std
+        out += mean
+
+    elif distribution.lower() == "lognormal":
+        estimated_mean, estimated_sigma = lognormal_parameters(left_tail_impact, right_tail_impact) \
+            if lognormal_mu is None else (lognormal_mu, lognormal_sigma)
+        sp.ndtri(uniforms, out=out)
+        out *= estimated_sigma
+        out += estimated_mean
+        np.exp(out, out=out)
+
+    elif distribution.lower() == "uniform":
+        np.multiply(uniforms, np.subtract(max_impact, min_impact), out=out)
+        out += min_impact
+
+    else:
+        raise ValueError(f"Distribution '{distribution}' cannot be sampled through its inverse CDF.")
+
+    return out
+
+def _draw_legacy_step(out: np.ndarray, step: int, scenarios: int, distribution: str, mean: float, std: float,
+                      left_tail_impact: float, right_tail_impact: float, min_impact: float, max_impact: float):
+    """Draws one step of impacts from the global (legacy) RNG, in the same order as sample_risk_impact."""
+    if distribution.lower() == "normal":
+        out[:] = np.random.normal(loc=mean, scale=std, size=scenarios)
+
+    elif distribution.lower() == "lognormal":
+        estimated_mean, estimated_sigma = lognormal_parameters(left_tail_impact, right_tail_impact)
+        out[:] = np.random.lognormal(mean=estimated_mean, sigma=estimated_sigma, size=scenarios)
+
+    elif distribution.lower() == "uniform":
+        out[:] = np.random.uniform(low=min_impact, high=max_impact, size=scenarios)
+
+    elif distribution == "Deterministic Trend":
+        out[:] = mean * step
+
+    else:
+        out[:] = np.nan
+
+def simulate_risk_group(distribution: str, risk_ids, likelihood, mean, std, min_impact, max_impact,
+                        steps: int, scenario_start: int, scenario_stop: int, seed: int = 110,
+                        independent_risk_sampling: bool = True, cap_impact_per_risk: bool = True,
+                        cap_value: float = 400000000.00, rng_mode: str = 'legacy', first_step: int = 0,
+                        uniform_sampler=None, stream_ranks=None, stream_scenarios: int = None, lognormal_mu=None,
+                        lognormal_sigma=None):
+    """Samples risks sharing a distribution into (risks x steps x scenarios) impact & materialization arrays.
+
+    Parameters are arrays with one entry per risk; min/max impacts double as the lognormal tails. Steps before
+    first_step are skipped (every step has its own seed / stream, so later steps do not depend on them).
+    uniform_sampler (see model.sampling_schemes.UniformSampler) replaces the plain Philox uniforms; lognormal_mu &
+    lognormal_sigma (precomputed per risk, see extract_register_parameters) spare deriving them from the tails.
+
+    rng_mode 'philox_grouped' draws each step & component of the whole group from one keyed stream, the risks
+    reading it at their stream_ranks (default: their order) over stream_scenarios scenarios (the scenarios of the
+    full run; required when drawing a chunk starting after scenario 0)."""
+    validate_rng_mode(rng_mode)
+    draw_uniforms = uniform_sampler.draw if uniform_sampler is not None else draw_risk_uniforms
+    number_of_risks = len(risk_ids)
+    scenarios = scenario_stop - scenario_start
+    group = distribution_group(distribution)
+
+    impacts = np.empty((number_of_risks, steps - first_step, scenarios), dtype=np.float64)
+    realizations = np.empty((number_of_risks, steps - first_step, scenarios), dtype=np.int8)
+
+    if rng_mode == 'philox_grouped':
+        if uniform_sampler is not None:
+            raise ValueError("Sampling schemes, replicates & copulas draw per risk streams and require "
+                             "rng_mode='philox'.")
+        if stream_scenarios is None and scenario_start != 0:
+            raise ValueError("Chunks of grouped streams require stream_scenarios, the scenarios of the full run.")
+
+        stream_ranks = np.arange(number_of_risks) if stream_ranks is None else stream_ranks
+        stream_scenarios = scenario_stop if stream_scenarios is None else stream_scenarios
+
+    if rng_mode == 'legacy':
+        if scenario_start != 0:
+            raise ValueError("Legacy seeding draws all scenarios of a step at once and cannot be chunked.")
+        if uniform_sampler is not None:
+            raise ValueError("Sampling schemes other than plain pseudo-random draws require rng_mode='philox'.")
+
+        for j, risk_id in enumerate(risk_ids):
+            for row, i in enumerate(range(first_step, steps)):
+                # Set a random seed to replicate identical results
+                np.random.seed(seed=seed + risk_id + i)
+
+                # Define whether risk materializes from a Bernoulli distribution with prob.of success = likelihood
+                realizations[j, row] = np.random.binomial(n=1, p=likelihood[j], size=scenarios)
+
+                _draw_legacy_step(impacts[j, row], step=i, scenarios=scenarios, distribution=distribution,
+                                  mean=mean[j], std=std[j], left_tail_impact=min_impact[j],
+                                  right_tail_impact=max_impact[j], min_impact=min_impact[j], max_impact=max_impact[j])
+
+    else:
+        # Materialization uniforms are staged in the impacts buffer before severities overwrite it
+        if rng_mode == 'philox_grouped':
+            draw_group_uniforms(seed, group, MATERIALIZATION_STREAM, steps, stream_ranks, scenario_start,
+                                scenario_stop, stream_scenarios, out=impacts, first_step=first_step)
+        else:
+            for j, risk_id in enumerate(risk_ids):
+                draw_uniforms(seed, risk_id, MATERIALIZATION_STREAM, steps, scenario_start, scenario_stop,
+                              out=impacts[j], first_step=first_step)
+        np.less(impacts, np.reshape(likelihood, (-1, 1, 1)), out=realizations)
+
+        if group in SEVERITY_DISTRIBUTIONS:
+            if rng_mode == 'philox_grouped':
+                draw_group_uniforms(seed, group, SEVERITY_STREAM, steps, stream_ranks, scenario_start,
+                                    scenario_stop, stream_scenarios, out=impacts, first_step=first_step)
+            else:
+                for j, risk_id in enumerate(risk_ids):
+                    draw_uniforms(seed, risk_id, SEVERITY_STREAM, steps, scenario_start, scenario_stop,
+                                  out=impacts[j], first_step=first_step)
+            transform_uniforms_to_severity(
+                impacts, distribution=group, mean=np.reshape(mean, (-1, 1, 1)), std=np.reshape(std, (-1, 1, 1)),
+                left_tail_impact=np.reshape(min_impact, (-1, 1, 1)),
+                right_tail_impact=np.reshape(max_impact, (-1, 1, 1)), min_impact=np.reshape(min_impact, (-1, 1, 1)),
+                max_impact=np.reshape(max_impact, (-1, 1, 1)), out=impacts,
+                lognormal_mu=np.reshape(lognormal_mu, (-1, 1, 1)) if lognormal_mu is not None else None,
+                lognormal_sigma=np.reshape(lognormal_sigma, (-1, 1, 1)) if lognormal_sigma is not None else None)
+
+        elif group == "Deterministic Trend":
+            impacts[:] = np.reshape(mean, (-1, 1, 1)) * np.arange(first_step, steps).reshape(1, -1, 1)
+
+        else:
+            impacts[:] = np.nan
+
+    # Deterministic trends are neither masked nor capped
+    if group in SEVERITY_DISTRIBUTIONS:
+        if independent_risk_sampling:
+            impacts *= realizations
+
+        # Cap impact value to the pre-defined maximum value (optional)
+        if cap_impact_per_risk:
+            np.minimum(impacts, cap_value, out=impacts)
+
+    return impacts, realizations
+
+def simulate_risk_impact_array(steps: int = 5, scenarios: int = 1000, distribution: str = 'Normal',
+                               mean: float = 0.0, std: float = 1.0,
+                               left_tail_impact: float = 0.0, right_tail_impact: float = 1.0,
+                               risk_likelihood: float = 0.05, min_impact: float = 0.0, max_impact: float = 1.0,
+                               cap_impact_per_risk: bool = True, cap_value: float = 400000000.00,
+                               seed: int = 110, independent_risk_sampling: bool = True, risk_id: int = 0,
+                               rng_mode: str = 'legacy', scenario_start: int = 0, uniform_sampler=None):
+    """Samples the impact of a certain risk into preallocated (steps x scenarios) arrays.
+
+    rng_mode 'legacy' re-seeds the global RNG with seed + risk_id + step (identical draws to sample_risk_impact),
+    while 'philox' reads keyed counter-based streams (see model.random_streams) through inverse-CDF transforms;
+    scenario_start then selects which chunk of scenarios is drawn. uniform_sampler selects a variance-reduction
+    scheme (see model.sampling_schemes)."""
+    # Lognormal tails travel in the min / max impact slots of the group sampler
+    if distribution.lower() == "lognormal":
+        min_impact, max_impact = left_tail_impact, right_tail_impact
+
+    impacts, realizations = simulate_risk_group(
+        distribution=distribution, risk_ids=[risk_id], likelihood=[risk_likelihood], mean=[mean], std=[std],
+        min_impact=[min_impact], max_impact=[max_impact], steps=steps, scenario_start=scenario_start,
+        scenario_stop=scenario_start + scenarios, seed=seed, independent_risk_sampling=independent_risk_sampling,
+        cap_impact_per_risk=cap_impact_per_risk, cap_value=cap_value, rng_mode=rng_mode,
+        uniform_sampler=uniform_sampler)
+
+    return impacts[0], realizations[0]
+
+def sample_risk_impact_vectorized(steps: int = 5, scenarios: int = 1000, distribution: str = 'Normal',
+                                  mean: float = 0.0, std: float = 1.0, mode: float = 0, median: float = 0,
+                                  left_tail_impact: float = 0.0, right_tail_impact: float = 1.0,
+                                  risk_likelihood: float = 0.05, min_impact: float = 0.0, max_impact: float = 1.0,
+                                  cap_impact_per_risk: bool = True, cap_value: float = 400000000.00,
+                                  seed: int = 110, independent_risk_sampling: bool = True, risk_id: int = 0,
+                                  rng_mode: str = 'legacy'):
+    """Drop-in replacement of sample_risk_impact returning the same DataFrames from a vectorized engine."""
+    impacts, realizations = simulate_risk_impact_array(
+        steps=steps, scenarios=scenarios, distribution=distribution, mean=mean, std=std,
+        left_tail_impact=left_tail_impact, right_tail_impact=right_tail_impact, risk_likelihood=risk_likelihood,
+        min_impact=min_impact, max_impact=max_impact, cap_impact_per_risk=cap_impact_per_risk, cap_value=cap_value,
+        seed=seed, independent_risk_sampling=independent_risk_sampling, risk_id=risk_id, rng_mode=rng_mode)
+
+    return pd.DataFrame(impacts, copy=False), pd.DataFrame(realizations, copy=False)
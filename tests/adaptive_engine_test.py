@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from main import QuantificationOptions, perform_risk_register_quantification
+from model.simple_simulation_engine import SamplingOptions
+from model.adaptive_simulation_engine import HorizonMetricEstimates, run_adaptive_horizon_simulation
+from model.risk_metrics import compute_tail_metrics
+from model.streaming_simulation_engine import stream_horizon_impacts
+
+
+def test_adaptive_run_stops_on_target_or_budget():
+    """Adaptive runs extend the fixed-run streams and stop once converged or out of scenarios."""
+    register_parameters = {
+        "risk": np.array([101, 102, 103]), "likelihood": np.array([0.1, 0.5, 0.3]),
+        "min_impact": np.array([1000.0, 200.0, 10.0]), "max_impact": np.array([50000.0, 5000.0, 20.0]),
+        "distribution": np.array(["Lognormal", "Uniform", "Normal"], dtype=object),
+        "mean": np.array([0.0, 0.0, 100.0]), "std": np.array([0.0, 0.0, 25.0])}
+    parameters = dict(register_parameters=register_parameters, num_steps=2, max_scenarios=50000, batch_size=4000,
+                      selected_seed=5, var_levels=(90, 99), es_levels=(95,), ci_batches=10)
+
+    totals, _, tail_metrics, half_widths, converged = run_adaptive_horizon_simulation(
+        target_relative_half_width=0.5, min_scenarios=8000, **parameters)
+    fixed_totals, _, _ = stream_horizon_impacts(register_parameters, num_steps=2, num_scenarios=len(totals),
+                                                selected_seed=5, keep_per_risk_horizon=False)
+
+    assert converged and len(totals) == 8000
+    assert np.array_equal(totals, fixed_totals)
+    assert half_widths["VaR"][99] <= 0.5 * tail_metrics["VaR"][99]
+
+    totals, _, _, _, converged = run_adaptive_horizon_simulation(target_relative_half_width=1e-6, **parameters)
+    assert not converged and len(totals) == 50000
+
+
+def test_horizon_metric_estimates_match_full_sort():
+    """Merged batches & the kept largest totals give the exact VaR & ES, also when a chunk adds no large totals."""
+    rng = np.random.default_rng(11)
+    chunks = [rng.lognormal(size=3000), np.zeros(5000), rng.lognormal(size=7000), rng.lognormal(size=2500)]
+    estimates = HorizonMetricEstimates(500, var_levels=(90, 99.9), es_levels=(95,), ci_batches=5)
+
+    for count, chunk in enumerate(chunks, start=1):
+        estimates.add(chunk)
+        exact = compute_tail_metrics(np.concatenate(chunks[:count]), var_levels=(90, 99.9), es_levels=(95,))
+        point_estimates = estimates.point_estimates()
+
+        assert point_estimates["VaR"] == exact["VaR"] and point_estimates["ES"] == exact["ES"]
+        assert np.isclose(point_estimates["Expected"], exact["Expected"])
+        assert 5 <= len(estimates.batches) < 10
+        assert all(len(batch) == estimates.batch_scenarios for batch in estimates.batches)
+
+    assert np.array_equal(estimates.totals(), np.concatenate(chunks))
+    assert estimates.half_widths()["VaR"][99.9] > 0
+
+
+def test_adaptive_run_converges_with_zero_metrics():
+    """Rare risks have a 90% VaR of 0 in every batch, which does not hold the run back."""
+    register_parameters = {
+        "risk": np.array([201, 202, 203]), "likelihood": np.array([0.01, 0.02, 0.015]),
+        "min_impact": np.array([1000.0, 200.0, 500.0]), "max_impact": np.array([50000.0, 5000.0, 2000.0]),
+        "distribution": np.array(["Lognormal", "Uniform", "Uniform"], dtype=object),
+        "mean": np.zeros(3), "std": np.zeros(3)}
+
+    totals, _, tail_metrics, half_widths, converged = run_adaptive_horizon_simulation(
+        register_parameters=register_parameters, num_steps=1, max_scenarios=200000, batch_size=10000,
+        min_scenarios=40000, selected_seed=3, var_levels=(90, 99), es_levels=(99,), ci_batches=10,
+        target_relative_half_width=0.2)
+
+    assert tail_metrics["VaR"][90] == 0 and half_widths["VaR"][90] == 0
+    assert converged and len(totals) < 200000
+
+
+def test_adaptive_run_rejects_unsupported_options(tmp_path):
+    """Options adaptive runs cannot honour raise instead of being ignored."""
+    with pytest.raises(ValueError, match="sampling.scheme"):
+        perform_risk_register_quantification(1000, 1, output_path_folder=str(tmp_path),
+                                             options=QuantificationOptions(adaptive=True),
+                                             sampling=SamplingOptions(rng_mode='philox', scheme='sobol'))
+    with pytest.raises(ValueError, match="rng_mode"):
+        perform_risk_register_quantification(1000, 1, output_path_folder=str(tmp_path),
+                                             options=QuantificationOptions(adaptive=True),
+                                             sampling=SamplingOptions(rng_mode='legacy'))
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from model.aggregate_loss_fft import aggregate_loss_distribution, aggregate_tail_metrics, perform_aggregate_loss_fft
+from model.risk_metrics import compute_tail_metrics
+from model.streaming_simulation_engine import stream_horizon_impacts
+
+
+def test_single_uniform_risk_is_exact_on_grid():
+    """A Bernoulli-uniform risk has closed form quantiles & expected impact, shifted by deterministic trends."""
+    register_parameters = {
+        "risk": np.array([1, 2]), "likelihood": np.array([0.5, 1.0]), "min_impact": np.array([0.0, 0.0]),
+        "max_impact": np.array([100.0, 0.0]), "distribution": np.array(["Uniform", "Deterministic Trend"]),
+        "mean": np.array([0.0, 3.0]), "std": np.array([0.0, 0.0])}
+
+    losses, probabilities = aggregate_loss_distribution(register_parameters, num_steps=3, grid_points=10000)
+    tail_metrics = aggregate_tail_metrics(losses, probabilities, var_levels=(75, 95), es_levels=(95,))
+
+    np.testing.assert_allclose(probabilities.sum(), 1.0)
+    np.testing.assert_allclose([tail_metrics["VaR"][75], tail_metrics["VaR"][95], tail_metrics["Expected"]],
+                               [50.0 + 6.0, 90.0 + 6.0, 25.0 + 6.0], rtol=1e-3)
+    np.testing.assert_allclose(tail_metrics["ES"][95], 95.0 + 6.0, rtol=1e-3)
+
+
+def test_tail_matches_monte_carlo():
+    """Capped lognormal, normal & uniform risks (one ID on two rows): FFT metrics agree with a large simulation."""
+    register_parameters = {
+        "risk": np.array([101, 102, 103, 101]), "likelihood": np.array([0.1, 0.5, 0.3, 0.1]),
+        "min_impact": np.array([1000.0, 200.0, 10.0, 1000.0]),
+        "max_impact": np.array([50000.0, 5000.0, 20.0, 50000.0]),
+        "distribution": np.array(["Lognormal", "Uniform", "Normal", "Lognormal"], dtype=object),
+        "mean": np.array([0.0, 0.0, 100.0, 0.0]), "std": np.array([0.0, 0.0, 25.0, 0.0])}
+
+    losses, probabilities = aggregate_loss_distribution(register_parameters, num_steps=2, max_cap=60000.0)
+    tail_metrics = aggregate_tail_metrics(losses, probabilities, var_levels=(95, 99), es_levels=(99,))
+
+    totals, _, _ = stream_horizon_impacts(register_parameters, num_steps=2, num_scenarios=400000, selected_seed=7,
+                                          max_cap=60000.0, rng_mode='philox', keep_per_risk_horizon=False)
+    simulated_metrics = compute_tail_metrics(totals, var_levels=(95, 99), es_levels=(99,))
+
+    np.testing.assert_allclose([tail_metrics["VaR"][95], tail_metrics["VaR"][99], tail_metrics["ES"][99],
+                                tail_metrics["Expected"]],
+                               [simulated_metrics["VaR"][95], simulated_metrics["VaR"][99],
+                                simulated_metrics["ES"][99], simulated_metrics["Expected"]], rtol=0.03)
+
+
+def test_degenerate_registers_are_point_masses():
+    """Registers without random impacts (trends only, or constant certain impacts) give a single loss."""
+    df_trends = pd.DataFrame({"Risk": [1, 2], "Converted Likelihood": [1.0, 1.0], "Converted Lower Impact": 0.0,
+                              "Converted Max Impact": 0.0, "Distribution": "Deterministic Trend", "Mean": [2.0, 5.0],
+                              "Std": 0.0, "Taxonomy Level I": "Financial"})
+    df_distribution, df_metrics = perform_aggregate_loss_fft(df_trends, num_steps=4, independent_sampling=True,
+                                                             interim_files_dir=None, save_interim_files=False)
+
+    assert df_distribution["Loss"].tolist() == [21.0] and df_distribution["Probability"].tolist() == [1.0]
+    assert df_metrics["Expected Impact"].iloc[0] == 21.0
+
+    constant_parameters = {
+        "risk": np.array([1]), "likelihood": np.array([1.0]), "min_impact": np.array([40.0]),
+        "max_impact": np.array([40.0]), "distribution": np.array(["Uniform"]), "mean": np.zeros(1),
+        "std": np.zeros(1)}
+    losses, probabilities = aggregate_loss_distribution(constant_parameters, num_steps=1)
+
+    assert losses.tolist() == [40.0] and probabilities.tolist() == [1.0]
@@ -0,0 +1,82 @@
+import json
+import time
+import threading
+import numpy as np
+import pytest
+from tools.background_writer import BackgroundOutputWriter
+from tools.output_writers import NpyOutputWriter
+
+
+class SlowNpyOutputWriter(NpyOutputWriter):
+    """Saves earlier risks more slowly, so that background threads finish them out of order."""
+    def save_risk_results(self, risk, impacts, realizations):
+        time.sleep(0.02 * (5 - int(risk)))
+        super().save_risk_results(risk, impacts, realizations)
+
+
+class FailingNpyOutputWriter(NpyOutputWriter):
+    """Fails to save risk 2."""
+    def save_risk_results(self, risk, impacts, realizations):
+        if risk == 2:
+            raise OSError("disk full")
+        super().save_risk_results(risk, impacts, realizations)
+
+
+class BlockingOutputWriter(NpyOutputWriter):
+    """Holds every save until released, counting the saves started."""
+    def __init__(self, output_dir):
+        super().__init__(output_dir)
+        self.release = threading.Event()
+        self.started = 0
+
+    def save_risk_results(self, risk, impacts, realizations):
+        self.started += 1
+        self.release.wait()
+
+
+def test_manifest_keeps_submission_order(tmp_path):
+    """Risks are recorded in the order they are submitted, whichever thread finishes first."""
+    output_writer = BackgroundOutputWriter(SlowNpyOutputWriter(str(tmp_path)), num_threads=4)
+    for risk in range(5):
+        output_writer.write_risk_results(risk, np.full((2, 10), float(risk)), np.ones((2, 10), dtype=np.int8))
+    output_writer.close()
+
+    with open(tmp_path / "interim_outputs.json") as manifest_file:
+        assert json.load(manifest_file)["risks"] == ["0", "1", "2", "3", "4"]
+    for risk in range(5):
+        assert np.array_equal(np.load(tmp_path / f"simulation_of_impacts_risk_{risk}.npy"), np.full((2, 10), risk))
+
+
+def test_failed_writes_raise_on_close(tmp_path):
+    """A failed write is raised by close (chained to the original error) and the run is not finalized."""
+    output_writer = BackgroundOutputWriter(FailingNpyOutputWriter(str(tmp_path)), num_threads=2)
+    for risk in range(4):
+        output_writer.write_risk_results(risk, np.zeros((2, 10)), np.zeros((2, 10), dtype=np.int8))
+
+    with pytest.raises(RuntimeError, match="1 background output write") as error_info:
+        output_writer.close()
+    assert isinstance(error_info.value.__cause__, OSError)
+    assert not (tmp_path / "interim_outputs.json").exists()
+
+
+def test_submissions_block_while_queue_is_full(tmp_path):
+    """With one busy thread & max_pending queued writes, the next submission waits for the writer."""
+    blocking_writer = BlockingOutputWriter(str(tmp_path))
+    output_writer = BackgroundOutputWriter(blocking_writer, num_threads=1, max_pending=2)
+
+    def submit():
+        for risk in range(4):
+            output_writer.write_risk_results(risk, np.zeros((2, 10)), np.zeros((2, 10), dtype=np.int8))
+
+    submitter = threading.Thread(target=submit)
+    submitter.start()
+    submitter.join(timeout=0.3)
+
+    # One write in progress, two queued & the fourth submission blocked
+    assert submitter.is_alive()
+    assert blocking_writer.started == 1 and output_writer.tasks.qsize() == 2
+
+    blocking_writer.release.set()
+    submitter.join(timeout=5)
+    output_writer.close()
+    assert not submitter.is_alive() and blocking_writer.started == 4
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic_registers import make_synthetic_register
+from model.batched_simulation_engine import extract_register_parameters, group_risks_by_distribution
+from model.simple_simulation_engine import ExecutionOptions, SamplingOptions, perform_simulation
+from model.vectorized_simulation_engine import simulate_risk_impact_array
+
+
+@pytest.mark.parametrize("rng_mode", ["legacy", "philox"])
+def test_batched_run_matches_per_risk_loop(rng_mode, tmp_path):
+    """Batched runs reproduce the per risk loop; duplicated risk IDs take the parameters of their first row."""
+    df_register = make_synthetic_register(12, distribution_mix={"Lognormal": 0.4, "Uniform": 0.2, "Normal": 0.2,
+                                                                "Deterministic Trend": 0.2}, seed=3)
+    df_duplicate = df_register.iloc[[0]].assign(**{"Converted Likelihood": 0.9, "Distribution": "Uniform"})
+    df_register = pd.concat([df_register, df_duplicate], ignore_index=True)
+
+    parameters = dict(num_steps=3, num_scenarios=700, independent_sampling=True, interim_files_dir=str(tmp_path),
+                      save_interim_files=False, selected_seed=9, sampling=SamplingOptions(rng_mode=rng_mode))
+    df_total_loop, dict_loop = perform_simulation(df_register, **parameters)
+    df_total_batched, dict_batched = perform_simulation(df_register, execution=ExecutionOptions(batched=True),
+                                                        **parameters)
+
+    assert np.array_equal(df_total_loop.to_numpy(), df_total_batched.to_numpy())
+    assert dict_loop.keys() == dict_batched.keys()
+    for risk in dict_loop:
+        assert np.array_equal(dict_loop[risk].to_numpy(), dict_batched[risk].to_numpy())
+
+    first_row = df_register.iloc[0]
+    expected_impacts, _ = simulate_risk_impact_array(
+        steps=3, scenarios=700, distribution=first_row["Distribution"], mean=first_row["Mean"], std=first_row["Std"],
+        risk_likelihood=first_row["Converted Likelihood"], left_tail_impact=first_row["Converted Lower Impact"],
+        right_tail_impact=first_row["Converted Max Impact"], min_impact=first_row["Converted Lower Impact"],
+        max_impact=first_row["Converted Max Impact"], seed=9, risk_id=first_row["Risk"], rng_mode=rng_mode)
+    assert np.array_equal(dict_batched[str(first_row["Risk"])].to_numpy(), expected_impacts)
+
+
+def test_duplicated_risks_are_grouped_by_their_first_row():
+    """The duplicate row is sampled with the distribution of the risk's first row."""
+    df_register = make_synthetic_register(4, distribution_mix={"Lognormal": 1.0})
+    df_register = pd.concat([df_register, df_register.iloc[[1]].assign(Distribution="Uniform")], ignore_index=True)
+
+    groups = group_risks_by_distribution(extract_register_parameters(df_register))
+
+    assert list(groups) == ["lognormal"] and groups["lognormal"].tolist() == [0, 1, 2, 3, 4]
@@ -0,0 +1,43 @@
+import numpy as np
+import json
+from benchmarks.run_benchmarks import SMOKE_BASELINE, _result_key, compare_to_baseline, run_benchmarks
+from benchmarks.synthetic_registers import make_synthetic_register
+from tools.register_reader import validate_risk_register
+
+
+def test_synthetic_register_is_valid():
+    """Synthetic registers pass the register validation with the requested distribution mix."""
+    df_register = validate_risk_register(make_synthetic_register(200, distribution_mix={"Lognormal": 0.5,
+                                                                                        "Uniform": 0.5}, seed=3))
+
+    assert len(df_register) == 200 and set(df_register["Distribution"]) == {"Lognormal", "Uniform"}
+    assert np.all((df_register["Converted Likelihood"] >= 0.01) & (df_register["Converted Likelihood"] <= 0.5))
+
+
+def test_regressions_against_baseline():
+    """Slower or more memory hungry benchmarks beyond the tolerances are reported, largest slowdown first."""
+    results = run_benchmarks("smoke", repeats=1, selected=("gbm", "vasicek"))
+    baseline = {**results, "results": [{**result, "seconds": result["seconds"] / 2} for result in results["results"]]}
+
+    regressions = compare_to_baseline(results, baseline, time_tolerance=0.5)
+
+    assert sorted(regression["benchmark"] for regression in regressions) == ["gbm", "vasicek"]
+    assert regressions[0]["ratio"] >= regressions[1]["ratio"]
+    assert all(regression["metric"] == "seconds" for regression in regressions)
+    assert compare_to_baseline(results, results) == []
+
+
+def test_register_loading_and_reporting_are_benchmarked():
+    """Register loading (with & without cache) & reporting run on the smoke grid and match the stored baseline.
+
+    Timings depend on the machine, so only the benchmark keys are checked against the baseline."""
+    results = run_benchmarks("smoke", repeats=1, selected=("load_register", "reporting"))
+
+    assert {(result["benchmark"], tuple(result["parameters"].values())[-1]) for result in results["results"]} == {
+        ("load_register", False), ("load_register", True), ("reporting", "summaries"), ("reporting", "plots")}
+    with open(SMOKE_BASELINE) as file:
+        baseline = json.load(file)
+
+    baseline_keys = {_result_key(result) for result in baseline["results"] if "skipped" not in result}
+    assert {_result_key(result) for result in results["results"]} <= baseline_keys
+    assert compare_to_baseline(results, baseline, time_tolerance=np.inf, memory_tolerance=np.inf) == []
@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import special as sp
+from model.copula import CopulaSampler, cached_cholesky
+
+
+@pytest.mark.parametrize("family", ["gaussian", "t"])
+def test_taxonomy_copula_correlations(family):
+    """Latent normals are correlated as set in the taxonomy matrix (within & across taxonomies)."""
+    taxonomies = ["Operational", "Operational", "Financial", "Financial", "Other"]
+    df_correlations = pd.DataFrame([[0.6, 0.2], [0.2, 0.4]], index=["Operational", "Financial"],
+                                   columns=["Operational", "Financial"])
+    sampler = CopulaSampler.from_taxonomy_correlations([11, 12, 21, 22, 31], taxonomies, df_correlations,
+                                                       family=family)
+
+    uniforms = np.vstack([sampler.draw(5, risk, 0, steps=1, scenario_start=0, scenario_stop=100000)
+                          for risk in [11, 12, 21, 22, 31]])
+    correlation = np.corrcoef(sp.ndtri(uniforms))
+
+    np.testing.assert_allclose([correlation[0, 1], correlation[2, 3], correlation[0, 2], correlation[0, 4]],
+                               [0.6, 0.4, 0.2, 0.0], atol=0.02)
+    assert uniforms.min() > 0.0 and uniforms.max() < 1.0
+
+
+def test_copula_uniforms_do_not_depend_on_chunking():
+    """Uniforms of a risk are identical whether all scenarios are drawn at once or in chunks."""
+    df_correlations = pd.DataFrame([[1.0, 0.5], [0.5, 1.0]], index=["1", "2"], columns=["1", "2"])
+
+    full = CopulaSampler.from_risk_correlations([1, 2], df_correlations, family="t").draw(7, 2, 1, 3, 0, 1000)
+    sampler = CopulaSampler.from_risk_correlations([1, 2], df_correlations, family="t")
+    chunked = np.hstack([sampler.draw(7, 2, 1, 3, start, stop) for start, stop in [(0, 333), (333, 1000)]])
+
+    assert np.array_equal(full, chunked)
+
+
+@pytest.mark.parametrize("structure", ["taxonomy", "risk"])
+def test_copula_caches_are_released(structure):
+    """Factor models only cache common factors; Cholesky uniforms are dropped once every risk has read them."""
+    df_correlations = pd.DataFrame([[0.5, 0.1], [0.1, 0.3]], index=["1", "2"], columns=["1", "2"])
+    if structure == "taxonomy":
+        sampler = CopulaSampler.from_taxonomy_correlations([1, 2, 3], ["1", "1", "2"], df_correlations)
+    else:
+        sampler = CopulaSampler.from_risk_correlations([1, 2, 3], df_correlations)
+
+    for risk in [1, 2, 3]:
+        for component in [0, 1]:
+            sampler.draw(5, risk, component, steps=3, scenario_start=0, scenario_stop=1000)
+
+    assert sampler._cache == {}
+    assert all(factors is None or factors.shape == (2, 1000) for factors, _ in sampler._common_cache.values())
+
+
+def test_copula_caches_are_released_after_partial_reads():
+    """clear_cache() frees the uniforms of rows a task never reads; shared uniforms replace the computation."""
+    df_correlations = pd.DataFrame([[1.0, 0.5], [0.5, 1.0]], index=["1", "2"], columns=["1", "2"])
+    sampler = CopulaSampler.from_risk_correlations([1, 2], df_correlations)
+
+    uniforms = sampler.draw(5, 1, 0, steps=2, scenario_start=0, scenario_stop=100)
+    assert len(sampler._cache) == 2
+    sampler.clear_cache()
+    assert sampler._cache == {}
+
+    shared_uniforms = sampler.draw_all_uniforms(5, steps=2, scenario_start=0, scenario_stop=100)
+    assert np.array_equal(shared_uniforms[0, :, 0], uniforms)
+    sampler.use_uniforms(shared_uniforms, 5, 0, 100)
+    assert np.array_equal(sampler.draw(5, 2, 1, steps=2, scenario_start=0, scenario_stop=100),
+                          shared_uniforms[1, :, 1])
+    assert sampler._cache == {}
+
+
+def test_cholesky_factor_is_cached(tmp_path):
+    """Factors are stored by content hash & reused; matrices that are not positive definite are repaired."""
+    correlation = np.array([[1.0, 0.9, 0.9], [0.9, 1.0, -0.9], [0.9, -0.9, 1.0]])
+
+    cholesky_factor = cached_cholesky(correlation, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    np.testing.assert_allclose(np.diag(cholesky_factor @ cholesky_factor.T), 1.0)
+    assert np.array_equal(cached_cholesky(correlation, cache_dir=str(tmp_path)), cholesky_factor)
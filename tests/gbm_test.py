@@ -0,0 +1,23 @@
+import numpy as np
+from model.gbm import simulate_gbm_paths, simulate_gbm_horizon
+
+def test_in_place_gbm_paths_match_closed_form():
+    mu, sigma, initial_value = np.array([0.05, 0.1]), np.array([0.2, 0.3]), np.array([100.0, 50.0])
+    horizon, num_steps, num_simulations = 2.0, 9, 1000
+    out = np.empty((2, num_steps, num_simulations), dtype=np.float32)
+
+    t, paths = simulate_gbm_paths(mu, sigma, initial_value, horizon, num_steps, num_simulations, out=out, seed=5)
+    assert paths is out
+    np.testing.assert_allclose(paths[:, 0], np.repeat(initial_value[:, None], num_simulations, axis=1))
+
+    shocks = np.random.default_rng(5).standard_normal((2, num_steps - 1, num_simulations), dtype=np.float32)
+    brownian = np.cumsum(shocks, axis=1) * np.sqrt(horizon / (num_steps - 1))
+    expected = initial_value[:, None, None] * np.exp((mu - 0.5 * sigma**2)[:, None, None] * t[None, 1:] +
+                                                     sigma[:, None, None] * brownian)
+    np.testing.assert_allclose(paths[:, 1:], expected, rtol=1e-4)
+
+def test_horizon_draws_follow_lognormal_law():
+    horizon_values = simulate_gbm_horizon(0.05, 0.2, 100.0, 1.0, 200000, seed=1)
+    assert horizon_values.shape == (1, 200000)
+    np.testing.assert_allclose(np.log(horizon_values).mean(), np.log(100.0) + 0.05 - 0.02, atol=2e-3)
+    np.testing.assert_allclose(np.log(horizon_values).std(), 0.2, atol=2e-3)
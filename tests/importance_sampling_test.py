@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from model.simple_simulation_engine import ExecutionOptions, SamplingOptions, perform_simulation
+from model.streaming_simulation_engine import perform_streaming_simulation
+
+
+def rare_risk_register():
+    """Register in the 'RR Lite' schema with two rare risks and a frequent one."""
+    return pd.DataFrame({
+        "Risk": [201, 202, 203], "Taxonomy Level I": ["Operational", "Financial", "Financial"],
+        "Converted Likelihood": [0.002, 0.005, 0.3], "Converted Lower Impact": [0, 0, 10],
+        "Converted Max Impact": [0, 0, 20], "Distribution": ["Normal", "Normal", "Uniform"],
+        "Mean": [100000, 50000, 0], "Std": [10000, 5000, 0], "Risk Title": ["A", "B", "C"]})
+
+
+def test_likelihood_ratio_weights_are_unbiased():
+    """Reweighted scenarios reproduce the register's expected impact & tail probability."""
+    parameters = dict(df_lite_rr=rare_risk_register(), num_steps=2, num_scenarios=40000, independent_sampling=True,
+                      interim_files_dir="", save_interim_files=False, selected_seed=3, cap_apply=False)
+    sampling = SamplingOptions(rng_mode='philox', importance_likelihood=0.1, importance_severity_shift=1.0)
+
+    df_total, _, _, scenario_weights = perform_simulation(**parameters, sampling=sampling, full_results=True)
+    horizon_total, horizon_weights = df_total.iloc[-1, :].to_numpy(), scenario_weights[-1]
+
+    expected_impact = 0.002 * 100000 + 0.005 * 50000 + 0.3 * 15
+    assert abs(np.mean(horizon_weights) - 1) < 0.05
+    assert abs(np.mean(horizon_total * horizon_weights) / expected_impact - 1) < 0.05
+    assert abs(np.mean((horizon_total > 75000) * horizon_weights) / 0.002 - 1) < 0.1
+
+    # Streaming & full-path runs draw & weight the horizon identically
+    _, _, df_metrics = perform_streaming_simulation(**parameters, rng_mode='philox', importance_likelihood=0.1,
+                                                    importance_severity_shift=1.0, chunk_size=7000)
+    weighted_mean = np.sum(horizon_total * horizon_weights) / np.sum(horizon_weights)
+    np.testing.assert_allclose(df_metrics.loc["Horizon", "Expected Impact"], weighted_mean, rtol=1e-12)
+
+
+def test_unmasked_impacts_get_no_bernoulli_weight():
+    """Deterministic trends & runs without Bernoulli masking keep unit weights (materializations don't matter)."""
+    df_register = rare_risk_register()
+    df_register.loc[2, ["Distribution", "Mean", "Converted Likelihood"]] = ["Deterministic Trend", 10.0, 0.01]
+    parameters = dict(df_lite_rr=df_register, num_steps=2, num_scenarios=5000, interim_files_dir="",
+                      save_interim_files=False, selected_seed=3, full_results=True)
+    sampling = SamplingOptions(rng_mode='philox', importance_likelihood=0.1)
+
+    for batched in (False, True):
+        results = perform_simulation(**parameters, independent_sampling=False, sampling=sampling,
+                                     execution=ExecutionOptions(batched=batched))
+        assert np.array_equal(results.scenario_weights, np.ones((2, 5000)))
+
+    results = perform_simulation(**parameters, independent_sampling=True,
+                                 sampling=sampling._replace(importance_risks=[203]))
+    assert np.array_equal(results.scenario_weights, np.ones((2, 5000)))
+
+
+def test_weights_are_returned_on_request_only():
+    """Runs keep the (total, per risk) outputs; importance sampling asks for the full results with its weights."""
+    parameters = dict(df_lite_rr=rare_risk_register(), num_steps=1, num_scenarios=100, independent_sampling=True,
+                      interim_files_dir="", save_interim_files=False, selected_seed=3)
+
+    df_total, dict_impacts = perform_simulation(**parameters)
+    assert df_total.shape == (1, 100) and len(dict_impacts) == 3
+    with pytest.raises(ValueError, match="full_results"):
+        perform_simulation(**parameters, sampling=SamplingOptions(rng_mode='philox', importance_likelihood=0.1))
@@ -0,0 +1,51 @@
+import os
+import json
+import shutil
+from main import QuantificationOptions, perform_risk_register_quantification
+from model.simple_simulation_engine import ExecutionOptions
+from tools.instrumentation import MANIFEST_FILE_NAME
+from tools.register_reader import REGISTER_CACHE_DIR
+
+REGISTER_DIR = os.path.join(os.path.dirname(__file__), "inputs", "scenario_testing", "bernoulli_sampling_case")
+
+
+def test_run_manifest_and_callbacks(tmp_path):
+    """An instrumented run saves a manifest of its stages & risks next to the outputs and reports each of them."""
+    shutil.copy(os.path.join(REGISTER_DIR, "risk register lite.xlsx"), tmp_path)
+    events = []
+
+    perform_risk_register_quantification(
+        number_of_scenarios=500, number_of_steps=2, risk_register_lite_path=str(tmp_path),
+        output_path_folder=str(tmp_path / "outputs"), save_interim_outputs=True,
+        options=QuantificationOptions(instrumentation_callbacks=[events.append]),
+        execution=ExecutionOptions(output_format='npy'))
+
+    # The outputs folder holds the run's timestamped folder & the register cache
+    output_dir, = [name for name in os.listdir(tmp_path / "outputs") if name != REGISTER_CACHE_DIR]
+    with open(tmp_path / "outputs" / output_dir / MANIFEST_FILE_NAME) as file:
+        manifest = json.load(file)
+
+    assert [stage["stage"] for stage in manifest["stages"]] == ["load_register", "simulation", "statistics"]
+    assert manifest["stages"][1]["bytes_written"] > 0 and manifest["stages"][1]["scenarios_per_second"] > 0
+    assert len(manifest["risks"]) == len([event for event in events if event["event"] == "risk"]) > 0
+    assert [event["stage"] for event in events if event["event"] == "stage"] == ["load_register", "simulation",
+                                                                                 "statistics"]
+
+
+def test_batched_and_parallel_runs_record_groups(tmp_path):
+    """Batched runs time every distribution group & parallel runs every worker task, covering all risks."""
+    shutil.copy(os.path.join(REGISTER_DIR, "risk register lite.xlsx"), tmp_path)
+
+    recorded_risks = []
+    for execution, workers in ((ExecutionOptions(batched=True), 1), (ExecutionOptions(), 2)):
+        events = []
+        perform_risk_register_quantification(
+            number_of_scenarios=200, number_of_steps=2, risk_register_lite_path=str(tmp_path),
+            output_path_folder=str(tmp_path / "outputs"), save_interim_outputs=False, workers=workers,
+            options=QuantificationOptions(instrumentation_callbacks=[events.append]), execution=execution)
+
+        groups = [event for event in events if event["event"] == "group"]
+        recorded_risks.append(sorted(risk for group in groups for risk in group["risks"]))
+        assert len(groups) > 1 and not [event for event in events if event["event"] == "risk"]
+
+    assert recorded_risks[0] == recorded_risks[1] and len(recorded_risks[0]) > len(groups)
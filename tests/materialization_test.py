@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from model.materialization import UNPACK_CHUNK_SCENARIOS, MaterializationMap, pack_materialization_map, \
+    unpack_materialization_map
+
+# More than two unpacking chunks & a final partial byte
+NUM_SCENARIOS = 2 * UNPACK_CHUNK_SCENARIOS + 1003
+
+
+@pytest.fixture(scope="module")
+def realizations():
+    rng = np.random.default_rng(3)
+    likelihoods = np.array([0.02, 0.3, 0.5, 0.9, 0.0]).reshape(-1, 1, 1)
+
+    return (rng.random((5, 3, NUM_SCENARIOS)) < likelihoods).astype(np.int8)
+
+
+def test_packed_bits_round_trip(realizations):
+    """Packing stores one bit per scenario and unpacking restores the dense map."""
+    packed = pack_materialization_map(realizations)
+
+    assert packed.shape == (5, 3, (NUM_SCENARIOS + 7) // 8) and packed.dtype == np.uint8
+    assert np.array_equal(unpack_materialization_map(packed, NUM_SCENARIOS), realizations)
+
+    materialization_map = MaterializationMap(range(5), 3, NUM_SCENARIOS)
+    for position in range(5):
+        materialization_map.set_risk(position, realizations[position])
+    assert np.array_equal(materialization_map.risk_realizations(3), realizations[3])
+    assert np.array_equal(materialization_map.event_indices(1, step=0), np.flatnonzero(realizations[1, 0]))
+
+
+@pytest.mark.parametrize("step", [-1, 0, None])
+def test_statistics_match_dense_reference(realizations, step):
+    """Popcount frequencies & chunked float32 co-occurrences equal the counts of the dense boolean map."""
+    materialization_map = MaterializationMap.from_realizations(range(5), realizations)
+    dense = realizations.astype(bool)
+    dense = dense.transpose(1, 0, 2) if step is None else dense[:, step][np.newaxis]
+
+    event_counts = dense.sum(axis=(0, 2))
+    assert np.array_equal(materialization_map.event_counts(step), event_counts)
+    np.testing.assert_allclose(materialization_map.observed_frequency(step).to_numpy(),
+                               event_counts / (NUM_SCENARIOS * len(dense)), rtol=1e-15)
+
+    expected_co_occurrence = sum(np.einsum("is,js->ij", steps_dense.astype(np.int64), steps_dense.astype(np.int64))
+                                 for steps_dense in dense)
+    assert np.array_equal(materialization_map.co_occurrence(step).to_numpy(), expected_co_occurrence)
+
+    per_scenario = dense.sum(axis=(0, 1))
+    assert np.array_equal(materialization_map.materializations_per_scenario(step), per_scenario)
+    np.testing.assert_allclose(materialization_map.materialization_count_distribution(step).to_numpy(),
+                               np.bincount(per_scenario) / NUM_SCENARIOS, rtol=1e-15)
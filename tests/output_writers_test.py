@@ -0,0 +1,100 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic_registers import make_synthetic_register
+from model.materialization import unpack_materialization_map
+from model.simple_simulation_engine import ExecutionOptions, SamplingOptions, perform_simulation
+from tools.output_writers import SUMMARY_TABLE_MAX_CELLS, create_output_writer
+
+# Risks with positive lower impacts, so that materializations are exactly the non-zero impacts
+REGISTER = make_synthetic_register(5, distribution_mix={"Lognormal": 0.5, "Uniform": 0.5}, seed=4)
+
+
+def simulate_run(output_format: str, output_dir):
+    """Runs a small simulation writing its interim outputs in output_format & returns the in-memory results."""
+    return perform_simulation(REGISTER, num_steps=3, num_scenarios=1001, independent_sampling=True,
+                              interim_files_dir=str(output_dir), save_interim_files=True,
+                              sampling=SamplingOptions(rng_mode='philox'),
+                              execution=ExecutionOptions(batched=True, output_format=output_format))
+
+
+def test_npy_outputs_round_trip(tmp_path):
+    """Arrays read back from .npy files (and unpacked materializations) equal the in-memory results."""
+    df_total_impacts, dict_risk_impacts = simulate_run("npy", tmp_path)
+
+    with open(tmp_path / "interim_outputs.json") as manifest_file:
+        manifest = json.load(manifest_file)
+    assert manifest == {"format": "npy", "risks": [str(risk) for risk in REGISTER["Risk"]], "steps": 3,
+                        "scenarios": 1001}
+
+    for risk in manifest["risks"]:
+        impacts = np.load(tmp_path / f"simulation_of_impacts_risk_{risk}.npy", mmap_mode='r')
+        realizations = unpack_materialization_map(np.load(tmp_path / f"materialization_risk_{risk}.npy"),
+                                                  manifest["scenarios"])
+        assert np.array_equal(impacts, dict_risk_impacts[risk].to_numpy())
+        assert np.array_equal(realizations, impacts != 0)
+
+    assert np.array_equal(np.load(tmp_path / "Total Simulated Impacts.npy"), df_total_impacts.to_numpy())
+
+
+def test_parquet_outputs_round_trip(tmp_path):
+    """Long-format impacts, packed materializations & wide totals read back from Parquet equal the results."""
+    pytest.importorskip("pyarrow")
+    df_total_impacts, dict_risk_impacts = simulate_run("parquet", tmp_path)
+
+    df_impacts = pd.read_parquet(tmp_path / "simulation_of_impacts")
+    df_materialization = pd.read_parquet(tmp_path / "materialization")
+    for risk, df_expected in dict_risk_impacts.items():
+        df_risk = df_impacts[df_impacts["risk"].astype(str) == risk].sort_values(["step", "scenario"])
+        impacts = df_risk["impact"].to_numpy().reshape(3, 1001)
+        assert np.array_equal(impacts, df_expected.to_numpy())
+
+        df_risk_materialization = df_materialization[df_materialization["risk"].astype(str) == risk]
+        packed = np.stack([np.frombuffer(value, dtype=np.uint8)
+                           for value in df_risk_materialization.sort_values("step")["packed_materialization"]])
+        assert np.array_equal(unpack_materialization_map(packed, 1001), impacts != 0)
+
+    df_total = pd.read_parquet(tmp_path / "Total Simulated Impacts.parquet")
+    assert list(df_total.columns) == ["0", "1", "2"]
+    assert np.array_equal(df_total.to_numpy().T, df_total_impacts.to_numpy())
+
+
+@pytest.mark.parametrize("output_format", ["npy", "parquet"])
+def test_large_tables_round_trip(output_format, tmp_path):
+    """Tables above SUMMARY_TABLE_MAX_CELLS keep their values (and labels) in the binary format."""
+    if output_format == "parquet":
+        pytest.importorskip("pyarrow")
+    rows = SUMMARY_TABLE_MAX_CELLS // 2 + 1
+    df_table = pd.DataFrame({"Risk Title": [f"Risk {row}" for row in range(rows)],
+                             "Horizon": np.linspace(0.0, 1.0, rows), "Likelihood": np.arange(rows) / rows})
+
+    output_writer = create_output_writer(output_format, str(tmp_path))
+    output_writer.write_table("Horizon Results", df_table)
+    output_writer.close()
+
+    if output_format == "npy":
+        assert np.array_equal(np.load(tmp_path / "Horizon Results.npy"), df_table[["Horizon", "Likelihood"]])
+        df_labels = pd.read_csv(tmp_path / "Horizon Results labels.csv", index_col=0)
+        assert df_labels["Risk Title"].equals(df_table["Risk Title"])
+        assert not os.path.exists(tmp_path / "interim_outputs.json")
+    else:
+        pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "Horizon Results.parquet"), df_table)
+
+
+def test_unknown_output_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown output_format 'csv'"):
+        create_output_writer("csv", str(tmp_path))
+
+
+def test_wide_excel_outputs_fail_before_simulating(tmp_path):
+    """Excel outputs of more scenarios than a sheet has columns are rejected up front; the default format is npy."""
+    with pytest.raises(ValueError, match="output_format='npy'"):
+        perform_simulation(None, num_steps=1, num_scenarios=20000, independent_sampling=True,
+                           interim_files_dir=str(tmp_path), execution=ExecutionOptions(output_format="excel"))
+    assert not os.listdir(tmp_path)
+
+    perform_simulation(REGISTER, num_steps=1, num_scenarios=20000, independent_sampling=True,
+                       interim_files_dir=str(tmp_path))
+    assert os.path.exists(tmp_path / "Total Simulated Impacts.npy")
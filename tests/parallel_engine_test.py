@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+import model.parallel_simulation_engine as parallel_simulation_engine
+from model.batched_simulation_engine import simulate_register_batched
+from model.copula import create_copula_sampler
+from model.parallel_simulation_engine import simulate_register_parallel
+from model.simple_simulation_engine import ExecutionOptions, SamplingOptions, perform_simulation
+from benchmarks.synthetic_registers import make_synthetic_register
+
+REGISTER_PARAMETERS = {
+    "risk": np.array([101, 102, 103, 104, 105]), "likelihood": np.array([0.1, 0.5, 0.3, 0.2, 0.9]),
+    "min_impact": np.array([1000.0, 200.0, 10.0, 500.0, 0.0]),
+    "max_impact": np.array([50000.0, 5000.0, 20.0, 8000.0, 0.0]),
+    "distribution": np.array(["Lognormal", "Uniform", "Normal", "Lognormal", "Normal"], dtype=object),
+    "mean": np.array([0.0, 0.0, 100.0, 0.0, 40.0]), "std": np.array([0.0, 0.0, 25.0, 0.0, 10.0])}
+
+
+def test_parallel_run_matches_serial_philox_run(monkeypatch):
+    """Workers reproduce the serial Philox tensors whatever the partitioning of the risks into tasks."""
+    serial_impacts, serial_realizations = simulate_register_batched(REGISTER_PARAMETERS, num_steps=3,
+                                                                    num_scenarios=2000, selected_seed=7)
+
+    for workers, tasks_per_worker in ((2, 4), (2, 1), (3, 2)):
+        monkeypatch.setattr(parallel_simulation_engine, "TASKS_PER_WORKER", tasks_per_worker)
+        impacts, realizations, total_impacts = simulate_register_parallel(
+            REGISTER_PARAMETERS, num_steps=3, num_scenarios=2000, workers=workers, selected_seed=7,
+            rng_mode='philox')
+
+        assert np.array_equal(impacts, serial_impacts)
+        assert np.array_equal(realizations, serial_realizations)
+        assert np.array_equal(total_impacts, np.add.reduce(serial_impacts, axis=0))
+
+    # Results are views on the shared blocks rather than copies
+    assert isinstance(impacts.base, parallel_simulation_engine.SharedBlock)
+
+
+def test_parallel_run_matches_batched_grouped_run(monkeypatch):
+    """Partitions keep the ranks of their risks in the group streams of the full register."""
+    serial_impacts, _ = simulate_register_batched(REGISTER_PARAMETERS, num_steps=3, num_scenarios=2000,
+                                                  selected_seed=7, rng_mode='philox_grouped')
+
+    for workers, tasks_per_worker in ((2, 4), (3, 1)):
+        monkeypatch.setattr(parallel_simulation_engine, "TASKS_PER_WORKER", tasks_per_worker)
+        impacts, _, _ = simulate_register_parallel(REGISTER_PARAMETERS, num_steps=3, num_scenarios=2000,
+                                                   workers=workers, selected_seed=7, rng_mode='philox_grouped')
+
+        assert np.array_equal(impacts, serial_impacts)
+
+
+@pytest.mark.parametrize("structure", ["taxonomy", "risk"])
+def test_parallel_copula_run_matches_batched_run(structure, monkeypatch):
+    """Copula uniforms drawn once in the parent & shared with the workers give the batched engine's tensors."""
+    df_correlations = pd.DataFrame([[0.5, 0.2], [0.2, 0.4]], index=["A", "B"], columns=["A", "B"])
+    if structure == "risk":
+        df_correlations = pd.DataFrame(np.full((5, 5), 0.3) + 0.7 * np.eye(5), index=REGISTER_PARAMETERS["risk"],
+                                       columns=REGISTER_PARAMETERS["risk"])
+    register_parameters = {**REGISTER_PARAMETERS, "taxonomy": np.array(["A", "A", "B", "B", "C"], dtype=object)}
+    sampler = create_copula_sampler("t", register_parameters, df_correlations, copula_structure=structure)
+
+    serial_impacts, _ = simulate_register_batched(register_parameters, num_steps=2, num_scenarios=1000,
+                                                  selected_seed=7, uniform_sampler=sampler)
+    assert sampler._cache == {}
+
+    monkeypatch.setattr(parallel_simulation_engine, "TASKS_PER_WORKER", 2)
+    impacts, _, _ = simulate_register_parallel(register_parameters, num_steps=2, num_scenarios=1000, workers=2,
+                                               selected_seed=7, rng_mode='philox', uniform_sampler=sampler)
+
+    assert np.array_equal(impacts, serial_impacts)
+
+
+def test_perform_simulation_workers_keyword():
+    """perform_simulation(workers=...) spreads the register over processes with the batched engine's results."""
+    parameters = dict(df_lite_rr=make_synthetic_register(7, seed=4), num_steps=2, num_scenarios=500,
+                      independent_sampling=True, interim_files_dir="", save_interim_files=False,
+                      sampling=SamplingOptions(rng_mode='philox'))
+
+    df_total, dict_impacts = perform_simulation(**parameters, workers=2)
+    df_batched_total, dict_batched_impacts = perform_simulation(**parameters,
+                                                                execution=ExecutionOptions(batched=True))
+
+    assert np.array_equal(df_total.to_numpy(), df_batched_total.to_numpy())
+    assert all(dict_impacts[risk].equals(dict_batched_impacts[risk]) for risk in dict_batched_impacts)
@@ -0,0 +1,56 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from model.vectorized_simulation_engine import lognormal_parameters
+from tools.register_reader import REGISTER_CACHE_DIR, load_risk_register, load_risk_register_parameters, \
+    read_risk_register_lite, validate_risk_register
+
+REGISTER_DIR = os.path.join(os.path.dirname(__file__), "inputs", "scenario_testing", "bernoulli_sampling_case")
+
+
+def test_parsed_register_is_cached_in_cache_dir(tmp_path):
+    """The first load writes the cache; later loads (also after touching the workbook) read it back."""
+    shutil.copy(os.path.join(REGISTER_DIR, "risk register lite.xlsx"), tmp_path)
+    cache_dir = str(tmp_path / "outputs" / REGISTER_CACHE_DIR)
+
+    df_register = load_risk_register(register_dir=str(tmp_path), cache_dir=cache_dir)
+    [cache_file_name] = os.listdir(cache_dir)
+    assert cache_file_name.startswith("risk register lite.xlsx.RR Lite.") and cache_file_name.endswith(".pkl")
+    assert sorted(os.listdir(tmp_path)) == ["outputs", "risk register lite.xlsx"]
+
+    os.utime(tmp_path / "risk register lite.xlsx")
+    assert load_risk_register(register_dir=str(tmp_path), cache_dir=cache_dir).equals(df_register)
+    assert df_register.equals(validate_risk_register(read_risk_register_lite(register_dir=str(tmp_path))))
+
+
+def test_invalid_rows_fail_fast():
+    """Every invalid row is reported with its workbook row number."""
+    df_register = read_risk_register_lite(register_dir=REGISTER_DIR)
+    df_register.loc[2, "Converted Likelihood"] = 1.5
+    df_register.loc[5, "Distribution"] = "Gamma"
+
+    with pytest.raises(ValueError, match="row 4: likelihood outside.*row 7: unknown distribution"):
+        validate_risk_register(df_register)
+
+
+def test_registers_of_other_folders_are_cached_apart(tmp_path):
+    """Workbooks of the same name in two folders keep their own cached register & parameter table."""
+    cache_dir = str(tmp_path / REGISTER_CACHE_DIR)
+    for folder in ("first", "second"):
+        os.makedirs(tmp_path / folder)
+        shutil.copy(os.path.join(REGISTER_DIR, "risk register lite.xlsx"), tmp_path / folder)
+
+    df_register, register_parameters = load_risk_register_parameters(register_dir=str(tmp_path / "first"),
+                                                                     cache_dir=cache_dir)
+    load_risk_register(register_dir=str(tmp_path / "second"), cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+
+    _, cached_parameters = load_risk_register_parameters(register_dir=str(tmp_path / "first"), cache_dir=cache_dir)
+    lognormal = df_register["Distribution"].str.lower().to_numpy() == "lognormal"
+    mu, sigma = lognormal_parameters(register_parameters["min_impact"][lognormal],
+                                     register_parameters["max_impact"][lognormal])
+    assert np.array_equal(cached_parameters["lognormal_mu"][lognormal], mu)
+    assert np.array_equal(cached_parameters["lognormal_sigma"][lognormal], sigma)
+    assert np.isnan(cached_parameters["lognormal_mu"][~lognormal]).all()
+    assert np.array_equal(cached_parameters["risk"], df_register["Risk"].to_numpy())
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from tools.regression_harness import compare_with_golden, save_golden_results
+
+
+def test_tolerances_hashes_and_largest_deviations(tmp_path):
+    """Float noise passes within tolerance but not the hash check; real deviations & label changes are reported."""
+    df_metrics = pd.DataFrame({"99% ES": [125.0], "Expected Impact": [10.0]}, index=["Horizon"])
+    df_summary = pd.DataFrame({0: [1.0, 2.0], 1: [3.0, 4.0], "Title": ["a", "b"]}, index=[11, 12])
+    golden_path = save_golden_results(str(tmp_path / "golden.npz"), {"metrics": df_metrics, "summary": df_summary,
+                                                                     "paths": np.arange(6.0).reshape(2, 3)})
+
+    noisy_metrics = df_metrics * (1 + 1e-13)
+    assert compare_with_golden({"metrics": noisy_metrics, "summary": df_summary,
+                                "paths": np.arange(6.0).reshape(2, 3)}, golden_path).passed
+    assert not compare_with_golden({"metrics": noisy_metrics, "summary": df_summary,
+                                    "paths": np.arange(6.0).reshape(2, 3)}, golden_path, exact=True).passed
+
+    shifted_paths = np.arange(6.0).reshape(2, 3)
+    shifted_paths[1, 2] += 0.5
+    renamed_summary = df_summary.assign(Title=["a", "c"])
+    report = compare_with_golden({"metrics": df_metrics, "summary": renamed_summary, "paths": shifted_paths},
+                                 golden_path, tolerances={"metrics": (0.0, 0.0)})
+
+    assert sorted(entry["name"] for entry in report.failures) == ["paths", "summary[Title]"]
+    assert report.largest_deviations(1)[0]["worst_position"] == (1, 2)
+    assert compare_with_golden({"metrics": df_metrics, "summary": df_summary, "paths": shifted_paths},
+                               golden_path, tolerances={"paths": (0.2, 0.0)}).passed
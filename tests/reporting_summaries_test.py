@@ -0,0 +1,32 @@
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import matplotlib.pyplot as plt
+from tools.reporting import plot_final_impact_distribution, plot_loss_curve, plot_simulation
+from tools.reporting_summaries import compute_reporting_summaries, load_reporting_summaries, save_reporting_summaries
+
+
+def test_summaries_match_full_sample_and_round_trip(tmp_path):
+    """Exceedance points & fan bands equal their full-sample values; saved summaries read back unchanged."""
+    rng = np.random.default_rng(5)
+    paths = np.cumsum(rng.lognormal(size=(4, 20000)) * (rng.random((4, 20000)) < 0.3), axis=0)
+
+    summaries = compute_reporting_summaries(paths, bins=30, exceedance_points=50, num_sample_paths=25)
+    losses = summaries["exceedance"]["losses"]
+
+    np.testing.assert_allclose(summaries["exceedance"]["exceedance_probabilities"],
+                               (paths[-1] >= losses.reshape(-1, 1)).mean(axis=1))
+    np.testing.assert_allclose(summaries["fan"]["bands"][3], np.median(paths, axis=1))
+    assert summaries["histogram"]["counts"].sum() == 20000 and summaries["sample_paths"]["paths"].shape == (4, 25)
+    assert np.argmax(paths[-1]) in summaries["sample_paths"]["scenarios"]
+
+    save_reporting_summaries(summaries, str(tmp_path))
+    loaded = load_reporting_summaries(str(tmp_path))
+    np.testing.assert_array_equal(loaded["exceedance"]["losses"], losses)
+    assert int(loaded["scenarios"]) == 20000
+
+    # Plots render from the summaries as from the results
+    for plot in (plot_simulation, plot_final_impact_distribution, plot_loss_curve):
+        plot(loaded)
+        plot(paths)
+    plt.close("all")
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic_registers import make_synthetic_register
+from model.simple_simulation_engine import ExecutionOptions, SamplingOptions, perform_simulation
+from tools.result_store import SimulationResultStore
+
+
+def test_result_store_matches_dictionary_results(tmp_path):
+    """The memory-mapped store (also reopened from disk) holds the same per risk frames & totals as the dictionary."""
+    df_register = make_synthetic_register(6, seed=2)
+    df_register.loc[5, "Risk"] = df_register.loc[0, "Risk"]
+    parameters = dict(num_steps=3, num_scenarios=500, independent_sampling=True, interim_files_dir=str(tmp_path),
+                      save_interim_files=False, sampling=SamplingOptions(rng_mode='philox'))
+    execution = ExecutionOptions(batched=True)
+
+    df_total_impacts, dict_risk_impacts = perform_simulation(df_register, execution=execution, **parameters)
+    df_store_total, result_store = perform_simulation(
+        df_register, execution=execution._replace(result_store_dir=str(tmp_path / "store")), **parameters)
+
+    for store in (result_store, SimulationResultStore(str(tmp_path / "store"))):
+        assert list(store) == list(dict_risk_impacts)
+        for risk, df_risk_impacts in dict_risk_impacts.items():
+            assert store[risk].equals(df_risk_impacts)
+        risk = df_register.loc[1, "Risk"]
+        assert np.array_equal(store.step(risk), dict_risk_impacts[str(risk)].iloc[-1])
+        assert store.total_frame().equals(df_total_impacts) and df_store_total.equals(df_total_impacts)
+
+
+def test_result_store_items_are_read_only(tmp_path):
+    """Frames & views handed out by a store opened for writing cannot modify the stored paths."""
+    store = SimulationResultStore.create(str(tmp_path), [1, 2], num_steps=2, num_scenarios=4)
+    store.write_risk(0, np.ones((2, 4)))
+
+    df_risk_impacts, df_total_impacts = store[1], store.total_frame()
+    with pytest.raises(ValueError, match="read-only"):
+        df_risk_impacts.iloc[0, 0] = 5.0
+    with pytest.raises(ValueError, match="read-only"):
+        store.path(1, 0)[:] = 5.0
+    with pytest.raises(ValueError, match="read-only"):
+        df_total_impacts.iloc[0, 0] = 5.0
+
+    assert np.array_equal(store.paths[0], np.ones((2, 4)))
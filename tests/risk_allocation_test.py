@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from model.risk_allocation import allocate_risk_contributions, euler_contributions
+from model.risk_metrics import compute_tail_metrics
+
+
+def test_contributions_add_up_to_total_metrics():
+    """ES contributions are tail means adding up to the ES; kernel VaR contributions are rescaled to the VaR."""
+    rng = np.random.default_rng(3)
+    horizon_values = rng.lognormal(size=(4, 20000)) * (rng.random((4, 20000)) < [[0.1], [0.3], [0.5], [0.9]])
+
+    contributions, tail_metrics = euler_contributions(horizon_values, var_levels=(95, 99), es_levels=(99,))
+    total_losses = horizon_values.sum(axis=0)
+    tail = total_losses >= np.percentile(total_losses, 99)
+
+    np.testing.assert_allclose(contributions["ES"][99], horizon_values[:, tail].mean(axis=1))
+    np.testing.assert_allclose(contributions["ES"][99].sum(), tail_metrics["ES"][99])
+    np.testing.assert_allclose(contributions["VaR"][95].sum(), tail_metrics["VaR"][95])
+
+
+def test_comonotonic_risks_have_no_diversification():
+    """Risks that move together keep their standalone ES; taxonomy rows & the total roll the risks up."""
+    losses = np.random.default_rng(4).exponential(size=10000)
+    df_horizon_values = pd.DataFrame([losses, 2 * losses, 3 * losses], index=[11, 12, 13])
+    df_horizon_values["Taxonomy"] = ["Operational", "Operational", "Financial"]
+    df_horizon_values["Title"] = ["a", "b", "c"]
+
+    df_risk_contributions, df_taxonomy_contributions = allocate_risk_contributions(df_horizon_values)
+
+    np.testing.assert_allclose(df_risk_contributions["99% ES Diversification"].astype(float), 0.0, atol=1e-9)
+    np.testing.assert_allclose(df_taxonomy_contributions.loc["Operational", "99% ES Contribution"],
+                               compute_tail_metrics(3 * losses, es_levels=(99,))["ES"][99])
+    np.testing.assert_allclose(df_taxonomy_contributions.loc["Total", "99% ES Contribution"],
+                               df_risk_contributions.loc["Total", "99% ES Contribution"])
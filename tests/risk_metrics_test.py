@@ -0,0 +1,37 @@
+import numpy as np
+from scipy import stats as st
+from model.risk_metrics import compute_tail_metrics
+
+
+def test_single_sort_kernel_matches_numpy_reference():
+    """Percentiles, median, mode & mean are bit-identical to numpy / scipy; ES agrees to rounding."""
+    rng = np.random.default_rng(3)
+    losses = np.round(rng.lognormal(10.0, 2.0, 10001) * (rng.random(10001) < 0.3), 2)
+    levels = [0, 50, 90, 95, 99, 99.9, 99.999, 100]
+
+    tail_metrics = compute_tail_metrics(losses, var_levels=levels, es_levels=levels)
+
+    for level in levels:
+        assert tail_metrics["VaR"][level] == np.percentile(losses, level)
+        assert np.isclose(tail_metrics["ES"][level], np.mean(losses[losses >= np.percentile(losses, level)]),
+                          rtol=1e-12, atol=0.0)
+
+    assert tail_metrics["Median"] == np.median(losses)
+    assert tail_metrics["Mode"] == st.mode(losses)[0]
+    assert tail_metrics["Expected"] == np.mean(losses)
+
+
+def test_weighted_metrics_follow_weighted_distribution():
+    """Duplicating a sample is equivalent to giving it weight two."""
+    losses = np.array([5.0, 1.0, 3.0, 2.0, 4.0])
+    weights = np.array([2.0, 1.0, 1.0, 1.0, 1.0])
+    expanded_losses = np.array([5.0, 5.0, 1.0, 3.0, 2.0, 4.0])
+
+    weighted = compute_tail_metrics(losses, var_levels=[50, 80], es_levels=[50], weights=weights)
+    expanded = compute_tail_metrics(expanded_losses, var_levels=[50, 80], es_levels=[50],
+                                    weights=np.ones(len(expanded_losses)))
+
+    assert weighted == expanded
+    assert weighted["Mode"] == 5.0
+    assert weighted["VaR"][50] == 3.0
+    assert weighted["ES"][50] == 17.0 / 4.0
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from scipy import special as sp
+from model.random_streams import to_open_unit_interval
+from model.sampling_schemes import UniformSampler
+from model.simple_simulation_engine import compute_horizon_metrics
+
+
+@pytest.mark.parametrize("sampling_scheme", ["antithetic", "lhs", "sobol"])
+def test_scheme_uniforms_do_not_depend_on_chunking(sampling_scheme):
+    """Uniforms of a risk are identical whether all scenarios are drawn at once or in chunks."""
+    sampler = UniformSampler(sampling_scheme, risk_ids=[2066, 2023], num_scenarios=1000, replicates=4)
+
+    full = sampler.draw(7, 2023, 1, steps=2, scenario_start=0, scenario_stop=1000)
+    chunked = np.hstack([sampler.draw(7, 2023, 1, steps=2, scenario_start=start, scenario_stop=stop)
+                         for start, stop in [(0, 333), (333, 334), (334, 1000)]])
+
+    assert np.array_equal(full, chunked)
+    assert full.min() > 0.0 and full.max() < 1.0
+
+
+def test_lhs_and_antithetic_structure():
+    """Latin hypercube uniforms fill one stratum per scenario; antithetic scenarios come in (u, 1 - u) pairs."""
+    lhs = UniformSampler("lhs", risk_ids=[1], num_scenarios=600, replicates=3).draw(3, 1, 0, 1, 0, 600)
+    for block in np.split(lhs[0], 3):
+        assert np.array_equal(np.sort(np.floor(block * 200)), np.arange(200))
+
+    antithetic = UniformSampler("antithetic", risk_ids=[1], num_scenarios=600).draw(3, 1, 0, 1, 0, 600)
+    np.testing.assert_allclose(antithetic[0, ::2] + antithetic[0, 1::2], 1.0)
+
+
+def test_replicates_add_standard_error_row():
+    """Metrics table gains a 'Standard Error' row computed over replicate blocks."""
+    df_metrics = compute_horizon_metrics(np.random.default_rng(0).exponential(size=4000), replicates=8)
+
+    assert list(df_metrics.index) == ["Horizon", "Standard Error"]
+    assert (df_metrics.loc["Standard Error"] > 0).all()
+
+
+def test_largest_generator_uniform_stays_below_one():
+    """1 - 2**-53 must not round up to 1.0 when shifted into the open interval."""
+    uniforms = to_open_unit_interval(np.array([0.0, 1.0 - 2.0 ** -53]))
+
+    assert np.all((uniforms > 0.0) & (uniforms < 1.0))
+    assert np.all(np.isfinite(sp.ndtri(uniforms)))
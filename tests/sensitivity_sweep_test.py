@@ -0,0 +1,36 @@
+import numpy as np
+from model.risk_metrics import compute_tail_metrics
+from model.sensitivity_sweep import run_sensitivity_sweep
+from model.streaming_simulation_engine import stream_horizon_impacts
+
+
+def test_sweep_points_match_full_runs():
+    """Every grid point reproduces the metrics of a full run with the overridden parameters."""
+    register_parameters = {
+        "risk": np.array([101, 102, 103, 104]), "likelihood": np.array([0.1, 0.5, 0.3, 1.0]),
+        "min_impact": np.array([1000.0, 200.0, 10.0, 0.0]), "max_impact": np.array([50000.0, 5000.0, 20.0, 0.0]),
+        "distribution": np.array(["Lognormal", "Uniform", "Normal", "Deterministic Trend"], dtype=object),
+        "mean": np.array([0.0, 0.0, 100.0, 7.0]), "std": np.array([0.0, 0.0, 25.0, 0.0])}
+    grid = [{}, {"max_cap": 20000.0, "likelihood_scale": 1.5, "scaled_risks": [101, 103]},
+            {"impact_scale": 2.0, "independent_sampling": False}]
+
+    df_sweep = run_sensitivity_sweep(register_parameters, num_steps=3, num_scenarios=5000, grid=grid,
+                                     selected_seed=5, chunk_size=1500, var_levels=(90, 99), es_levels=(95,))
+
+    scaled_parameters = {key: values.copy() for key, values in register_parameters.items()}
+    scaled_parameters["likelihood"][[0, 2]] *= 1.5
+    doubled_parameters = {key: values.copy() for key, values in register_parameters.items()}
+    for key in ("min_impact", "max_impact", "mean", "std"):
+        doubled_parameters[key] *= 2.0
+
+    full_runs = [(register_parameters, {}), (scaled_parameters, {"max_cap": 20000.0}),
+                 (doubled_parameters, {"independent_sampling": False})]
+    for point, (parameters, settings) in enumerate(full_runs):
+        totals, _, _ = stream_horizon_impacts(parameters, num_steps=3, num_scenarios=5000, selected_seed=5,
+                                              keep_per_risk_horizon=False, **settings)
+        tail_metrics = compute_tail_metrics(totals, var_levels=(90, 99), es_levels=(95,))
+        values = df_sweep[df_sweep["Grid Point"] == point].set_index("Metric")["Value"]
+
+        np.testing.assert_allclose([values["99%-Percentile Impact"], values["95% ES"], values["Expected Impact"]],
+                                   [tail_metrics["VaR"][99], tail_metrics["ES"][95], tail_metrics["Expected"]],
+                                   rtol=1e-12)
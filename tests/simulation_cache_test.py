@@ -0,0 +1,42 @@
+import numpy as np
+from tools.simulation_cache import SimulationCache, register_fingerprints
+
+REGISTER_PARAMETERS = {"risk": np.array([1, 2]), "likelihood": np.array([0.1, 0.2]),
+                       "min_impact": np.array([1.0, 2.0]), "max_impact": np.array([10.0, 20.0]),
+                       "distribution": np.array(["Normal", "Lognormal"], dtype=object),
+                       "mean": np.array([5.0, 0.0]), "std": np.array([1.0, 0.0])}
+RUN_SETTINGS = {"seed": 110, "steps": 3, "scenarios": 100, "rng_mode": "philox"}
+
+
+def test_fingerprints_change_with_row_and_run_settings():
+    """Editing a row only changes the fingerprint of that risk; run settings change all of them."""
+    fingerprints = register_fingerprints(REGISTER_PARAMETERS, RUN_SETTINGS)
+
+    edited_parameters = {key: values.copy() for key, values in REGISTER_PARAMETERS.items()}
+    edited_parameters["likelihood"][1] = 0.25
+    edited_fingerprints = register_fingerprints(edited_parameters, RUN_SETTINGS)
+
+    assert edited_fingerprints[0] == fingerprints[0] and edited_fingerprints[1] != fingerprints[1]
+    assert set(register_fingerprints(REGISTER_PARAMETERS, {**RUN_SETTINGS, "seed": 111})).isdisjoint(fingerprints)
+
+
+def test_cache_round_trip_and_lru_eviction(tmp_path):
+    """Entries are read back unchanged; the least recently used entry is evicted once the cache is full."""
+    rng = np.random.default_rng(0)
+    impacts = rng.normal(size=(3, 100))
+    realizations = (rng.random((3, 100)) < 0.3).astype(np.int8)
+
+    cache = SimulationCache(str(tmp_path), max_bytes=10**9)
+    for fingerprint in ["a", "b", "c"]:
+        cache.put(fingerprint, impacts, realizations)
+    cached_impacts, cached_realizations = cache.get("a")
+
+    assert np.array_equal(cached_impacts, impacts) and np.array_equal(cached_realizations, realizations)
+
+    # "b" is now the least recently used entry
+    cache = SimulationCache(str(tmp_path), max_bytes=cache.size_bytes)
+    cache.get("a")
+    cache.put("d", impacts, realizations)
+
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.size_bytes <= cache.max_bytes
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from model.simple_simulation_engine import SamplingOptions, perform_simulation, extract_simulation_statistics
+from model.streaming_simulation_engine import perform_streaming_simulation
+
+
+def synthetic_register():
+    """Small register in the 'RR Lite' schema, including a duplicated risk ID."""
+    return pd.DataFrame({
+        "Risk": [101, 102, 103, 101], "Taxonomy Level I": ["Operational", "Financial", "Financial", "Operational"],
+        "Converted Likelihood": [0.1, 0.5, 0.3, 0.1], "Converted Lower Impact": [1000, 200, 10, 1000],
+        "Converted Max Impact": [50000, 5000, 20, 50000],
+        "Distribution": ["Lognormal", "Uniform", "Normal", "Lognormal"],
+        "Mean": [0, 0, 100, 0], "Std": [0, 0, 25, 0], "Risk Title": ["A", "B", "C", "D"]})
+
+
+def test_streaming_matches_full_path_statistics():
+    """Chunked horizon-only streaming reproduces the statistics of a full-path run."""
+    df_register = synthetic_register()
+    parameters = dict(df_lite_rr=df_register, num_steps=3, num_scenarios=2500, independent_sampling=True,
+                      interim_files_dir="", save_interim_files=False, selected_seed=11)
+
+    df_total, dict_paths = perform_simulation(**parameters, sampling=SamplingOptions(rng_mode='philox'))
+    df_horizon_expected, df_metrics_expected = extract_simulation_statistics(
+        risk_factor_df_dict=dict_paths, df_rr_lite=df_register, df_total_impact_results=df_total,
+        interim_files_dir="", save_interim_files=False)
+
+    df_horizon_total, df_horizon, df_metrics = perform_streaming_simulation(**parameters, rng_mode='philox',
+                                                                            chunk_size=999, per_risk_horizon=True)
+
+    assert np.array_equal(df_total.iloc[-1, :].values, df_horizon_total.iloc[0, :].values)
+    assert df_horizon.equals(df_horizon_expected)
+    assert df_metrics.equals(df_metrics_expected)
+
+
+def test_streaming_without_per_risk_horizon(tmp_path):
+    """By default chunked Philox runs drop the per risk horizon table, keep the totals & metrics and save only the
+    metrics."""
+    parameters = dict(df_lite_rr=synthetic_register(), num_steps=3, num_scenarios=2500, independent_sampling=True,
+                      selected_seed=11, chunk_size=999, output_format='npy')
+
+    df_horizon_total, _, df_metrics = perform_streaming_simulation(**parameters, interim_files_dir="",
+                                                                   save_interim_files=False, per_risk_horizon=True)
+    df_light_total, df_horizon, df_light_metrics = perform_streaming_simulation(
+        **parameters, interim_files_dir=str(tmp_path))
+
+    assert df_horizon is None
+    assert df_light_total.equals(df_horizon_total) and df_light_metrics.equals(df_metrics)
+    assert [path.name for path in tmp_path.iterdir()] == ["Total Impact Metrics at Horizon.xlsx"]
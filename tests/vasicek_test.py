@@ -0,0 +1,35 @@
+import numpy as np
+from model.vasicek import simulate_vasicek_paths
+
+def test_exact_vasicek_matches_step_by_step_recursion():
+    kappa, theta, sigma, r0 = np.array([0.5, 0.0]), np.array([0.03, 0.0]), np.array([0.01, 0.02]), \
+        np.array([0.01, 0.02])
+    horizon, num_steps, num_simulations = 1.0, 13, 500
+
+    t, r = simulate_vasicek_paths(kappa, theta, sigma, r0, horizon, num_steps, num_simulations, seed=7)
+    assert t.shape == (num_steps, 1)
+    assert r.shape == (2, num_steps, num_simulations)
+
+    dt = horizon / (num_steps - 1)
+    shocks = np.random.default_rng(7).standard_normal((2, num_steps - 1, num_simulations))
+    decay = np.exp(-kappa * dt)
+    shock_std = sigma * np.sqrt(np.array([-np.expm1(-2 * kappa[0] * dt) / (2 * kappa[0]), dt]))
+
+    expected = np.repeat(r0[:, None], num_simulations, axis=1)
+    for step in range(num_steps - 1):
+        expected = theta[:, None] + (expected - theta[:, None]) * decay[:, None] + \
+            shock_std[:, None] * shocks[:, step]
+        np.testing.assert_allclose(r[:, step + 1], expected, rtol=0, atol=1e-14)
+
+
+def test_exact_vasicek_with_negative_kappa():
+    """Explosive factors (kappa < 0) keep the exact shock variance (exp(-2 kappa dt) - 1) / (-2 kappa)."""
+    kappa, theta, sigma, r0 = -0.4, 0.02, 0.01, 0.03
+    horizon, num_steps, num_simulations = 2.0, 3, 200000
+
+    _, r = simulate_vasicek_paths(kappa, theta, sigma, r0, horizon, num_steps, num_simulations, seed=11)
+
+    dt = horizon / (num_steps - 1)
+    shock_variance = np.expm1(-2 * kappa * dt) / (-2 * kappa)
+    np.testing.assert_allclose(r[0, 1].mean(), theta + (r0 - theta) * np.exp(-kappa * dt), atol=2e-4)
+    np.testing.assert_allclose(r[0, 1].var(), sigma ** 2 * shock_variance, rtol=0.02)
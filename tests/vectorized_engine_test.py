@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from model.simple_simulation_engine import SamplingOptions, perform_simulation, sample_risk_impact
+from model.vectorized_simulation_engine import sample_risk_impact_vectorized, simulate_risk_impact_array
+from model.batched_simulation_engine import simulate_register_batched
+
+
+@pytest.mark.parametrize("distribution", ["Normal", "Lognormal", "Uniform", "Deterministic Trend"])
+def test_legacy_seeding_matches_sample_risk_impact(distribution):
+    """Vectorized engine with legacy seeding reproduces the per-step DataFrame engine draw for draw."""
+    parameters = dict(steps=3, scenarios=500, distribution=distribution, mean=1000.0, std=250.0,
+                      left_tail_impact=1000.0, right_tail_impact=50000.0, risk_likelihood=0.1,
+                      min_impact=1000.0, max_impact=50000.0, cap_value=30000.0, seed=50, risk_id=2066)
+
+    df_expected_sims, df_expected_map = sample_risk_impact(**parameters)
+    df_sims, df_map = sample_risk_impact_vectorized(**parameters, rng_mode='legacy')
+
+    assert np.array_equal(df_expected_sims.values.astype(float), df_sims.values)
+    assert np.array_equal(df_expected_map.values.astype(int), df_map.values)
+
+
+def test_philox_mode_applies_mask_and_cap():
+    """Philox mode zeroes non-materialised scenarios and respects the cap."""
+    df_sims, df_map = sample_risk_impact_vectorized(
+        steps=4, scenarios=20000, distribution='Lognormal', left_tail_impact=1000.0, right_tail_impact=50000.0,
+        risk_likelihood=0.2, cap_value=40000.0, rng_mode='philox')
+
+    assert df_sims.values[df_map.values == 0].max() == 0.0
+    assert df_sims.values.max() <= 40000.0
+    assert abs(df_map.values.mean() - 0.2) < 0.01
+
+
+def test_philox_streams_are_identical_serial_batched_and_chunked():
+    """Keyed streams give the same draws per risk whatever the grouping or scenario chunking."""
+    register_parameters = {
+        "risk": np.array([2066, 2023, 2067]), "likelihood": np.array([0.05, 0.5, 0.3]),
+        "min_impact": np.array([1000.0, 500.0, 10.0]), "max_impact": np.array([50000.0, 5000.0, 20.0]),
+        "distribution": np.array(["Lognormal", "Normal", "Uniform"], dtype=object),
+        "mean": np.array([0.0, 2000.0, 0.0]), "std": np.array([0.0, 300.0, 0.0])}
+
+    impacts, realizations = simulate_register_batched(register_parameters, num_steps=3, num_scenarios=1001,
+                                                      selected_seed=7, rng_mode='philox')
+
+    for position, risk in enumerate(register_parameters["risk"]):
+        parameters = dict(steps=3, distribution=register_parameters["distribution"][position],
+                          mean=register_parameters["mean"][position], std=register_parameters["std"][position],
+                          left_tail_impact=register_parameters["min_impact"][position],
+                          right_tail_impact=register_parameters["max_impact"][position],
+                          min_impact=register_parameters["min_impact"][position],
+                          max_impact=register_parameters["max_impact"][position],
+                          risk_likelihood=register_parameters["likelihood"][position],
+                          seed=7, risk_id=risk, rng_mode='philox')
+
+        serial_impacts, serial_realizations = simulate_risk_impact_array(scenarios=1001, **parameters)
+        chunked_impacts = np.hstack([simulate_risk_impact_array(scenarios=stop - start, scenario_start=start,
+                                                                **parameters)[0]
+                                     for start, stop in [(0, 333), (333, 334), (334, 1001)]])
+
+        assert np.array_equal(impacts[position], serial_impacts)
+        assert np.array_equal(realizations[position], serial_realizations)
+        assert np.array_equal(serial_impacts, chunked_impacts)
+
+
+def test_grouped_streams_are_identical_batched_and_chunked():
+    """Group streams give the same tensor in one draw per group & step or in scenario chunks; duplicates share draws."""
+    register_parameters = {
+        "risk": np.array([11, 12, 13, 12, 14]), "likelihood": np.array([0.05, 0.5, 0.3, 0.5, 0.2]),
+        "min_impact": np.array([1000.0, 500.0, 10.0, 500.0, 100.0]),
+        "max_impact": np.array([50000.0, 5000.0, 20.0, 5000.0, 900.0]),
+        "distribution": np.array(["Lognormal", "Lognormal", "Uniform", "Lognormal", "Lognormal"], dtype=object),
+        "mean": np.zeros(5), "std": np.zeros(5)}
+
+    impacts, realizations = simulate_register_batched(register_parameters, num_steps=3, num_scenarios=1001,
+                                                      selected_seed=7, rng_mode='philox_grouped')
+    chunks = [simulate_register_batched(register_parameters, num_steps=3, num_scenarios=stop - start,
+                                        selected_seed=7, rng_mode='philox_grouped', scenario_start=start,
+                                        stream_scenarios=1001)
+              for start, stop in [(0, 333), (333, 334), (334, 1001)]]
+
+    assert np.array_equal(np.concatenate([chunk[0] for chunk in chunks], axis=2), impacts)
+    assert np.array_equal(np.concatenate([chunk[1] for chunk in chunks], axis=2), realizations)
+    assert np.array_equal(impacts[1], impacts[3])
+    assert not np.array_equal(impacts[0], impacts[1])
+    assert abs(realizations[1].mean() - 0.5) < 0.05
+
+    with pytest.raises(ValueError):
+        simulate_register_batched(register_parameters, num_steps=3, num_scenarios=10, rng_mode='philox_grouped',
+                                  scenario_start=10)
+
+
+def test_grouped_streams_require_batched_runs():
+    """Grouped streams cannot be drawn risk by risk in the loop of perform_simulation."""
+    with pytest.raises(ValueError):
+        perform_simulation(df_lite_rr=None, num_steps=2, num_scenarios=10, independent_sampling=True,
+                           interim_files_dir="", save_interim_files=False,
+                           sampling=SamplingOptions(rng_mode='philox_grouped'))
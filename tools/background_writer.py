@@ -0,0 +1,63 @@
+import queue
+import threading
+
+class BackgroundOutputWriter:
+    """Wraps an output writer (see tools.output_writers) so that writes run on background threads.
+
+    Writes are queued in a bounded queue, so sampling blocks only when max_pending results are waiting; arrays
+    handed over must not be modified afterwards. close() flushes the queue and raises if any write failed."""
+    def __init__(self, output_writer, num_threads: int = 1, max_pending: int = 4):
+        self.output_writer = output_writer # Writer performing the actual I/O
+        self.tasks = queue.Queue(maxsize=max_pending) # Pending writes
+        self.errors = [] # Exceptions raised by failed writes
+        self.errors_lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._process_tasks, name=f"output-writer-{number}", daemon=True)
+                        for number in range(max(1, num_threads))]
+
+        for thread in self.threads:
+            thread.start()
+
+    def _process_tasks(self):
+        """Writer thread loop; stops at the None sentinel."""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+
+            write_method, arguments = task
+            try:
+                write_method(*arguments)
+            except Exception as error:
+                with self.errors_lock:
+                    self.errors.append(error)
+
+    def _submit(self, write_method, *arguments):
+        """Queues a write, blocking while the queue is full."""
+        self.tasks.put((write_method, arguments))
+
+    def write_risk_results(self, risk, impacts, realizations):
+        """Records the risk factor in submission order, then queues its impacts & materialization map."""
+        # Records (e.g. the npy manifest) must not depend on which thread finishes first
+        self.output_writer.record_risk(risk, impacts.shape)
+        self._submit(self.output_writer.save_risk_results, risk, impacts, realizations)
+
+    def write_total_results(self, total_impacts):
+        """Queues the simulated impacts summed over all risk factors."""
+        self._submit(self.output_writer.write_total_results, total_impacts)
+
+    def write_table(self, name, df_table):
+        """Queues a summary table."""
+        self._submit(self.output_writer.write_table, name, df_table)
+
+    def close(self):
+        """Waits for all queued writes, then finalizes the wrapped writer; raises if any write failed."""
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} background output write(s) failed; "
+                               f"first error: {self.errors[0]!r}") from self.errors[0]
+
+        self.output_writer.close()
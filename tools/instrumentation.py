@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = "run_manifest.json"
+
+# Bumped whenever the manifest layout changes
+MANIFEST_FORMAT_VERSION = 2
+
+def peak_rss_bytes():
+    """Peak resident set size of the process so far (None when it cannot be read)."""
+    try:
+        import resource
+    except ImportError:
+        # Windows has no resource module; psutil reports the peak working set when installed
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes except on macOS
+
+def directory_bytes(path: str):
+    """Total size of the files below path (0 when it does not exist)."""
+    total_bytes = 0
+    for root, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total_bytes += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+
+    return total_bytes
+
+class RunInstrumentation:
+    """Records per stage & per risk wall time, CPU time, memory, throughput & bytes written of a run.
+
+    Risks are timed one by one on the serial loop path only; batched runs record every distribution group and
+    parallel runs every worker task instead ('groups' of the manifest, with the risks they hold). Every finished
+    stage, risk or group is passed as an event dictionary ('event': 'stage', 'risk' or 'group') to the callbacks;
+    write_manifest saves all records as a JSON run manifest. Bytes written are measured as the growth of the
+    output_dir during a stage. With trace_allocations=True the peak Python / NumPy allocations of every stage are
+    traced as well (tracemalloc slows allocation-heavy stages down)."""
+    enabled = True
+
+    def __init__(self, output_dir: str = None, callbacks=(), trace_allocations: bool = False, settings: dict = None):
+        self.output_dir = output_dir # Directory of the run's outputs (bytes written & manifest)
+        self.callbacks = list(callbacks) # Called with every stage & risk event
+        self.trace_allocations = trace_allocations
+        self.settings = settings or {} # Run settings recorded in the manifest
+        self.stages = []
+        self.risks = []
+        self.groups = []
+        self.started = datetime.now()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.bytes_start = directory_bytes(output_dir) if output_dir is not None else 0
+
+        # Tracing is stopped with the manifest unless it was already on
+        self.started_tracing = trace_allocations and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def _emit(self, event: str, record: dict):
+        for callback in self.callbacks:
+            callback({"event": event, **record})
+
+    @contextmanager
+    def stage(self, name: str, scenarios: int = None, **details):
+        """Measures the enclosed block as stage name; scenarios (if given) gives the scenarios per second."""
+        bytes_before = directory_bytes(self.output_dir) if self.output_dir is not None else None
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            record = {"stage": name, "wall_seconds": wall_seconds, "cpu_seconds": time.process_time() - cpu_start,
+                      "peak_rss_bytes": peak_rss_bytes(), **details}
+            if self.trace_allocations:
+                record["peak_allocated_bytes"] = tracemalloc.get_traced_memory()[1]
+            if scenarios is not None:
+                record["scenarios"] = scenarios
+                record["scenarios_per_second"] = scenarios / wall_seconds if wall_seconds > 0 else None
+            if bytes_before is not None:
+                record["bytes_written"] = directory_bytes(self.output_dir) - bytes_before
+
+            self.stages.append(record)
+            self._emit("stage", record)
+
+    def record_risk(self, risk, wall_seconds: float, cpu_seconds: float, scenarios: int, cached: bool = False):
+        """Records the simulation of one risk (or its read back from the simulation cache)."""
+        record = {"risk": str(risk), "wall_seconds": wall_seconds, "cpu_seconds": cpu_seconds, "cached": cached,
+                  "scenarios_per_second": scenarios / wall_seconds if wall_seconds > 0 else None}
+
+        self.risks.append(record)
+        self._emit("risk", record)
+
+    def record_group(self, group: str, risks, wall_seconds: float, cpu_seconds: float, scenarios: int):
+        """Records the simulation of a group of risks sampled together (distribution group or parallel task)."""
+        record = {"group": str(group), "risks": [str(risk) for risk in risks], "wall_seconds": wall_seconds,
+                  "cpu_seconds": cpu_seconds,
+                  "scenarios_per_second": scenarios / wall_seconds if wall_seconds > 0 else None}
+
+        self.groups.append(record)
+        self._emit("group", record)
+
+    def manifest(self):
+        """Returns the run manifest: settings, stages, risks & groups (slowest first) & run totals."""
+        wall_seconds = time.perf_counter() - self.wall_start
+
+        return {"format_version": MANIFEST_FORMAT_VERSION, "started": self.started.isoformat(timespec='seconds'),
+                "finished": datetime.now().isoformat(timespec='seconds'), "settings": self.settings,
+                "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                                "platform": platform.platform(), "cpu_count": os.cpu_count()},
+                "totals": {"wall_seconds": wall_seconds, "cpu_seconds": time.process_time() - self.cpu_start,
+                           "peak_rss_bytes": peak_rss_bytes(),
+                           "bytes_written": directory_bytes(self.output_dir) - self.bytes_start
+                           if self.output_dir is not None else None},
+                "stages": self.stages,
+                "risks": sorted(self.risks, key=lambda record: record["wall_seconds"], reverse=True),
+                "groups": sorted(self.groups, key=lambda record: record["wall_seconds"], reverse=True)}
+
+    def write_manifest(self, output_dir: str = None):
+        """Saves the manifest as run_manifest.json in output_dir (default: the run's outputs) & returns its path."""
+        path = os.path.join(output_dir or self.output_dir, MANIFEST_FILE_NAME)
+        with open(path, "w") as file:
+            json.dump(self.manifest(), file, indent=2, default=str)
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+        logger.info(f"Run manifest saved in {path}.")
+
+        return path
+
+class NullInstrumentation:
+    """Stand-in of RunInstrumentation when instrumentation is disabled: every call does nothing."""
+    enabled = False
+
+    def stage(self, name: str, scenarios: int = None, **details):
+        return nullcontext()
+
+    def record_risk(self, risk, wall_seconds: float, cpu_seconds: float, scenarios: int, cached: bool = False):
+        pass
+
+    def record_group(self, group: str, risks, wall_seconds: float, cpu_seconds: float, scenarios: int):
+        pass
+
+    def write_manifest(self, output_dir: str = None):
+        return None
+
+NULL_INSTRUMENTATION = NullInstrumentation()
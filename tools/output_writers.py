@@ -0,0 +1,167 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from model.materialization import pack_materialization_map
+
+# Largest table (in cells) that binary backends still write to Excel; larger ones use the backend's own format
+SUMMARY_TABLE_MAX_CELLS = 10000
+
+OUTPUT_FORMATS = ("excel", "parquet", "npy")
+
+# Excel sheets hold at most 16384 columns: per risk & total tables take one per scenario plus index & label columns
+EXCEL_MAX_COLUMNS = 16384
+EXCEL_LABEL_COLUMNS = 3
+
+def is_summary_table(df_table: pd.DataFrame):
+    """Checks whether a table is small enough to be kept in Excel (e.g. the total impact metrics)."""
+    return df_table.size <= SUMMARY_TABLE_MAX_CELLS
+
+def validate_output_format(output_format: str, num_scenarios: int = 0):
+    """Raises an error for unknown formats & for Excel outputs of more scenarios than a sheet holds (checked before
+    simulating)."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format '{output_format}'; expected one of {OUTPUT_FORMATS}.")
+    if output_format == "excel" and num_scenarios + EXCEL_LABEL_COLUMNS > EXCEL_MAX_COLUMNS:
+        raise ValueError(f"Excel outputs hold at most {EXCEL_MAX_COLUMNS - EXCEL_LABEL_COLUMNS} scenarios per sheet; "
+                         f"use output_format='npy' or 'parquet' for {num_scenarios} scenarios.")
+
+class ExcelOutputWriter:
+    """Writes interim outputs as Excel workbooks (one workbook per risk result, as the original runs did)."""
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir # Directory of the run's outputs
+
+    def write_risk_results(self, risk, impacts: np.ndarray, realizations: np.ndarray):
+        """Records & saves the simulated impacts & materialization map of a risk factor."""
+        self.record_risk(risk, impacts.shape)
+        self.save_risk_results(risk, impacts, realizations)
+
+    def record_risk(self, risk, shape: tuple):
+        """Keeps track of a risk factor written to the outputs (called in write order)."""
+        pass
+
+    def save_risk_results(self, risk, impacts: np.ndarray, realizations: np.ndarray):
+        """Saves the simulated impacts & materialization map of a risk factor."""
+        temp_alias_results = "simulation_of_impacts_risk_" + str(risk) + ".xlsx"
+        temp_alias_materialization = "materialization_risk_" + str(risk) + ".xlsx"
+
+        pd.DataFrame(impacts, copy=False).to_excel(os.path.join(self.output_dir, temp_alias_results))
+        pd.DataFrame(realizations, copy=False).to_excel(os.path.join(self.output_dir, temp_alias_materialization))
+
+    def write_total_results(self, total_impacts: np.ndarray):
+        """Saves the simulated impacts summed over all risk factors."""
+        temp_alias_total_results = "Total Simulated Impacts.xlsx"
+        pd.DataFrame(total_impacts, copy=False).to_excel(os.path.join(self.output_dir, temp_alias_total_results))
+
+    def write_table(self, name: str, df_table: pd.DataFrame):
+        """Saves a summary table (e.g. 'Horizon Results')."""
+        df_table.to_excel(os.path.join(self.output_dir, name + ".xlsx"))
+
+    def close(self):
+        """Finalizes the outputs of the run."""
+        pass
+
+class NpyOutputWriter(ExcelOutputWriter):
+    """Writes interim outputs as raw .npy arrays (memory-mappable through np.load(..., mmap_mode='r')).
+
+    Materialization maps are stored as packed bits; a manifest records the shapes needed to unpack them."""
+    def __init__(self, output_dir: str):
+        super().__init__(output_dir)
+        self.manifest = {"format": "npy", "risks": []} # Shapes & files of the written arrays
+
+    def record_risk(self, risk, shape: tuple):
+        """Adds a risk factor & the (steps, scenarios) shape of its arrays to the manifest."""
+        self.manifest["steps"], self.manifest["scenarios"] = shape
+        self.manifest["risks"].append(str(risk))
+
+    def save_risk_results(self, risk, impacts: np.ndarray, realizations: np.ndarray):
+        """Saves the simulated impacts & packed materialization map of a risk factor."""
+        np.save(os.path.join(self.output_dir, "simulation_of_impacts_risk_" + str(risk) + ".npy"), impacts)
+        np.save(os.path.join(self.output_dir, "materialization_risk_" + str(risk) + ".npy"),
+                pack_materialization_map(realizations))
+
+    def write_total_results(self, total_impacts: np.ndarray):
+        """Saves the simulated impacts summed over all risk factors."""
+        np.save(os.path.join(self.output_dir, "Total Simulated Impacts.npy"), total_impacts)
+
+    def write_table(self, name: str, df_table: pd.DataFrame):
+        """Saves a table; small summaries go to Excel, large ones keep numeric values in .npy & labels in a .csv."""
+        if is_summary_table(df_table):
+            super().write_table(name, df_table)
+            return
+
+        df_numeric = df_table.select_dtypes(include="number")
+        np.save(os.path.join(self.output_dir, name + ".npy"), df_numeric.to_numpy())
+        df_table.drop(columns=df_numeric.columns).to_csv(os.path.join(self.output_dir, name + " labels.csv"))
+
+    def close(self):
+        """Writes the manifest of the run's arrays."""
+        if not self.manifest["risks"]:
+            return
+
+        with open(os.path.join(self.output_dir, "interim_outputs.json"), "w") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+
+class ParquetOutputWriter(ExcelOutputWriter):
+    """Writes interim outputs as Parquet datasets partitioned by risk (requires pyarrow).
+
+    Impacts are stored in long format (step, scenario, impact) and materialization maps as one packed-bits
+    binary value per step."""
+    def __init__(self, output_dir: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as error:
+            raise ImportError("Parquet outputs require pyarrow; install it or use output_format='npy'.") from error
+
+        super().__init__(output_dir)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+
+    def _write_partition(self, dataset: str, risk, table):
+        """Writes a table into the risk=<id> partition of a dataset directory."""
+        partition_dir = os.path.join(self.output_dir, dataset, "risk=" + str(risk))
+        os.makedirs(partition_dir, exist_ok=True)
+        self.pq.write_table(table, os.path.join(partition_dir, "part-0.parquet"))
+
+    def save_risk_results(self, risk, impacts: np.ndarray, realizations: np.ndarray):
+        """Saves the simulated impacts & packed materialization map of a risk factor."""
+        steps, scenarios = impacts.shape
+
+        impacts_table = self.pa.table({
+            "step": np.repeat(np.arange(steps, dtype=np.int32), scenarios),
+            "scenario": np.tile(np.arange(scenarios, dtype=np.int32), steps),
+            "impact": np.ascontiguousarray(impacts).ravel()})
+        self._write_partition("simulation_of_impacts", risk, impacts_table)
+
+        packed_realizations = pack_materialization_map(realizations)
+        materialization_table = self.pa.table({
+            "step": np.arange(steps, dtype=np.int32),
+            "packed_materialization": [row.tobytes() for row in packed_realizations]},
+            metadata={"scenarios": str(scenarios)})
+        self._write_partition("materialization", risk, materialization_table)
+
+    def write_total_results(self, total_impacts: np.ndarray):
+        """Saves the simulated impacts summed over all risk factors (one column per step)."""
+        table = self.pa.table({str(step): total_impacts[step] for step in range(total_impacts.shape[0])})
+        self.pq.write_table(table, os.path.join(self.output_dir, "Total Simulated Impacts.parquet"))
+
+    def write_table(self, name: str, df_table: pd.DataFrame):
+        """Saves a table; small summaries go to Excel, large ones (e.g. 'Horizon Results') to Parquet."""
+        if is_summary_table(df_table):
+            super().write_table(name, df_table)
+            return
+
+        df_parquet = df_table.copy()
+        df_parquet.columns = [str(column) for column in df_parquet.columns]
+        df_parquet.to_parquet(os.path.join(self.output_dir, name + ".parquet"))
+
+def create_output_writer(output_format: str, output_dir: str):
+    """Returns the interim outputs writer of the selected format ('excel', 'parquet' or 'npy')."""
+    validate_output_format(output_format)
+    if output_format == "excel":
+        return ExcelOutputWriter(output_dir)
+    if output_format == "npy":
+        return NpyOutputWriter(output_dir)
+
+    return ParquetOutputWriter(output_dir)
@@ -1,18 +1,175 @@
 import pandas as pd
+import numpy as np
 import os
+import pickle
+import hashlib
+import logging
 import warnings
+from model.vectorized_simulation_engine import distribution_group
+from model.batched_simulation_engine import extract_register_parameters
 
-warnings.filterwarnings('ignore')
+logger = logging.getLogger(__name__)
+
+# Folder of parsed registers under a run's outputs folder (see load_risk_register)
+REGISTER_CACHE_DIR = '.register_cache'
+
+# Bumped whenever parsing or validation changes, so that older cached registers are parsed again
+REGISTER_CACHE_VERSION = 2
+
+NUMERIC_COLUMNS = ('Converted Likelihood', 'Converted Lower Impact', 'Converted Max Impact', 'Mean', 'Std')
+REQUIRED_COLUMNS = ('Risk', 'Taxonomy Level I', 'Distribution', 'Risk Title') + NUMERIC_COLUMNS
 
 def read_risk_register_lite(register_dir: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\inputs',
                             file_name: str = r'risk register lite.xlsx', sheet: str = 'RR Lite'):
     """Reads & Imports Risk Register Lite for risks' quantification."""
     path = os.path.join(register_dir, file_name)
 
-    df_register = pd.read_excel(path, sheet_name=sheet)
+    # openpyxl warns about workbook features it does not read (e.g. data validation)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        df_register = pd.read_excel(path, sheet_name=sheet)
 
     return df_register
 
+def validate_risk_register(df_register: pd.DataFrame):
+    """Checks the register before simulating & returns it with float64 parameter columns.
+
+    Raises a ValueError listing every bad row (workbook row numbers): missing IDs, non-numeric parameters,
+    likelihoods outside [0, 1], unknown distributions, lognormal tails that are not 0 < lower < max, uniform
+    ranges with max < lower and negative normal standard deviations."""
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in df_register.columns]
+    if missing_columns:
+        raise ValueError(f"Risk register misses the columns {missing_columns}.")
+
+    df_register = df_register.copy()
+    problems = {}
+
+    def flag(rows, message):
+        for row in df_register.index[rows]:
+            problems.setdefault(row, []).append(message)
+
+    flag(df_register['Risk'].isna().to_numpy(), "missing risk ID")
+    for column in NUMERIC_COLUMNS:
+        values = pd.to_numeric(df_register[column], errors='coerce')
+        flag((values.isna() & df_register[column].notna()).to_numpy(), f"non-numeric '{column}'")
+        df_register[column] = values.astype(np.float64)
+
+    likelihood = df_register['Converted Likelihood'].to_numpy()
+    lower_impact = df_register['Converted Lower Impact'].to_numpy()
+    max_impact = df_register['Converted Max Impact'].to_numpy()
+    groups = np.array([distribution_group(str(value)) for value in df_register['Distribution']])
+
+    with np.errstate(invalid='ignore'):
+        flag(~((likelihood >= 0) & (likelihood <= 1)), "likelihood outside [0, 1]")
+        flag(groups == "unknown", "unknown distribution")
+        flag((groups == "lognormal") & ~((lower_impact > 0) & (max_impact > lower_impact)),
+             "lognormal impacts must satisfy 0 < lower < max")
+        flag((groups == "uniform") & ~(max_impact >= lower_impact), "uniform impacts must satisfy lower <= max")
+        flag((groups == "normal") & ~(df_register['Std'].to_numpy() >= 0), "normal std must be non-negative")
+
+    if problems:
+        # Workbook rows count the header & start at 1
+        details = "; ".join(f"row {row + 2}: {', '.join(messages)}" for row, messages in sorted(problems.items()))
+        raise ValueError(f"Risk register has {len(problems)} invalid rows - {details}")
+
+    duplicated = df_register['Risk'].duplicated(keep=False)
+    if duplicated.any():
+        logger.warning(f"Risk IDs {sorted(set(df_register.loc[duplicated, 'Risk'].astype(str)))} appear more than "
+                       f"once; their first row is used.")
+
+    return df_register
+
+def file_sha256(path: str):
+    """Returns the SHA-256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+def load_risk_register(register_dir: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\inputs',
+                       file_name: str = r'risk register lite.xlsx', sheet: str = 'RR Lite', cache_dir: str = None):
+    """Returns the validated register, parsing the workbook only when it changed since the last load.
+
+    With cache_dir the parsed register is pickled in that folder (never next to the workbook). It is reused while
+    the workbook's modification time & size are unchanged, or when its content hash still matches (e.g. after a
+    copy). Cached registers are unpickled, so cache_dir must not be writable by untrusted users."""
+    return load_risk_register_parameters(register_dir=register_dir, file_name=file_name, sheet=sheet,
+                                         cache_dir=cache_dir)[0]
+
+def load_risk_register_parameters(
+        register_dir: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\inputs',
+        file_name: str = r'risk register lite.xlsx', sheet: str = 'RR Lite', cache_dir: str = None):
+    """Returns the validated register & its parameter table (see extract_register_parameters), both cached as in
+    load_risk_register; the engines read the table rather than re-deriving it from the register."""
+    path = os.path.join(register_dir, file_name)
+    source_stat = os.stat(path)
+
+    # Registers of the same name in other folders get their own cache entry
+    cache_path = None
+    if cache_dir is not None:
+        path_digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"{file_name}.{sheet}.{path_digest}.pkl")
+
+    cached = None
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                cached = pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            cached = None
+
+    if cached is not None and cached.get("version") == REGISTER_CACHE_VERSION:
+        if (cached["mtime_ns"], cached["size"]) == (source_stat.st_mtime_ns, source_stat.st_size):
+            return _copy_register(cached)
+
+        source_hash = file_sha256(path)
+        if cached["sha256"] == source_hash:
+            cached.update(mtime_ns=source_stat.st_mtime_ns, size=source_stat.st_size)
+            _write_register_cache(cache_path, cached)
+
+            return _copy_register(cached)
+    else:
+        source_hash = file_sha256(path)
+
+    df_register = validate_risk_register(read_risk_register_lite(register_dir=register_dir, file_name=file_name,
+                                                                 sheet=sheet))
+    loaded = {"version": REGISTER_CACHE_VERSION, "mtime_ns": source_stat.st_mtime_ns, "size": source_stat.st_size,
+              "sha256": source_hash, "register": df_register,
+              "parameters": extract_register_parameters(df_register)}
+
+    if cache_path is not None:
+        _write_register_cache(cache_path, loaded)
+
+    return _copy_register(loaded)
+
+def _copy_register(loaded: dict):
+    """Returns copies of a loaded register & its parameter table (callers may modify them)."""
+    return loaded["register"].copy(), {key: values.copy() for key, values in loaded["parameters"].items()}
+
+def _write_register_cache(cache_path: str, cached: dict):
+    """Pickles a parsed register atomically (a failed write leaves no cache behind)."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temporary_path = cache_path + ".tmp"
+        with open(temporary_path, 'wb') as cache_file:
+            pickle.dump(cached, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, cache_path)
+    except OSError as error:
+        logger.warning(f"Could not cache the parsed register: {error}")
+
+def read_correlation_matrix(register_dir: str = r'C:\Users\g.varvounis\Documents\RiskQuantification\runner\inputs',
+                            file_name: str = r'taxonomy correlations.xlsx', sheet: str = 'Correlations'):
+    """Reads a correlation matrix (first column & header holding taxonomies or risk IDs) kept next to the register."""
+    path = os.path.join(register_dir, file_name)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        df_correlations = pd.read_excel(path, sheet_name=sheet, index_col=0)
+
+    return df_correlations
+
 if __name__ == "__main__":
 
     print("Under Construction...")
@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+
+# Bumped whenever the layout of golden files changes
+GOLDEN_FORMAT_VERSION = 1
+
+MANIFEST_KEY = "__manifest__"
+
+# Default tolerances of numeric arrays (numpy.isclose semantics: |actual - golden| <= atol + rtol * |golden|)
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 0.0
+
+def array_sha256(values: np.ndarray):
+    """Content hash of an array: dtype, shape & bytes (C order)."""
+    values = np.ascontiguousarray(values)
+    digest = hashlib.sha256(f"{values.dtype.str}{values.shape}".encode())
+    digest.update(values.tobytes())
+
+    return digest.hexdigest()
+
+def flatten_results(results: dict):
+    """Named arrays of a dictionary of results (DataFrames, Series or array-likes).
+
+    A DataFrame 'name' becomes its float64 numeric block 'name', one string array 'name[column]' per text column
+    and its labels 'name.index' & 'name.columns' (as strings)."""
+    arrays = {}
+    for name, values in results.items():
+        if isinstance(values, pd.Series):
+            values = values.to_frame()
+
+        if not isinstance(values, pd.DataFrame):
+            arrays[name] = np.asarray(values)
+            continue
+
+        numeric = [pd.api.types.is_numeric_dtype(dtype) for dtype in values.dtypes]
+        df_numeric = values.loc[:, numeric]
+        arrays[name] = df_numeric.to_numpy(dtype=np.float64)
+        arrays[f"{name}.index"] = values.index.astype(str).to_numpy(dtype=str)
+        arrays[f"{name}.columns"] = df_numeric.columns.astype(str).to_numpy(dtype=str)
+        for column, is_numeric in zip(values.columns, numeric):
+            if not is_numeric:
+                arrays[f"{name}[{column}]"] = values[column].astype(str).to_numpy(dtype=str)
+
+    return arrays
+
+def save_golden_results(path: str, results: dict, metadata: dict = None):
+    """Stores results (see flatten_results) as a compressed .npz golden file with the content hash of every array.
+
+    metadata (e.g. the run settings that produced the results) is kept in the file's manifest."""
+    arrays = flatten_results(results)
+    manifest = {"format_version": GOLDEN_FORMAT_VERSION, "metadata": metadata or {},
+                "hashes": {name: array_sha256(values) for name, values in arrays.items()}}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(path, **arrays, **{MANIFEST_KEY: np.array(json.dumps(manifest, sort_keys=True))})
+
+    return path
+
+def load_golden_manifest(path: str):
+    """Reads the manifest (format version, metadata & content hashes) of a golden file only."""
+    with np.load(path) as golden:
+        manifest = json.loads(str(golden[MANIFEST_KEY]))
+
+    if manifest["format_version"] != GOLDEN_FORMAT_VERSION:
+        raise ValueError(f"Golden file {path} has format version {manifest['format_version']}, expected "
+                         f"{GOLDEN_FORMAT_VERSION}; regenerate it with save_golden_results.")
+
+    return manifest
+
+def load_golden_results(path: str):
+    """Reads the named arrays of a golden file."""
+    load_golden_manifest(path)
+    with np.load(path) as golden:
+        return {name: golden[name] for name in golden.files if name != MANIFEST_KEY}
+
+def convert_excel_golden(excel_paths: dict, path: str, metadata: dict = None):
+    """Converts golden Excel workbooks (name -> path, first column as index) to a binary golden file."""
+    results = {}
+    for name, excel_path in excel_paths.items():
+        # openpyxl warns about workbook features it does not read
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results[name] = pd.read_excel(excel_path, index_col=0)
+
+    return save_golden_results(path, results, metadata=metadata)
+
+class RegressionReport:
+    """Outcome of compare_with_golden: one entry per compared array with its largest deviations."""
+    def __init__(self, entries: list):
+        self.entries = entries # Dictionaries with name, passed & deviation details
+
+    @property
+    def passed(self):
+        return all(entry["passed"] for entry in self.entries)
+
+    @property
+    def failures(self):
+        return [entry for entry in self.entries if not entry["passed"]]
+
+    def largest_deviations(self, count: int = 10):
+        """Numeric comparisons with the largest relative deviations first."""
+        numeric_entries = [entry for entry in self.entries if "max_relative_deviation" in entry]
+        return sorted(numeric_entries, key=lambda entry: entry["max_relative_deviation"], reverse=True)[:count]
+
+    def __str__(self):
+        lines = [f"{len(self.failures)} of {len(self.entries)} arrays deviate from the golden results."]
+        for entry in self.failures + [entry for entry in self.largest_deviations() if entry["passed"]]:
+            details = ", ".join(f"{key}={value}" for key, value in entry.items() if key not in ("name", "passed"))
+            lines.append(f"{'FAIL' if not entry['passed'] else 'ok  '} {entry['name']}: {details}")
+
+        return "\n".join(lines)
+
+def _compare_array(name: str, actual: np.ndarray, golden: np.ndarray, rtol: float, atol: float):
+    """Compares one array with its golden counterpart (numeric within tolerances, other dtypes exactly)."""
+    if actual.shape != golden.shape:
+        return {"name": name, "passed": False, "reason": f"shape {actual.shape} != golden {golden.shape}"}
+
+    if not (np.issubdtype(golden.dtype, np.number) and np.issubdtype(actual.dtype, np.number)):
+        mismatched = np.flatnonzero(actual.ravel() != golden.ravel())
+        entry = {"name": name, "passed": len(mismatched) == 0, "mismatched": len(mismatched)}
+        if len(mismatched):
+            position = mismatched[0]
+            entry["first_mismatch"] = f"{actual.ravel()[position]!r} != golden {golden.ravel()[position]!r}"
+        return entry
+
+    actual, golden = actual.astype(np.float64), golden.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        deviations = np.abs(actual - golden)
+        relative_deviations = np.where(deviations > 0, deviations / np.abs(golden), 0.0)
+    same_nan = np.isnan(actual) & np.isnan(golden)
+    deviations[same_nan], relative_deviations[same_nan] = 0.0, 0.0
+    mismatched = ~(np.isclose(actual, golden, rtol=rtol, atol=atol) | same_nan)
+
+    entry = {"name": name, "passed": not mismatched.any(), "mismatched": int(mismatched.sum()),
+             "max_abs_deviation": float(np.nanmax(deviations, initial=0.0)),
+             "max_relative_deviation": float(np.nanmax(relative_deviations, initial=0.0)), "rtol": rtol, "atol": atol}
+    if deviations.size and np.nanmax(deviations, initial=0.0) > 0:
+        worst = np.unravel_index(np.nanargmax(deviations), deviations.shape)
+        entry["worst_position"] = tuple(int(index) for index in worst)
+        entry["worst_values"] = (float(actual[worst]), float(golden[worst]))
+
+    return entry
+
+def compare_with_golden(results: dict, golden_path: str, rtol: float = DEFAULT_RTOL, atol: float = DEFAULT_ATOL,
+                        tolerances: dict = None, exact: bool = False):
+    """Compares results (as given to save_golden_results) with a golden file & returns a RegressionReport.
+
+    Numeric arrays pass when every value is within atol + rtol * |golden| (NaNs must match); tolerances
+    overrides (rtol, atol) per flattened array name. Labels & text columns must match exactly. With exact=True
+    only the content hashes are compared, without reading the golden arrays."""
+    arrays = flatten_results(results)
+    manifest = load_golden_manifest(golden_path)
+    tolerances = tolerances or {}
+
+    entries = [{"name": name, "passed": False, "reason": "missing from the results"}
+               for name in manifest["hashes"] if name not in arrays]
+    entries += [{"name": name, "passed": False, "reason": "missing from the golden file"}
+                for name in arrays if name not in manifest["hashes"]]
+    compared = [name for name in arrays if name in manifest["hashes"]]
+
+    if exact:
+        entries += [{"name": name, "passed": array_sha256(arrays[name]) == manifest["hashes"][name],
+                     "reason": "content hash"} for name in compared]
+        return RegressionReport(entries)
+
+    with np.load(golden_path) as golden:
+        for name in compared:
+            array_rtol, array_atol = tolerances.get(name, (rtol, atol))
+            entries.append(_compare_array(name, arrays[name], golden[name], array_rtol, array_atol))
+
+    return RegressionReport(entries)
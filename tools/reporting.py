@@ -1,11 +1,34 @@
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
+import numpy as np
 import pandas as pd
-
-
-def plot_simulation(simulation_df: pd.DataFrame, use_grid: bool = True):
-    """Plots all paths (scenarios) of performed simulation."""
-    plt.plot(simulation_df)
+from tools.reporting_summaries import (DEFAULT_SAMPLE_PATHS, histogram_summary, exceedance_curve_summary,
+                                       quantile_fan_summary, sample_paths_summary, simulation_paths)
+
+
+def plot_simulation(simulation_df, use_grid: bool = True, num_paths: int = DEFAULT_SAMPLE_PATHS):
+    """Plots the paths (scenarios) of performed simulation.
+
+    simulation_df is the (steps x scenarios) result or its summaries (tools.reporting_summaries). Beyond num_paths
+    scenarios a representative sample of paths is drawn over the quantile fan of all scenarios."""
+    if isinstance(simulation_df, dict):
+        fan, sample_paths = simulation_df["fan"], simulation_df["sample_paths"]
+        num_scenarios = int(simulation_df["scenarios"])
+    else:
+        paths = simulation_paths(simulation_df)
+        fan, sample_paths = quantile_fan_summary(paths), sample_paths_summary(paths, num_paths=num_paths)
+        num_scenarios = paths.shape[1]
+
+    if len(sample_paths["scenarios"]) < num_scenarios:
+        # Symmetric quantile bands (e.g. 5% - 95%), lighter towards the tails
+        bands = fan["bands"]
+        steps = np.arange(bands.shape[1])
+        for lower, upper in zip(range(len(bands) // 2), range(len(bands) - 1, len(bands) // 2 - 1, -1)):
+            plt.fill_between(steps, bands[lower], bands[upper], color="steelblue", alpha=0.15, linewidth=0,
+                             label=f"{fan['quantiles'][lower]:g}% - {fan['quantiles'][upper]:g}%")
+        plt.legend(loc="upper left", fontsize=8)
+
+    plt.plot(sample_paths["paths"], linewidth=0.8)
     plt.title("Simulated Scenarios (Paths)", fontweight="bold", fontsize=12)
     plt.xlabel("Time", fontweight="bold", fontsize=10)
     plt.ylabel("Values", fontweight="bold", fontsize=10)
@@ -17,7 +40,8 @@ def plot_simulation(simulation_df: pd.DataFrame, use_grid: bool = True):
 def plot_simulated_distribution(risk_factor_dictionary, risk_factor: str, bins: int = 50,
                                 step_index: int = -1, use_grid: bool = True):
     """Plots distribution (histogram) of a selected random variable in a step of simulated process."""
-    plt.hist(risk_factor_dictionary[risk_factor].iloc[step_index, :], bins=bins)
+    histogram = histogram_summary(simulation_paths(risk_factor_dictionary[risk_factor])[step_index], bins=bins)
+    plt.hist(histogram["edges"][:-1], bins=histogram["edges"], weights=histogram["counts"])
 
     plt.xlabel("Values", fontweight="bold", fontsize=10)
     plt.ylabel("Frequency", fontweight="bold", fontsize=10)
@@ -37,8 +61,11 @@ def plot_path(risk_factor_dictionary, risk_factor: str, scenario_index: int = 0,
 
     plt.show()
 
-def plot_final_impact_distribution(df_impact_results: pd.DataFrame, used_bins: int = 50, use_grid: bool = True):
-    """Creates the histogram of simulated distribution of impact."""
+def plot_final_impact_distribution(df_impact_results, used_bins: int = 50, use_grid: bool = True):
+    """Creates the histogram of simulated distribution of impact (from the results or their summaries)."""
+    histogram = df_impact_results["histogram"] if isinstance(df_impact_results, dict) else \
+        histogram_summary(simulation_paths(df_impact_results)[-1], bins=used_bins)
+
     # Format final figure
     plt.figure(figsize=(12, 8))
     ax = plt.gca()
@@ -47,7 +74,7 @@ def plot_final_impact_distribution(df_impact_results: pd.DataFrame, used_bins: i
     plt.xticks(rotation=30)
 
     # Create figure
-    plt.hist(df_impact_results.iloc[-1,:].T, bins=used_bins)
+    plt.hist(histogram["edges"][:-1], bins=histogram["edges"], weights=histogram["counts"])
 
     # Format axes' labels
     #plt.xlabel("Impact Values", fontweight="bold", fontsize=10)
@@ -58,18 +85,11 @@ def plot_final_impact_distribution(df_impact_results: pd.DataFrame, used_bins: i
 
     plt.show()
 
-def plot_loss_curve(df_impact_results: pd.DataFrame, use_grid: bool = True, curve_color: str = "green"):
-    """Creates the loss excedance of simulated distribution of impact."""
-    # Create DataFrame with data transformed for the curve
-    df_new = df_impact_results.T.copy()
-    df_new.columns = ['Impact']
-    df_new = df_new.sort_values(by='Impact', ascending=False)
-
-    # Add sequential row number starting from 1 (like =ROW(C2)-ROW(C$2)+1)
-    df_new['Calculation'] = range(1, len(df_new['Impact']) + 1)
-
-    # Add normalized row number (like =((ROW(C2)-ROW(C$2)+1)/COUNT(C:C)))
-    df_new['Normalized Calculation'] = df_new['Calculation'] / len(df_new['Calculation'])
+def plot_loss_curve(df_impact_results, use_grid: bool = True, curve_color: str = "green"):
+    """Creates the loss excedance of simulated distribution of impact (from the results or their summaries)."""
+    # Exceedance probabilities at log-spaced impacts of the horizon
+    exceedance = df_impact_results["exceedance"] if isinstance(df_impact_results, dict) else \
+        exceedance_curve_summary(simulation_paths(df_impact_results)[-1])
 
     # Format final figure
     plt.figure(figsize=(12, 8))
@@ -86,9 +106,8 @@ def plot_loss_curve(df_impact_results: pd.DataFrame, use_grid: bool = True, curv
     ax.yaxis.set_major_locator(ticker.MultipleLocator(0.1))
     ax.yaxis.set_major_formatter(ticker.FuncFormatter(lambda y, _: f'{int(y * 100)}%'))
 
-    # Plot the data from df_new
-    #plt.plot(df_new['Impact'], df_new['Normalized Calculation'], marker='o')
-    plt.plot(df_new['Impact'], df_new['Normalized Calculation'], color=curve_color)
+    # Plot the exceedance curve
+    plt.plot(exceedance["losses"], exceedance["exceedance_probabilities"], color=curve_color)
 
     # Add labels and title
     #plt.xlabel("Impact Values", fontweight="bold", fontsize=12)
@@ -0,0 +1,111 @@
+import os
+import numpy as np
+
+REPORTING_SUMMARIES_FILE_NAME = "reporting_summaries.npz"
+
+# Default sizes of the summaries, independent of the number of scenarios
+DEFAULT_HISTOGRAM_BINS = 50
+DEFAULT_EXCEEDANCE_POINTS = 200
+DEFAULT_FAN_QUANTILES = (1, 5, 25, 50, 75, 95, 99)
+DEFAULT_SAMPLE_PATHS = 100
+
+def simulation_paths(simulation_results):
+    """(steps x scenarios) float array of a simulation result (DataFrame, array or memory map)."""
+    paths = np.asarray(simulation_results, dtype=np.float64)
+    return paths.reshape(1, -1) if paths.ndim == 1 else paths
+
+def histogram_summary(values: np.ndarray, bins: int = DEFAULT_HISTOGRAM_BINS, weights: np.ndarray = None):
+    """Binned histogram of values: 'counts' (weighted when weights are given) over the 'edges' of equal bins."""
+    counts, edges = np.histogram(values, bins=bins, weights=weights)
+
+    return {"counts": counts.astype(np.float64), "edges": edges}
+
+def exceedance_curve_summary(values: np.ndarray, points: int = DEFAULT_EXCEEDANCE_POINTS, weights: np.ndarray = None):
+    """Loss exceedance curve P(loss >= x) at log-spaced losses x from the smallest positive to the largest loss.
+
+    Probabilities are the (weighted) shares of scenarios at or above each loss, as the full-sample curve would
+    show at those losses; the largest loss closes the curve at its own exceedance probability."""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+
+    # Total weight of the scenarios at or above every sorted position
+    tail_weights = np.cumsum(weights[order][::-1])[::-1]
+    positive_values = sorted_values[sorted_values > 0]
+    if len(positive_values) == 0:
+        return {"losses": np.empty(0), "exceedance_probabilities": np.empty(0)}
+
+    losses = np.unique(np.r_[np.geomspace(positive_values[0], positive_values[-1], points), positive_values[-1]])
+    positions = np.searchsorted(sorted_values, losses, side='left')
+
+    return {"losses": losses, "exceedance_probabilities": tail_weights[positions] / tail_weights[0]}
+
+def quantile_fan_summary(paths: np.ndarray, quantiles=DEFAULT_FAN_QUANTILES):
+    """Quantiles (in percent) of every step over the scenarios: 'bands' is (quantiles x steps)."""
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    return {"quantiles": quantiles, "bands": np.percentile(paths, quantiles, axis=1)}
+
+def sample_paths_summary(paths: np.ndarray, num_paths: int = DEFAULT_SAMPLE_PATHS, seed: int = 0):
+    """Representative paths: the scenarios with the smallest, median & largest horizon value plus random ones.
+
+    All paths are kept when there are no more than num_paths scenarios."""
+    num_scenarios = paths.shape[1]
+    if num_scenarios <= num_paths:
+        scenarios = np.arange(num_scenarios)
+    else:
+        horizon_order = np.argsort(paths[-1], kind='stable')
+        extremes = np.unique(horizon_order[[0, num_scenarios // 2, -1]])
+        random_scenarios = np.random.default_rng(seed).choice(num_scenarios, size=num_paths, replace=False)
+        random_scenarios = random_scenarios[~np.isin(random_scenarios, extremes)][:num_paths - len(extremes)]
+        scenarios = np.sort(np.r_[extremes, random_scenarios])
+
+    return {"scenarios": scenarios, "paths": paths[:, scenarios]}
+
+def compute_reporting_summaries(simulation_results, bins: int = DEFAULT_HISTOGRAM_BINS,
+                                exceedance_points: int = DEFAULT_EXCEEDANCE_POINTS,
+                                fan_quantiles=DEFAULT_FAN_QUANTILES, num_sample_paths: int = DEFAULT_SAMPLE_PATHS,
+                                weights: np.ndarray = None):
+    """Fixed-size summaries of simulated (steps x scenarios) results for tools.reporting's plots.
+
+    Returns a dictionary of summaries: 'histogram' & 'exceedance' of the horizon (last step) values, optionally
+    weighted per scenario (e.g. likelihood ratios of importance sampling), 'fan' quantile bands over the steps &
+    'sample_paths'. Their sizes do not depend on the number of scenarios, so plots rendered from them cost the
+    same for any run."""
+    paths = simulation_paths(simulation_results)
+
+    return {"histogram": histogram_summary(paths[-1], bins=bins, weights=weights),
+            "exceedance": exceedance_curve_summary(paths[-1], points=exceedance_points, weights=weights),
+            "fan": quantile_fan_summary(paths, quantiles=fan_quantiles),
+            "sample_paths": sample_paths_summary(paths, num_paths=num_sample_paths),
+            "scenarios": np.array(paths.shape[1])}
+
+def save_reporting_summaries(summaries: dict, output_dir: str, file_name: str = REPORTING_SUMMARIES_FILE_NAME):
+    """Saves the summaries as one .npz file (keys 'summary/array') next to the run's outputs & returns its path."""
+    path = os.path.join(output_dir, file_name)
+    arrays = {}
+    for name, summary in summaries.items():
+        if isinstance(summary, dict):
+            arrays.update({f"{name}/{key}": values for key, values in summary.items()})
+        else:
+            arrays[name] = summary
+    np.savez(path, **arrays)
+
+    return path
+
+def load_reporting_summaries(path: str):
+    """Reads summaries saved by save_reporting_summaries (a run's output folder or the .npz file)."""
+    if os.path.isdir(path):
+        path = os.path.join(path, REPORTING_SUMMARIES_FILE_NAME)
+
+    summaries = {}
+    with np.load(path) as arrays:
+        for key in arrays.files:
+            name, _, field = key.partition("/")
+            if field:
+                summaries.setdefault(name, {})[field] = arrays[key]
+            else:
+                summaries[name] = arrays[key]
+
+    return summaries
@@ -0,0 +1,88 @@
+import os
+import json
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+PATHS_FILE = "paths.npy"
+TOTAL_FILE = "total.npy"
+METADATA_FILE = "store.json"
+
+class SimulationResultStore(Mapping):
+    """Dict-like access (by risk ID) to per risk factor paths kept in one memory-mapped array on disk.
+
+    Paths live in a (risks x steps x scenarios) .npy file, so a store can exceed RAM and be reopened later
+    without re-simulating. Items are read-only DataFrames viewing the memory map (steps as rows, scenarios as
+    columns), matching the dictionary returned by perform_simulation; results are only written via write_risk."""
+    def __init__(self, store_dir: str, mode: str = 'r'):
+        self.store_dir = store_dir # Directory holding the arrays & metadata of the store
+
+        with open(os.path.join(store_dir, METADATA_FILE)) as metadata_file:
+            self.metadata = json.load(metadata_file) # Risk IDs, shape & run settings
+
+        self.paths = np.load(os.path.join(store_dir, PATHS_FILE), mmap_mode=mode) # (risks x steps x scenarios)
+        self.total = np.load(os.path.join(store_dir, TOTAL_FILE), mmap_mode=mode) # (steps x scenarios)
+
+        # Duplicated risk IDs resolve to their last row, like the dictionary they replace
+        self.positions = {risk: position for position, risk in enumerate(self.metadata["risks"])}
+
+    @classmethod
+    def create(cls, store_dir: str, risk_ids, num_steps: int, num_scenarios: int, dtype: str = 'float64',
+               run_settings: dict = None):
+        """Creates an empty store for the given risks & shape and opens it for writing."""
+        os.makedirs(store_dir, exist_ok=True)
+
+        metadata = {"risks": [str(risk) for risk in risk_ids], "steps": num_steps, "scenarios": num_scenarios,
+                    "dtype": np.dtype(dtype).name, "run_settings": run_settings or {}}
+        with open(os.path.join(store_dir, METADATA_FILE), "w") as metadata_file:
+            json.dump(metadata, metadata_file, indent=2, default=str)
+
+        np.lib.format.open_memmap(os.path.join(store_dir, PATHS_FILE), mode='w+', dtype=dtype,
+                                  shape=(len(metadata["risks"]), num_steps, num_scenarios))
+        np.lib.format.open_memmap(os.path.join(store_dir, TOTAL_FILE), mode='w+', dtype=dtype,
+                                  shape=(num_steps, num_scenarios))
+
+        return cls(store_dir, mode='r+')
+
+    @staticmethod
+    def _read_only(values: np.ndarray):
+        """Returns a view of values that cannot be written through (the store may be open for writing)."""
+        view = values.view()
+        view.flags.writeable = False
+
+        return view
+
+    def __getitem__(self, risk):
+        return pd.DataFrame(self._read_only(self.paths[self.positions[str(risk)]]), copy=False)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def write_risk(self, position: int, impacts: np.ndarray):
+        """Writes the (steps x scenarios) impacts of the risk in the given register position."""
+        self.paths[position] = impacts
+
+    def write_total(self, total_impacts: np.ndarray):
+        """Writes the (steps x scenarios) impacts summed over all risks."""
+        self.total[:] = total_impacts
+
+    def flush(self):
+        """Flushes pending writes of the memory maps to disk."""
+        if isinstance(self.paths, np.memmap):
+            self.paths.flush()
+            self.total.flush()
+
+    def path(self, risk, scenario_index: int):
+        """Returns a read-only view of one simulated path (scenario) of a risk factor."""
+        return self._read_only(self.paths[self.positions[str(risk)], :, scenario_index])
+
+    def step(self, risk, step_index: int = -1):
+        """Returns a read-only view of all scenarios of a risk factor at one step (horizon by default)."""
+        return self._read_only(self.paths[self.positions[str(risk)], step_index, :])
+
+    def total_frame(self):
+        """Returns the total impacts as a read-only (steps x scenarios) DataFrame viewing the memory map."""
+        return pd.DataFrame(self._read_only(self.total), copy=False)
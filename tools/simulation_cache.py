@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+from model.random_streams import risk_stream_key
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the sampling of a risk changes, so that older entries are no longer matched
+CACHE_FORMAT_VERSION = 1
+
+# Default bound on the total size of the cached arrays (bytes)
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+ENTRY_SUFFIX = ".npz"
+
+def risk_fingerprint(register_parameters: dict, position: int, run_settings: dict):
+    """Hashes everything the draws of one risk depend on: its row parameters & the run settings.
+
+    run_settings holds the seed, steps, scenarios, cap settings, materialization & RNG mode of the run."""
+    row = {"risk": risk_stream_key(register_parameters["risk"][position]),
+           "likelihood": float(register_parameters["likelihood"][position]),
+           "min_impact": float(register_parameters["min_impact"][position]),
+           "max_impact": float(register_parameters["max_impact"][position]),
+           "distribution": str(register_parameters["distribution"][position]),
+           "mean": float(register_parameters["mean"][position]),
+           "std": float(register_parameters["std"][position])}
+    content = json.dumps({"version": CACHE_FORMAT_VERSION, "row": row, "run": run_settings}, sort_keys=True,
+                         default=str)
+
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def register_fingerprints(register_parameters: dict, run_settings: dict):
+    """Fingerprints of all risks of the register, in register order."""
+    return [risk_fingerprint(register_parameters, position, run_settings)
+            for position in range(len(register_parameters["risk"]))]
+
+def select_register_parameters(register_parameters: dict, positions):
+    """Returns the register parameters of the given positions only."""
+    return {key: values[positions] for key, values in register_parameters.items()}
+
+class SimulationCache:
+    """Content-addressed on-disk cache of per risk (steps x scenarios) impacts & materialization maps.
+
+    Entries are keyed by risk_fingerprint, so edited or new risks miss the cache while all other risks of a re-run
+    are read back instead of re-sampled. Materializations are stored as packed bits. Once the entries exceed
+    max_bytes the least recently used ones are removed (file modification times record the use)."""
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir # Directory holding one .npz file per entry
+        self.max_bytes = max_bytes # Bound on the total size of the entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Entry sizes, least recently used first
+        entries = []
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(ENTRY_SUFFIX):
+                file_stat = os.stat(os.path.join(cache_dir, file_name))
+                entries.append((file_stat.st_mtime, file_name[:-len(ENTRY_SUFFIX)], file_stat.st_size))
+        self.entries = OrderedDict((fingerprint, size) for _, fingerprint, size in sorted(entries))
+
+    def _entry_path(self, fingerprint: str):
+        return os.path.join(self.cache_dir, fingerprint + ENTRY_SUFFIX)
+
+    @property
+    def size_bytes(self):
+        """Total size of the cached entries."""
+        return sum(self.entries.values())
+
+    def get(self, fingerprint: str):
+        """Returns the cached (impacts, realizations) of a fingerprint, or None."""
+        if fingerprint not in self.entries:
+            self.misses += 1
+            return None
+
+        entry_path = self._entry_path(fingerprint)
+        try:
+            with np.load(entry_path) as entry:
+                impacts = entry["impacts"]
+                realizations = np.unpackbits(entry["realizations"], axis=-1,
+                                             count=impacts.shape[-1]).astype(np.int8)
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError):
+            # Entry removed or damaged by another run; simulate the risk again
+            self.entries.pop(fingerprint, None)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(fingerprint)
+        self.hits += 1
+
+        return impacts, realizations
+
+    def put(self, fingerprint: str, impacts: np.ndarray, realizations: np.ndarray):
+        """Stores the impacts & realizations of a risk, then evicts least recently used entries if needed."""
+        if fingerprint in self.entries:
+            return
+
+        entry_path = self._entry_path(fingerprint)
+        temporary_path = entry_path + ".tmp"
+        with open(temporary_path, "wb") as entry_file:
+            np.savez(entry_file, impacts=impacts,
+                     realizations=np.packbits(np.asarray(realizations, dtype=bool), axis=-1))
+        os.replace(temporary_path, entry_path)
+
+        self.entries[fingerprint] = os.path.getsize(entry_path)
+        self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits max_bytes (the newest entry is kept)."""
+        total_bytes = self.size_bytes
+        while total_bytes > self.max_bytes and len(self.entries) > 1:
+            fingerprint, size = self.entries.popitem(last=False)
+            try:
+                os.remove(self._entry_path(fingerprint))
+            except FileNotFoundError:
+                pass
+            total_bytes -= size